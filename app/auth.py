@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from .settings import settings
+
 
 SECRET_KEY = "supersecret"  # Replace later with env variable
 ALGORITHM = "HS256"
@@ -33,3 +35,12 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     return decode_token(credentials.credentials)
 
 
+def is_admin(user_id: str) -> bool:
+    return user_id in {u.strip() for u in settings.ADMIN_USERS.split(",") if u.strip()}
+
+
+def require_admin(user_id: str = Depends(get_current_user)):
+    if not is_admin(user_id):
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user_id
+
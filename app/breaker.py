@@ -0,0 +1,132 @@
+# app/breaker.py
+"""
+Circuit breakers for the OpenAI completions API, the embeddings API and Redis.
+
+A breaker counts consecutive failures of its dependency (connection errors,
+timeouts, 5xx/429 responses; not 4xx, which are the caller's fault). After
+BREAKER_FAILURES in a row it opens: calls fail immediately with CircuitOpen
+instead of waiting through timeouts and the retry schedule. After
+BREAKER_RESET_S it turns half-open and lets a single probe call through; a
+success closes it, a failure opens it for another BREAKER_RESET_S.
+
+Callers decide how to degrade: /chat answers without RAG when embeddings are
+out and without history when Redis is; an open LLM breaker is a 503 with
+Retry-After. State is reported by /health.
+"""
+from __future__ import annotations
+
+import asyncio, math, time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict
+
+import httpx
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from .logger import log_event
+from .settings import settings
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} unavailable (circuit open), failing fast")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def upstream_failure(e: BaseException) -> bool:
+    """Transport errors and 5xx/429 responses count against an HTTP upstream; other statuses do not."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return isinstance(e, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def redis_failure(e: BaseException) -> bool:
+    # connection-level only: a command error (e.g. WRONGTYPE) means Redis is up
+    return isinstance(e, (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_s: float, is_failure: Callable[[BaseException], bool]):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.is_failure = is_failure
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.reset_timeout_s - (time.monotonic() - self.opened_at)))
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            log_event("breaker.state", {"dependency": self.name, "from": self.state, "to": state, "failures": self.failures})
+            self.state = state
+
+    def check(self) -> None:
+        """Raise CircuitOpen unless a call may start now (closed, or the one half-open probe)."""
+        if self.failure_threshold <= 0:
+            return
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout_s:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self._retry_after())
+            self._set_state("half_open")
+        if self.state == "half_open" and self._probing:
+            self.rejected += 1
+            raise CircuitOpen(self.name, 1)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (self.failure_threshold > 0 and self.failures >= self.failure_threshold):
+            if self.state != "open":
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator["CircuitBreaker"]:
+        """Run one call through the breaker, recording its outcome."""
+        self.check()
+        probe = self.state == "half_open"
+        self._probing = self._probing or probe
+        try:
+            yield self
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            elif isinstance(e, httpx.HTTPStatusError):
+                # a 4xx is the caller's fault, and proves the dependency is up
+                self.record_success()
+            raise
+        else:
+            self.record_success()
+        finally:
+            # a cancelled probe (e.g. a losing hedge) must not leave the breaker stuck half-open
+            if probe:
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_after_s": self._retry_after() if self.state == "open" else None,
+        }
+
+
+llm_breaker = CircuitBreaker("llm", settings.BREAKER_FAILURES, settings.BREAKER_RESET_S, upstream_failure)
+embed_breaker = CircuitBreaker("embeddings", settings.BREAKER_FAILURES, settings.BREAKER_RESET_S, upstream_failure)
+redis_breaker = CircuitBreaker("redis", settings.BREAKER_FAILURES, settings.BREAKER_RESET_S, redis_failure)
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {b.name: b.stats() for b in (llm_breaker, embed_breaker, redis_breaker)}
@@ -0,0 +1,169 @@
+# app/cassette.py
+"""
+Record/replay of upstream HTTP calls (completions and embeddings), so benchmarks
+and eval runs can be repeated offline and deterministically. The /models health
+probe is not recorded; in replay mode it reports the API as up without a request.
+
+All upstream clients come from `upstream_client()`. With CASSETTE_MODE unset it
+is a plain httpx.AsyncClient. Otherwise its transport is a CassetteTransport:
+
+  record   forward to the network and store every response under the hash of
+           its request
+  replay   answer from the store only; a request that was never recorded
+           raises CassetteMiss (it is not retried, and not counted against
+           the circuit breakers)
+
+The key hashes the method, URL and body, with JSON bodies canonicalised. Headers
+are left out, so API keys never reach the store and a different key still
+replays. The store is one SQLite file (CASSETTE_PATH) holding zlib-compressed
+bodies; embedding responses (pretty-printed JSON floats) shrink to about a
+quarter. A request recorded twice keeps the latest response.
+
+Replayed responses are immediate by default. CASSETTE_LATENCY_MS adds a fixed
+delay, and -1 replays the latency measured while recording, so timing-sensitive
+code (hedging, deadlines, admission) sees realistic waits.
+"""
+from __future__ import annotations
+
+import asyncio, hashlib, os, sqlite3, threading, time, zlib
+from pathlib import Path
+from typing import Tuple
+
+import httpx
+import orjson
+
+from .settings import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers BLOB NOT NULL,
+    body BLOB NOT NULL,
+    latency_ms REAL NOT NULL,
+    recorded_at REAL NOT NULL
+)
+"""
+
+# hop-by-hop or describing the original encoding: the stored body is already decoded
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+
+
+class CassetteMiss(Exception):
+    def __init__(self, method: str, url: str):
+        super().__init__(f"No recorded response for {method} {url} (CASSETTE_MODE=replay); record it first")
+        self.url = url
+
+
+def request_key(request: httpx.Request) -> str:
+    body = request.content
+    try:
+        # key order and whitespace must not matter
+        body = orjson.dumps(orjson.loads(body), option=orjson.OPT_SORT_KEYS) if body else b""
+    except orjson.JSONDecodeError:
+        pass
+    h = hashlib.blake2b(digest_size=20)
+    for part in (request.method.encode(), str(request.url).encode(), body):
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+class CassetteStore:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # one connection, shared by the to_thread workers under a lock
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def get(self, key: str) -> Tuple[int, list, bytes, float] | None:
+        with self._lock:
+            row = self._db.execute("SELECT status, headers, body, latency_ms FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        status, headers, body, latency_ms = row
+        return status, orjson.loads(headers), zlib.decompress(body), latency_ms
+
+    def put(self, key: str, request: httpx.Request, status: int, headers: list, body: bytes, latency_ms: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, request.method, str(request.url), status, orjson.dumps(headers), zlib.compress(body, 6), latency_ms, time.time()),
+            )
+        self.recorded += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM responses").fetchone()
+        return {"path": str(self.path), "responses": count, "body_bytes": size, "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    def __init__(self, store: CassetteStore, mode: str, latency_ms: float = 0.0, inner: httpx.AsyncBaseTransport | None = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"CASSETTE_MODE must be 'record' or 'replay', not {mode!r}")
+        self.store = store
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key = request_key(request)
+        if self.mode == "replay":
+            hit = await asyncio.to_thread(self.store.get, key)
+            if hit is None:
+                raise CassetteMiss(request.method, str(request.url))
+            status, headers, body, recorded_ms = hit
+            delay = recorded_ms if self.latency_ms < 0 else self.latency_ms
+            if delay > 0:
+                await asyncio.sleep(delay / 1000)
+            return httpx.Response(status, headers=headers, content=body, request=request)
+
+        t0 = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        latency_ms = (time.perf_counter() - t0) * 1000
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS]
+        await asyncio.to_thread(self.store.put, key, request, response.status_code, headers, body, latency_ms)
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+_store: CassetteStore | None = None
+_store_pid: int | None = None
+
+
+def get_store() -> CassetteStore:
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        _store = CassetteStore(settings.CASSETTE_PATH)
+        _store_pid = os.getpid()
+    return _store
+
+
+def upstream_client(timeout: float | httpx.Timeout) -> httpx.AsyncClient:
+    """An AsyncClient for OpenAI calls, recording or replaying when CASSETTE_MODE is set."""
+    if not settings.CASSETTE_MODE:
+        return httpx.AsyncClient(timeout=timeout)
+    return httpx.AsyncClient(timeout=timeout, transport=CassetteTransport(get_store(), settings.CASSETTE_MODE, settings.CASSETTE_LATENCY_MS))
+
+
+def cassette_stats() -> dict | None:
+    return {"mode": settings.CASSETTE_MODE, "latency_ms": settings.CASSETTE_LATENCY_MS, **get_store().stats()} if settings.CASSETTE_MODE else None
@@ -0,0 +1,168 @@
+# app/compression.py
+"""
+Negotiated response compression (brotli or gzip) as an ASGI middleware.
+
+A response is compressed when the client accepts an encoding we have, the
+content type is textual (JSON, HTML, plain text, ...), it is not already
+encoded, and the body is at least COMPRESS_MIN_BYTES. Smaller bodies go out as
+they are: below ~1 KB the framing overhead and CPU are not worth a few hundred
+bytes. Streamed bodies are compressed chunk by chunk, with a flush after each
+chunk so nothing is held back from the client.
+
+brotli is used when the `Brotli` package is installed and the client prefers or
+accepts it equally; otherwise gzip (stdlib). An ETag on a compressed response is
+made weak, since the bytes on the wire no longer match the representation it
+was computed from (see static.CachedPage, which compares weakly).
+"""
+from __future__ import annotations
+
+import gzip, zlib
+from typing import Dict, List, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+from .settings import settings
+
+_COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def accepted_encoding(accept_encoding: str) -> str | None:
+    """The best encoding we can produce for an Accept-Encoding header value, or None."""
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        offered[name.strip().lower()] = q
+    wildcard = offered.get("*", 0.0)
+    best, best_q = None, 0.0
+    # on equal q, brotli wins: ~15-25% smaller than gzip on JSON at comparable speed
+    for enc in ("br", "gzip") if brotli is not None else ("gzip",):
+        q = offered.get(enc, wildcard)
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=settings.COMPRESS_BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(settings.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.finish() if self.encoding == "br" else self._c.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=settings.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=settings.COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    ctype = ""
+    for k, v in headers:
+        k = k.lower()
+        if k == b"content-encoding":
+            return False
+        if k == b"content-type":
+            ctype = v.decode("latin-1").lower()
+    return ctype.startswith(_COMPRESSIBLE)
+
+
+def _vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    for i, (k, v) in enumerate(headers):
+        if k.lower() == b"vary":
+            if b"accept-encoding" not in v.lower():
+                headers[i] = (k, v + b", Accept-Encoding")
+            return headers
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+def _encoded_headers(headers: List[Tuple[bytes, bytes]], encoding: str, length: int | None) -> List[Tuple[bytes, bytes]]:
+    out = []
+    for k, v in headers:
+        lk = k.lower()
+        if lk == b"content-length":
+            continue
+        if lk == b"etag" and not v.startswith(b"W/"):
+            v = b"W/" + v
+        out.append((k, v))
+    out.append((b"content-encoding", encoding.encode()))
+    if length is not None:
+        out.append((b"content-length", str(length).encode()))
+    return _vary(out)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), "")
+        encoding = accepted_encoding(accept) if accept else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start: Dict | None = None
+        started = False
+        encoder: _Encoder | None = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, started, encoder, passthrough
+            if message["type"] == "http.response.start":
+                # held back until the first body chunk shows whether compression applies
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            started = True
+            if encoder is not None:
+                body = encoder.chunk(message.get("body", b""))
+                more = message.get("more_body", False)
+                if not more:
+                    body += encoder.finish()
+                return await send({"type": "http.response.body", "body": body, "more_body": more})
+
+            headers = list(start.get("headers", []))
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if start["status"] < 200 or start["status"] in (204, 304) or not _compressible(headers) or (not more and len(body) < self.minimum_size):
+                passthrough = True
+                if _compressible(headers):
+                    # a small body of a compressible type still varies by encoding for caches
+                    start = {**start, "headers": _vary(headers)}
+                await send(start)
+                return await send(message)
+            if not more:
+                data = compress(body, encoding)
+                await send({**start, "headers": _encoded_headers(headers, encoding, len(data))})
+                return await send({"type": "http.response.body", "body": data})
+            encoder = _Encoder(encoding)
+            await send({**start, "headers": _encoded_headers(headers, encoding, None)})
+            await send({"type": "http.response.body", "body": encoder.chunk(body), "more_body": True})
+
+        await self.app(scope, receive, send_wrapper)
+        if start is not None and not started:
+            # no body message was sent (e.g. an empty HEAD response)
+            await send(start)
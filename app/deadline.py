@@ -0,0 +1,187 @@
+# app/deadline.py
+"""
+Per-request deadlines, retry budgets and hedged upstream calls.
+
+A route opts in with `dependencies=[Depends(request_deadline(seconds))]`; the
+deadline lives in a context variable, so every stage of the request (admission
+queues, embeddings, vector search, the completion) sees the same budget,
+including work started with asyncio.gather or asyncio.to_thread. Clients may
+ask for a shorter budget with an `X-Request-Timeout` header (seconds).
+
+Upstream calls use `retry_within_deadline` instead of a bare tenacity retry:
+back-off sleeps never run past the deadline and each attempt's HTTP timeout is
+capped by what is left (`attempt_timeout`, `within_deadline`). When the budget runs out the
+request fails with DeadlineExceeded, which the API maps to 504. Outside a
+request (ingestion, CLI tools) there is no deadline and nothing changes.
+
+Idempotent calls can be hedged (`Hedger`): if the first attempt has not
+answered after the recent p95 latency, an identical second request is sent and
+whichever finishes first wins.
+"""
+from __future__ import annotations
+
+import asyncio, time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from fastapi import Header
+from tenacity import RetryError, retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential_jitter
+from tenacity.stop import stop_base
+
+T = TypeVar("T")
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+# an attempt with less time than this left cannot usefully start
+MIN_ATTEMPT_S = 0.05
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def set_deadline(seconds: float | None) -> None:
+    """Give the current context `seconds` from now (None or <= 0 clears the deadline)."""
+    _deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline, or None when there is none."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+
+def attempt_timeout(default_s: float, stage: str) -> float:
+    """Timeout for one upstream attempt: `default_s`, capped by the time left."""
+    left = remaining()
+    if left is None:
+        return default_s
+    if left < MIN_ATTEMPT_S:
+        raise DeadlineExceeded(stage)
+    return min(default_s, left)
+
+
+async def within_deadline(aw: Awaitable[T], stage: str) -> T:
+    """Await `aw`, but no longer than the current deadline (httpx timeouts are per read, not total)."""
+    left = remaining()
+    if left is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, timeout=max(left, 0.0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage) from None
+
+
+def request_deadline(budget_s: float):
+    """FastAPI dependency factory: start a `budget_s` deadline (0 = none) for the request."""
+
+    async def dependency(x_request_timeout: float | None = Header(None)) -> None:
+        budget = budget_s
+        if x_request_timeout is not None and x_request_timeout > 0:
+            budget = min(budget, x_request_timeout) if budget > 0 else x_request_timeout
+        set_deadline(budget)
+
+    return dependency
+
+
+class stop_before_deadline(stop_base):
+    """Stop retrying when the upcoming back-off would leave no time for another attempt."""
+
+    def __call__(self, retry_state) -> bool:
+        left = remaining()
+        return left is not None and left - retry_state.upcoming_sleep < MIN_ATTEMPT_S
+
+
+def retry_within_deadline(stage: str, attempts: int, initial: float, max_wait: float, fatal: tuple = ()):
+    """tenacity.retry with jittered exponential back-off that gives up at the request deadline (or on a `fatal` error)."""
+
+    def give_up(retry_state):
+        # same RetryError as a plain tenacity retry, unless the deadline is what stopped it
+        err = retry_state.outcome.exception()
+        left = remaining()
+        if retry_state.attempt_number < attempts and left is not None and left - retry_state.upcoming_sleep < MIN_ATTEMPT_S:
+            raise DeadlineExceeded(stage) from err
+        raise RetryError(retry_state.outcome) from err
+
+    return retry(
+        wait=wait_exponential_jitter(multiplier=initial, max=max_wait),
+        stop=stop_after_attempt(attempts) | stop_before_deadline(),
+        retry=retry_if_not_exception_type((DeadlineExceeded, *fatal)),
+        retry_error_callback=give_up,
+    )
+
+
+class Hedger:
+    """Hedged requests: the delay before the duplicate is the p95 of recent successful calls."""
+
+    def __init__(self, default_delay_s: float, min_samples: int = 20, window: int = 256):
+        self.default_delay_s = default_delay_s
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.default_delay_s
+        xs = sorted(self._latencies)
+        return xs[int(0.95 * (len(xs) - 1))]
+
+    async def _timed(self, call: Callable[[], Awaitable[T]]) -> T:
+        t0 = time.monotonic()
+        out = await call()
+        self._latencies.append(time.monotonic() - t0)
+        return out
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        hedge: Callable[[], Awaitable[T]] | None = None,
+        can_hedge: Callable[[], bool] = lambda: True,
+    ) -> T:
+        """
+        Await `call()`; if it is still running after delay() and can_hedge() allows it, also
+        start `hedge()` (or a second `call()`) and return the first success. The loser is cancelled.
+        """
+        self.calls += 1
+        delay = self.delay()
+        left = remaining()
+        first = asyncio.ensure_future(self._timed(call))
+        tasks = [first]
+        try:
+            if left is not None and left <= delay:
+                # the hedge could never fire in time
+                return await first
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            if not can_hedge():
+                return await first
+            self.hedged += 1
+            tasks.append(asyncio.ensure_future(self._timed(hedge or call)))
+            pending = set(tasks)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        self.hedge_wins += t is not first
+                        return t.result()
+                    error = error or t.exception()
+            raise error  # type: ignore[misc]
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "delay_ms": round(self.delay() * 1000, 1),
+        }
@@ -0,0 +1,144 @@
+# app/dedup.py
+"""
+Near-duplicate chunk detection for ingestion.
+
+Revised handouts, resits and re-uploads share most of their text. Each chunk gets
+a MinHash signature over its word 5-gram shingles. LSH banding proposes candidate
+pairs, and a candidate is accepted when the estimated Jaccard similarity reaches the
+threshold. Accepted pairs are merged with union-find. Each cluster is indexed once,
+as its first chunk in corpus order, and that chunk records every source/page the text
+appears at.
+"""
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+
+from . import jsonutil
+
+SHINGLE_WORDS = 5
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> np.ndarray:
+    """32-bit hashes of the word k-grams of a (normalized) chunk."""
+    words = text.lower().split()
+    grams = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "big") for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # a, b < 2^32 and x < 2^32 keep a*x + b inside uint64, so the universal hash is exact
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, text: str) -> np.ndarray:
+        x = shingles(text)
+        h = ((x[:, None] * self.a[None, :] + self.b[None, :]) % _PRIME) & _MASK32
+        return h.min(axis=0).astype(np.uint32)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # the lower index (earlier in corpus order) stays the representative
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+@dataclass
+class DedupResult:
+    kept: List[Dict]
+    total: int
+    clusters: int  # clusters with more than one member
+
+    @property
+    def removed(self) -> int:
+        return self.total - len(self.kept)
+
+    @property
+    def rate(self) -> float:
+        return self.removed / self.total if self.total else 0.0
+
+
+def find_clusters(texts: List[str], threshold: float, num_perm: int = 128, bands: int = 16) -> List[int]:
+    """Representative index for every text (itself when it has no near-duplicate earlier)."""
+    if num_perm % bands:
+        raise ValueError(f"num_perm={num_perm} is not divisible by bands={bands}")
+    hasher = MinHasher(num_perm)
+    sigs = np.stack([hasher.signature(t) for t in texts]) if texts else np.zeros((0, num_perm), np.uint32)
+    uf = _UnionFind(len(texts))
+    rows = num_perm // bands
+
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        block = np.ascontiguousarray(sigs[:, band * rows:(band + 1) * rows])
+        for i in range(len(texts)):
+            buckets.setdefault(block[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            # greedy pivots keep a bucket of many exact copies linear instead of quadratic
+            pending = np.array(members)
+            while len(pending) > 1:
+                pivot, rest = pending[0], pending[1:]
+                sim = (sigs[rest] == sigs[pivot]).mean(axis=1)
+                for j in rest[sim >= threshold]:
+                    uf.union(int(pivot), int(j))
+                pending = rest[sim < threshold]
+    return [uf.find(i) for i in range(len(texts))]
+
+
+def dedup_docs(docs: List[Dict], threshold: float, num_perm: int = 128, bands: int = 16) -> DedupResult:
+    """
+    Collapse near-duplicate chunks. Representatives keep their id and text and gain
+    `occurrences` (JSON list of {source, page}, Chroma metadata must be scalar) and `dup_count`.
+    """
+    if threshold <= 0 or len(docs) < 2:
+        return DedupResult(kept=list(docs), total=len(docs), clusters=0)
+
+    roots = find_clusters([d["text"] for d in docs], threshold, num_perm, bands)
+    members: Dict[int, List[int]] = {}
+    for i, r in enumerate(roots):
+        members.setdefault(r, []).append(i)
+
+    kept = []
+    for r, idx in members.items():  # roots first appear in corpus order
+        doc = docs[r]
+        if len(idx) > 1:
+            seen, occ = set(), []
+            for i in idx:
+                m = docs[i]["metadata"]
+                where = (m.get("source"), m.get("page"))
+                if where not in seen:
+                    seen.add(where)
+                    occ.append({"source": where[0], "page": where[1]})
+            doc = {**doc, "metadata": {**doc["metadata"], "occurrences": jsonutil.dumps(occ), "dup_count": len(idx) - 1}}
+        kept.append(doc)
+    return DedupResult(kept=kept, total=len(docs), clusters=sum(1 for idx in members.values() if len(idx) > 1))
+
+
+def occurrences(metadata: Dict) -> List[Dict]:
+    """All places a (possibly collapsed) chunk's text appears, for citations."""
+    raw = metadata.get("occurrences")
+    if raw:
+        return jsonutil.loads(raw)
+    return [{"source": metadata.get("source"), "page": metadata.get("page")}]
@@ -0,0 +1,85 @@
+# app/docsum.py
+"""
+Per-document summary vectors for coarse-to-fine retrieval.
+
+Next to every shard collection `X` lives `X-docsum`, holding one entry per
+document section: up to DOCSUM_SECTION_CHUNKS consecutive chunks of one source
+(a short document is a single section). Its vector is the renormalised mean of
+the sections' chunk vectors as indexed (prefixes under EMBED_INDEX_DIM), so it
+sits in the same space as the chunks and is searched with the same query
+vector. Its document is a small JSON record, {"source", "ids"}, naming the
+chunks it covers.
+
+Retrieval (RAG._candidates) first ranks sections, keeps the DOCSUM_TOP_M best,
+and then searches only their chunks. The restriction is an `ids` filter, not
+a `where` on source: Chroma resolves metadata filters by scanning, which costs
+more than the search it narrows. It falls back to the full search when the
+summaries hold fewer than DOCSUM_TOP_M sections (nothing would be pruned) or
+when the chosen sections yield fewer than k usable chunks.
+
+Summaries are written by ingest.add_to_shards, so full builds, shard rebuilds
+and uploads all produce them. A snapshot import rebuilds them from the
+imported vectors. A store built before summaries existed simply has empty
+`-docsum` collections, and retrieval falls back to the full search until it is
+rebuilt.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+DOCSUM_SUFFIX = "-docsum"
+
+
+def summary_name(shard_name: str) -> str:
+    return f"{shard_name}{DOCSUM_SUFFIX}"
+
+
+def section_vectors(docs: List[Dict], vecs: Sequence[Sequence[float]], section_chunks: int) -> Tuple[List[str], List[List[float]], List[str], List[Dict]]:
+    """(ids, centroids, documents, metadatas) for the sections of `docs`: runs of up to section_chunks chunks of one source, in order."""
+    by_source: Dict[str, List[int]] = {}
+    for i, d in enumerate(docs):
+        by_source.setdefault(str(d["metadata"]["source"]), []).append(i)
+    x = np.asarray(vecs, dtype=np.float32)
+    step = max(1, section_chunks)
+    ids, centroids, records, metas = [], [], [], []
+    for source, idx in by_source.items():
+        for start in range(0, len(idx), step):
+            sec = idx[start:start + step]
+            c = x[sec].mean(axis=0)
+            centroids.append((c / max(float(np.linalg.norm(c)), 1e-12)).tolist())
+            # the first chunk's id is unique per build, and so is the section
+            ids.append(f"{docs[sec[0]]['id']}{DOCSUM_SUFFIX}")
+            records.append(orjson.dumps({"source": source, "ids": [docs[i]["id"] for i in sec]}).decode("utf-8"))
+            pages = [p for p in (docs[i]["metadata"].get("page") for i in sec) if p is not None]
+            metas.append({"source": source, "chunks": len(sec)} | ({"page_start": min(pages), "page_end": max(pages)} if pages else {}))
+    return ids, centroids, records, metas
+
+
+def add_summaries(coll, docs: List[Dict], vecs: Sequence[Sequence[float]], section_chunks: int) -> int:
+    """Add the sections of `docs` (all from one shard) to its summary collection; returns sections added."""
+    if not docs:
+        return 0
+    ids, centroids, records, metas = section_vectors(docs, vecs, section_chunks)
+    coll.upsert(ids=ids, embeddings=centroids, documents=records, metadatas=metas)
+    return len(ids)
+
+
+def top_sections(outs: List[Dict], n_queries: int, m: int) -> List[Tuple[List[List[str]], int]]:
+    """
+    Per query, the m nearest sections across per-shard summary results, as
+    (chunk ids per shard, distinct sources). A section's chunks are in its own shard.
+    """
+    picked = []
+    for q in range(n_queries):
+        hits = sorted((dist, s, doc) for s, out in enumerate(outs) for dist, doc in zip(out["distances"][q], out["documents"][q]))[:m]
+        ids: List[List[str]] = [[] for _ in outs]
+        sources = set()
+        for _, s, doc in hits:
+            r = orjson.loads(doc)
+            ids[s] += r["ids"]
+            sources.add(r["source"])
+        picked.append((ids, len(sources)))
+    return picked
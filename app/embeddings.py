@@ -0,0 +1,160 @@
+# app/embeddings.py
+"""
+Pluggable embedding providers, selected by Settings.EMBED_PROVIDER:
+
+  openai  text-embeddings over HTTP (admission-controlled, retried)
+  local   an ONNX sentence-embedding model on CPU, loaded from EMBED_LOCAL_PATH
+          (a directory holding model.onnx + tokenizer.json, e.g. all-MiniLM-L6-v2)
+
+The provider's `model_id` is stored in collection metadata (see store.open_collection)
+so a store can never mix vectors from two models.
+"""
+from __future__ import annotations
+
+import asyncio, os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+from .settings import settings
+from .scheduler import embed_scheduler, estimate_tokens
+from .deadline import Hedger, attempt_timeout, retry_within_deadline, within_deadline
+from .breaker import CircuitOpen, embed_breaker
+from .cassette import CassetteMiss, upstream_client
+
+
+class EmbeddingProvider:
+    model_id: str = ""
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class OpenAIEmbeddings(EmbeddingProvider):
+    def __init__(self, model: str, api_key: str, timeout_s: float = 120, hedge_max_texts: int = 0, hedge_delay_s: float = 0.3):
+        self.model = model
+        self.model_id = f"openai:{model}"
+        self.timeout_s = timeout_s
+        self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        # only query-sized calls are hedged; duplicating ingest batches would double their cost
+        self.hedge_max_texts = hedge_max_texts
+        self.hedger = Hedger(hedge_delay_s)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        tokens = estimate_tokens(sum(len(t) for t in texts))
+        embed_breaker.check()
+        async with embed_scheduler.slot(tokens):
+            if len(texts) > self.hedge_max_texts:
+                return await self._post(texts)
+            return await self._post_hedged(texts, tokens)
+
+    @retry_within_deadline("embeddings", attempts=6, initial=0.5, max_wait=8, fatal=(CircuitOpen, CassetteMiss))
+    async def _post_hedged(self, texts: List[str], tokens: int) -> List[List[float]]:
+        # embeddings are idempotent, so a slow attempt can be raced by a duplicate, as long as
+        # the duplicate does not have to queue for admission
+        async def hedge() -> List[List[float]]:
+            async with embed_scheduler.slot(tokens):
+                return await self._request(texts)
+
+        return await self.hedger.run(lambda: self._request(texts), hedge, can_hedge=lambda: embed_scheduler.has_free_slot)
+
+    @retry_within_deadline("embeddings", attempts=6, initial=0.5, max_wait=8, fatal=(CircuitOpen, CassetteMiss))
+    async def _post(self, texts: List[str]) -> List[List[float]]:
+        return await self._request(texts)
+
+    async def _request(self, texts: List[str]) -> List[List[float]]:
+        payload = {"model": self.model, "input": texts}
+        async with embed_breaker.guard(), upstream_client(attempt_timeout(self.timeout_s, "embeddings")) as client:
+            r = await within_deadline(client.post("https://api.openai.com/v1/embeddings", headers=self.headers, json=payload), "embeddings")
+            r.raise_for_status()
+            data = r.json()
+            return [d["embedding"] for d in data["data"]]
+
+
+class LocalEmbeddings(EmbeddingProvider):
+    """Mean-pooled, L2-normalised ONNX transformer; batches run on a thread pool."""
+
+    def __init__(self, path: str, workers: int = 2, batch_size: int = 32, max_tokens: int = 256):
+        # onnxruntime and tokenizers ship with chromadb, so this adds no dependency
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_dir = Path(path)
+        if not (model_dir / "model.onnx").exists() or not (model_dir / "tokenizer.json").exists():
+            raise RuntimeError(f"EMBED_LOCAL_PATH={path!r} must contain model.onnx and tokenizer.json")
+
+        self.model_id = f"local:{model_dir.resolve().name}"
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_tokens)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        opts = onnxruntime.SessionOptions()
+        # parallelism comes from the worker pool; keep each run single-threaded
+        opts.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(str(model_dir / "model.onnx"), opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        enc = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in enc], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+        m = mask[..., None].astype(np.float32)
+        pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32).tolist()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(loop.run_in_executor(self._pool, self._encode, b) for b in batches))
+        return [v for batch in results for v in batch]
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def make_provider() -> EmbeddingProvider:
+    if settings.EMBED_PROVIDER == "openai":
+        return OpenAIEmbeddings(
+            settings.EMBED_MODEL,
+            settings.OPENAI_API_KEY,
+            hedge_max_texts=settings.EMBED_HEDGE_MAX_TEXTS,
+            hedge_delay_s=settings.EMBED_HEDGE_DEFAULT_MS / 1000,
+        )
+    if settings.EMBED_PROVIDER == "local":
+        return LocalEmbeddings(
+            settings.EMBED_LOCAL_PATH,
+            workers=settings.EMBED_WORKERS,
+            batch_size=settings.EMBED_BATCH_SIZE,
+            max_tokens=settings.EMBED_MAX_TOKENS,
+        )
+    raise RuntimeError(f"Unknown EMBED_PROVIDER {settings.EMBED_PROVIDER!r} (expected 'openai' or 'local')")
+
+
+_provider: EmbeddingProvider | None = None
+_provider_pid: int | None = None
+
+
+def get_embedder() -> EmbeddingProvider:
+    """Per-process singleton (the local model and its pool must not cross a fork)."""
+    global _provider, _provider_pid
+    if _provider is None or _provider_pid != os.getpid():
+        _provider = make_provider()
+        _provider_pid = os.getpid()
+    return _provider
+
+
+def close_embedder() -> None:
+    global _provider
+    if _provider is not None and _provider_pid == os.getpid():
+        _provider.close()
+    _provider = None
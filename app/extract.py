@@ -0,0 +1,137 @@
+# app/extract.py
+"""
+Parallel, cached PDF text extraction for ingestion.
+
+pypdf's extract_text is pure-Python and CPU-bound, so pages are spread over a
+process pool in contiguous page ranges (each task parses the file once). Every
+page's text is cached at
+
+    {EXTRACT_CACHE_DIR}/{extractor version}/{sha256 of file}/{page}.txt
+
+so unchanged PDFs are never re-parsed. Renaming or moving a file keeps its
+cache, and upgrading pypdf starts a fresh one.
+"""
+from __future__ import annotations
+
+import hashlib, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pypdf
+
+EXTRACTOR_VERSION = f"pypdf-{pypdf.__version__}"
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    # runs in a worker process; page numbers are 1-based like the chunk metadata
+    reader = pypdf.PdfReader(path)
+    return [(i + 1, reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+@dataclass
+class ExtractStats:
+    files: int = 0
+    pages: int = 0
+    cached_pages: int = 0
+    seconds: float = 0.0
+    workers: int = 1
+
+    @property
+    def extracted_pages(self) -> int:
+        return self.pages - self.cached_pages
+
+    @property
+    def pages_per_s(self) -> float:
+        return self.extracted_pages / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class _Pending:
+    path: Path
+    cache_dir: Path | None
+    n_pages: int
+    texts: Dict[int, str] = field(default_factory=dict)
+
+
+class PageCache:
+    def __init__(self, root: str | Path | None, version: str = EXTRACTOR_VERSION):
+        self.root = Path(root) / version if root else None
+
+    def dir_for(self, digest: str) -> Path | None:
+        return self.root / digest if self.root else None
+
+    def load(self, cache_dir: Path | None) -> List[str] | None:
+        # "pages" is written last, so its presence means every page file is complete
+        if cache_dir is None or not (cache_dir / "pages").exists():
+            return None
+        n = int((cache_dir / "pages").read_text())
+        return [(cache_dir / f"{p}.txt").read_text(encoding="utf-8") for p in range(1, n + 1)]
+
+    def store(self, cache_dir: Path | None, pages: List[str]) -> None:
+        if cache_dir is None:
+            return
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for p, text in enumerate(pages, start=1):
+            tmp = cache_dir / f"{p}.txt.tmp"
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, cache_dir / f"{p}.txt")
+        (cache_dir / "pages").write_text(str(len(pages)))
+
+
+def resolve_workers(workers: int) -> int:
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def extract_pdfs(paths: List[Path], workers: int = 0, cache_dir: str | Path | None = None) -> Tuple[Dict[Path, List[str]], ExtractStats]:
+    """Page texts for every PDF (index 0 = page 1), reading the cache first."""
+    workers = resolve_workers(workers)
+    cache = PageCache(cache_dir)
+    stats = ExtractStats(files=len(paths), workers=workers)
+    t0 = time.perf_counter()
+
+    out: Dict[Path, List[str]] = {}
+    pending: List[_Pending] = []
+    for path in paths:
+        cdir = cache.dir_for(file_hash(path))
+        cached = cache.load(cdir)
+        if cached is not None:
+            out[path] = cached
+            stats.pages += len(cached)
+            stats.cached_pages += len(cached)
+        else:
+            pending.append(_Pending(path, cdir, len(pypdf.PdfReader(str(path)).pages)))
+
+    # ranges sized so every worker gets a few tasks, but each task amortises parsing the file
+    total = sum(p.n_pages for p in pending)
+    span = max(1, -(-total // (workers * 4))) if total else 1
+    tasks = [(p, s, min(s + span, p.n_pages)) for p in pending for s in range(0, p.n_pages, span)]
+
+    if workers <= 1 or len(tasks) <= 1:
+        for p, s, e in tasks:
+            p.texts.update(_extract_range(str(p.path), s, e))
+    else:
+        # spawn, not fork: callers may hold threads (Chroma, the embedding pool, an event loop)
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx) as pool:
+            futures = [(p, pool.submit(_extract_range, str(p.path), s, e)) for p, s, e in tasks]
+            for p, fut in futures:
+                p.texts.update(fut.result())
+
+    for p in pending:
+        pages = [p.texts.get(i, "") for i in range(1, p.n_pages + 1)]
+        cache.store(p.cache_dir, pages)
+        out[p.path] = pages
+        stats.pages += p.n_pages
+
+    stats.seconds = time.perf_counter() - t0
+    return out, stats
@@ -0,0 +1,165 @@
+# app/fullvec.py
+"""
+Reduced-dimension index vectors (EMBED_INDEX_DIM) with full-dimension re-scoring.
+
+text-embedding-3 models are trained so that a prefix of the vector, once
+renormalised, is still a usable embedding (this is what the API's `dimensions`
+parameter does). Indexing the first 256 or 512 of 1536 dimensions makes the
+HNSW graph and every distance computation 3-6x smaller, at some cost in ranking
+quality.
+
+To win that back, each chunk's full vector is kept outside Chroma, and the
+nearest candidates from the reduced index are re-scored with it. Chroma indexes
+every metadata string on (key, value), so a vector stored as metadata is
+written twice and the "reduced" store ends up larger on disk than a
+full-dimension one. The side store is a SQLite file (FULLVEC_PATH, default
+fullvec.sqlite3 in CHROMA_DIR) with one float16 row per (shard collection,
+chunk id); only those keys are indexed. It is read only for the candidates a
+query re-scores.
+
+add_to_shards writes a chunk's full vector before the chunk itself, so every
+searchable chunk has one. Rows follow their collections: ingest and snapshot
+import drop them with the collections they garbage-collect, and snapshots
+carry them as fullvec.npy. With CHROMA_HOST, FULLVEC_PATH must be on storage
+every API worker and the ingest worker can reach. A chunk without a full
+vector keeps its prefix distance.
+"""
+from __future__ import annotations
+
+import os, sqlite3, threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from .settings import settings
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_MAX_VARS = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    vec BLOB NOT NULL,
+    PRIMARY KEY (collection, id)
+)
+"""
+
+
+def index_model_id(model_id: str, dim: int | None = None) -> str:
+    """The `embed_model` tag for collections holding `dim`-dimension prefixes (dim 0 = full vectors)."""
+    dim = settings.EMBED_INDEX_DIM if dim is None else dim
+    # a different tag per dimension makes store.open_collection refuse mixed stores
+    return f"{model_id}@{dim}" if dim else model_id
+
+
+def truncate(vecs: Sequence[Sequence[float]], dim: int) -> np.ndarray:
+    """The first `dim` components of each vector, renormalised to unit length."""
+    x = np.asarray(vecs, dtype=np.float32)
+    if dim >= x.shape[1]:
+        raise ValueError(f"EMBED_INDEX_DIM={dim} must be smaller than the embedding dimension ({x.shape[1]})")
+    x = x[:, :dim]
+    return x / np.clip(np.linalg.norm(x, axis=1, keepdims=True), 1e-12, None)
+
+
+def index_vectors(embs: List[List[float]], dim: int) -> Tuple[List[List[float]], np.ndarray | None]:
+    """(vectors to index, full vectors for the side store); the latter is None when indexing full vectors."""
+    if not dim or not embs:
+        return embs, None
+    return truncate(embs, dim).tolist(), np.asarray(embs, dtype=np.float32)
+
+
+class FullVectorStore:
+    """Full vectors of a reduced index's chunks, keyed by (shard collection, chunk id)."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # one connection, shared by the to_thread workers under a lock
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def put(self, collection: str, ids: Sequence[str], vecs: Sequence[Sequence[float]]) -> None:
+        rows = np.asarray(vecs, dtype="<f2")
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)",
+                ((collection, id_, row.tobytes()) for id_, row in zip(ids, rows)),
+            )
+
+    def get(self, collections: Sequence[str], ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """id -> full vector for the `ids` stored under any of `collections` (the shards of one index version)."""
+        out: Dict[str, np.ndarray] = {}
+        ids = list(dict.fromkeys(ids))
+        step = _MAX_VARS - len(collections)
+        cols = ",".join("?" * len(collections))
+        with self._lock:
+            for i in range(0, len(ids), step):
+                part = ids[i:i + step]
+                rows = self._db.execute(
+                    f"SELECT id, vec FROM vectors WHERE collection IN ({cols}) AND id IN ({','.join('?' * len(part))})",
+                    (*collections, *part),
+                ).fetchall()
+                out.update((id_, np.frombuffer(vec, dtype="<f2").astype(np.float32)) for id_, vec in rows)
+        return out
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM vectors WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def drop(self, collections: Iterable[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM vectors WHERE collection = ?", ((c,) for c in collections))
+
+    def checkpoint(self) -> None:
+        """Fold the write-ahead log into the database file and truncate it (e.g. before measuring its size)."""
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_stores: Dict[Path, FullVectorStore] = {}
+_stores_pid: int | None = None
+
+
+def fullvec_path(chroma_path: str | None = None) -> Path:
+    """FULLVEC_PATH, or fullvec.sqlite3 next to the Chroma data (`chroma_path` as given to store.open_client)."""
+    if settings.FULLVEC_PATH and chroma_path is None:
+        return Path(settings.FULLVEC_PATH)
+    return Path(chroma_path or settings.CHROMA_DIR) / "fullvec.sqlite3"
+
+
+def open_fullvecs(chroma_path: str | None = None) -> FullVectorStore:
+    """The process's FullVectorStore for a store (one connection per path and process)."""
+    global _stores_pid
+    if _stores_pid != os.getpid():
+        _stores.clear()
+        _stores_pid = os.getpid()
+    path = fullvec_path(chroma_path)
+    if path not in _stores:
+        _stores[path] = FullVectorStore(path)
+    return _stores[path]
+
+
+def rescore(hits: List[Tuple[str, str, Dict, float]], q_full: Sequence[float] | None, full: Dict[str, np.ndarray]) -> List[Tuple[str, str, Dict, float]]:
+    """
+    Replace each hit's reduced-index distance with its full-vector cosine distance.
+
+    Hits without a vector in `full` keep their distance; with q_full=None all of them do.
+    """
+    scored = [i for i, (id_, *_) in enumerate(hits) if id_ in full] if q_full is not None else []
+    dists = [dist for *_, dist in hits]
+    if scored:
+        # one matrix-vector product for all candidates
+        m = np.stack([full[hits[i][0]] for i in scored])
+        q = np.asarray(q_full, dtype=np.float32)
+        sims = m @ q / np.clip(np.linalg.norm(m, axis=1) * np.linalg.norm(q), 1e-12, None)
+        for i, sim in zip(scored, sims.tolist()):
+            dists[i] = 1.0 - sim
+    return [(id_, text, meta, dist) for (id_, text, meta, _), dist in zip(hits, dists)]
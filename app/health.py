@@ -0,0 +1,101 @@
+# app/health.py
+"""
+Background dependency probing.
+
+Redis and OpenAI are checked every HEALTH_INTERVAL_S by a task started in the
+app lifespan. Endpoints only read the cached results, so load-balancer polls
+never cause upstream traffic and never wait on a slow dependency.
+"""
+from __future__ import annotations
+
+import asyncio, time
+from typing import Any, Awaitable, Callable, Dict
+
+from .llm import ping_openai
+from .logger import log_event
+from .memory import get_memory
+from .settings import settings
+
+
+async def _probe_redis() -> Dict[str, Any]:
+    r = get_memory().r
+    ok = bool(await r.ping())
+    return {"ok": ok, "dbsize": await r.dbsize() if ok else None, "url": settings.REDIS_URL}
+
+
+async def _probe_openai() -> Dict[str, Any]:
+    # in replay mode "ok" means the cassette, not the API (see cassette.py)
+    return {"ok": await ping_openai(), "model": settings.MODEL_NAME} | ({"cassette": settings.CASSETTE_MODE} if settings.CASSETTE_MODE else {})
+
+
+class HealthMonitor:
+    def __init__(self, interval_s: float, timeout_s: float, max_age_s: float):
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.max_age_s = max_age_s
+        self.probes: Dict[str, Callable[[], Awaitable[Dict[str, Any]]]] = {
+            "redis": _probe_redis,
+            "openai": _probe_openai,
+        }
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def _run(self, name: str, probe: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        t0 = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(probe(), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timed out after {self.timeout_s}s"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        prev = self.results.get(name, {}).get("ok")
+        self.results[name] = {
+            **result,
+            "checked_at": time.time(),
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+        if prev is not None and prev != result["ok"]:
+            log_event("health.change", {"dependency": name, "ok": result["ok"]})
+
+    async def probe_once(self) -> None:
+        await asyncio.gather(*(self._run(name, probe) for name, probe in self.probes.items()))
+
+    async def _loop(self) -> None:
+        while True:
+            await self.probe_once()
+            await asyncio.sleep(self.interval_s)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self, name: str) -> Dict[str, Any]:
+        """Cached result for one dependency, with its age; stale results count as failing."""
+        result = self.results.get(name)
+        if result is None:
+            return {"ok": False, "error": "not probed yet", "age_s": None}
+        age = time.time() - result["checked_at"]
+        out = {**result, "age_s": round(age, 1)}
+        if age > self.max_age_s:
+            out["ok"] = False
+            out["stale"] = True
+        return out
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.status(name) for name in self.probes}
+
+
+health_monitor = HealthMonitor(
+    interval_s=settings.HEALTH_INTERVAL_S,
+    timeout_s=settings.HEALTH_TIMEOUT_S,
+    max_age_s=settings.HEALTH_MAX_AGE_S,
+)
@@ -1,7 +1,7 @@
 # app/ingest.py
 from __future__ import annotations
 
-import os, re, uuid, asyncio
+import os, re, uuid, asyncio, argparse
 
 from pathlib import Path
 
@@ -9,19 +9,29 @@ from typing import List, Dict, Iterable
 
 
 
-import httpx
+from pypdf import PdfReader
 
-from tenacity import retry, wait_exponential_jitter, stop_after_attempt
 
-import chromadb
 
-from chromadb.config import Settings as ChromaSettings
+from .settings import settings
 
-from pypdf import PdfReader
+from .embeddings import get_embedder
 
+from .store import open_client, open_collection, resolve_index, next_version, version_base, flip_alias, gc_versions
 
+from .shards import shard_names, shard_of, shard_key
 
-from .settings import settings
+
+
+from .dedup import dedup_docs
+
+
+
+from .extract import extract_pdfs
+
+from .fullvec import FullVectorStore, index_model_id, index_vectors, open_fullvecs
+
+from .docsum import add_summaries, summary_name
 
 
 
@@ -63,21 +73,27 @@ def chunk_text(text: str, chunk_chars: int = 2000, overlap: int = 300) -> List[s
 
         chunks.append(chunk)
 
+        if end == n:
+
+            break  # stepping back by `overlap` from here would only re-emit the tail
+
         start = max(end - overlap, start + 1)
 
     return chunks
 
 
 
-def load_pdf(path: Path) -> List[Dict]:
+def load_pdf(path: Path, pages: List[str] | None = None) -> List[Dict]:
 
-    reader = PdfReader(str(path))
+    # pages: text per page, pre-extracted by extract.extract_pdfs (in parallel, cached)
 
-    docs = []
+    if pages is None:
+
+        pages = [page.extract_text() or "" for page in PdfReader(str(path)).pages]
 
-    for i, page in enumerate(reader.pages, start=1):
+    docs = []
 
-        raw = page.extract_text() or ""
+    for i, raw in enumerate(pages, start=1):
 
         for j, ch in enumerate(chunk_text(raw)):
 
@@ -85,6 +101,8 @@ def load_pdf(path: Path) -> List[Dict]:
 
                 "id": f"{path.name}:{i}:{j}:{uuid.uuid4().hex[:8]}",
 
+                "key": f"{path}:{i}:{j}",  # stable across runs, used for hash sharding
+
                 "text": ch,
 
                 "metadata": {"source": str(path), "page": i},
@@ -107,6 +125,8 @@ def load_txt(path: Path) -> List[Dict]:
 
             "id": f"{path.name}:{j}:{uuid.uuid4().hex[:8]}",
 
+            "key": f"{path}:{j}",
+
             "text": ch,
 
             "metadata": {"source": str(path), "page": None},
@@ -117,59 +137,149 @@ def load_txt(path: Path) -> List[Dict]:
 
 
 
-OPENAI_API_KEY = settings.OPENAI_API_KEY
+async def embed_batch(texts: List[str]) -> List[List[float]]:
+
+    return await get_embedder().embed(texts)
 
-EMBED_MODEL = settings.EMBED_MODEL
 
-HEADERS = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
 
+async def embed_texts_batched(texts: List[str], batch_size: int = 128) -> List[List[float]]:
 
+    out: List[List[float]] = []
 
-@retry(wait=wait_exponential_jitter(initial=0.5, max=8), stop=stop_after_attempt(6))
+    for i in range(0, len(texts), batch_size):
 
-async def embed_batch(texts: List[str]) -> List[List[float]]:
+        out.extend(await embed_batch(texts[i:i+batch_size]))
 
-    payload = {"model": EMBED_MODEL, "input": texts}
+    return out
 
-    async with httpx.AsyncClient(timeout=120) as client:
+def add_to_shards(colls: List, docs: List[Dict], embs: List[List[float]], index_dim: int | None = None, summaries: List | None = None, fullvecs: FullVectorStore | None = None) -> List[int]:
 
-        r = await client.post("https://api.openai.com/v1/embeddings", headers=HEADERS, json=payload)
+    """Add embedded chunks to their shard collections (d["shard"] is set), and their section centroids to `summaries`; returns per-shard counts."""
 
-        r.raise_for_status()
+    # with a reduced index dimension the full vectors go to the side store (`fullvecs`, default: open_fullvecs())
 
-        data = r.json()
+    embs, full = index_vectors(embs, settings.EMBED_INDEX_DIM if index_dim is None else index_dim)
 
-        return [d["embedding"] for d in data["data"]]
+    if full is not None and fullvecs is None:
 
+        fullvecs = open_fullvecs()
 
+    counts = [0] * len(colls)
 
-async def embed_texts_batched(texts: List[str], batch_size: int = 128) -> List[List[float]]:
+    for s, coll in enumerate(colls):
 
-    out: List[List[float]] = []
+        idx = [i for i, d in enumerate(docs) if d["shard"] == s]
 
-    for i in range(0, len(texts), batch_size):
+        if not idx:
+
+            continue
+
+        if full is not None:
+
+            # before the chunk becomes searchable, so a search never finds it without its full vector
+
+            fullvecs.put(coll.name, [docs[i]["id"] for i in idx], full[idx])
+
+        # upsert: a re-run upload batch (see jobs.process_job) replaces its chunks rather than failing or duplicating
+
+        coll.upsert(
+
+            ids=[docs[i]["id"] for i in idx],
+
+            embeddings=[embs[i] for i in idx],
+
+            documents=[docs[i]["text"] for i in idx],
+
+            # Chroma rejects None values; readers use .get(), so a missing key reads the same
+
+            metadatas=[{k: v for k, v in docs[i]["metadata"].items() if v is not None} for i in idx],
+
+        )
+
+        if summaries:
+
+            add_summaries(summaries[s], [docs[i] for i in idx], [embs[i] for i in idx], settings.DOCSUM_SECTION_CHUNKS)
+
+        counts[s] = len(idx)
+
+    return counts
+
+
+
+def validate_build(colls: List, expected: List[int], require_chunks: bool = True) -> List[str]:
+
+    """Reasons not to flip the alias to a freshly built version (empty list = OK); require_chunks=False lets a single-shard rebuild come out empty."""
+
+    problems = []
+
+    for coll, n in zip(colls, expected):
+
+        count = coll.count()
+
+        if count != n:
+
+            problems.append(f"{coll.name}: {count} chunks stored, {n} added")
+
+        elif n:
+
+            # the index must answer: a stored vector should find itself at distance ~0
+
+            probe = coll.get(limit=1, include=["embeddings"])
+
+            top = coll.query(query_embeddings=[probe["embeddings"][0]], n_results=1, include=["distances"])
+
+            if not top["distances"][0] or top["distances"][0][0] > 1e-3:
+
+                problems.append(f"{coll.name}: self-query failed")
+
+    if require_chunks and not sum(expected):
+
+        problems.append("no chunks were indexed")
+
+    return problems
 
-        out.extend(await embed_batch(texts[i:i+batch_size]))
 
-    return out
 
+def main(argv: List[str] | None = None):
 
+    ap = argparse.ArgumentParser(description="Index DATA_DIR into the Chroma vector store.")
 
-def main():
+    ap.add_argument("--shard", type=int, default=None, help="rebuild only this shard as a new version, leaving the others untouched")
 
-    if not OPENAI_API_KEY:
+    ap.add_argument("--no-dedup", action="store_true", help="index near-duplicate chunks separately")
+
+    ap.add_argument("--workers", type=int, default=settings.INGEST_WORKERS, help="PDF extraction processes (0 = one per CPU)")
+
+    ap.add_argument("--no-cache", action="store_true", help="re-extract every PDF instead of reading EXTRACT_CACHE_DIR")
+
+    args = ap.parse_args(argv)
+
+
+
+    if settings.EMBED_PROVIDER == "openai" and not settings.OPENAI_API_KEY:
 
         raise RuntimeError("OPENAI_API_KEY missing in environment/.env")
 
 
 
+    n_shards = settings.CHROMA_SHARDS
+
+    if args.shard is not None and not 0 <= args.shard < n_shards:
+
+        raise SystemExit(f"--shard must be in [0, {n_shards}) for CHROMA_SHARDS={n_shards}")
+
+
+
     data_dir = Path(settings.DATA_DIR)
 
     data_dir.mkdir(parents=True, exist_ok=True)
 
 
 
-    files = list(data_dir.rglob("*.pdf")) + list(data_dir.rglob("*.txt"))
+    # sorted so dedup representatives (first occurrence wins) are stable across runs
+
+    files = sorted(data_dir.rglob("*.pdf")) + sorted(data_dir.rglob("*.txt"))
 
     if not files:
 
@@ -179,48 +289,144 @@ def main():
 
 
 
-    client = chromadb.PersistentClient(
+    client = open_client()
+
+    embed_model = index_model_id(get_embedder().model_id)
+
+    # build into new collections and only flip the alias once they validate; the live
+
+    # index keeps serving unchanged until then (a --shard rebuild replaces just that shard)
+
+    version = next_version(client)
+
+    new_names = shard_names(n_shards, version_base(version))
+
+    live, _ = resolve_index(client, n_shards)
+
+    if args.shard is not None:
+
+        if len(live) != n_shards:
+
+            raise SystemExit(f"The live index has {len(live)} shards but CHROMA_SHARDS={n_shards}; rebuild all shards")
+
+        names = live[:args.shard] + [new_names[args.shard]] + live[args.shard + 1:]
+
+    else:
+
+        names = new_names
+
+    colls = [open_collection(client, n, embed_model) for n in names]
+
+    summaries = [open_collection(client, summary_name(n), embed_model) for n in names]
+
+
+
+    # dedup needs the whole corpus, so load everything before embedding anything
+
+    pdfs = [fp for fp in files if fp.suffix.lower() == ".pdf"]
+
+    page_texts, xstats = extract_pdfs(pdfs, args.workers, None if args.no_cache else settings.EXTRACT_CACHE_DIR)
+
+    if pdfs:
+
+        print(
 
-        path=settings.CHROMA_DIR,
+            f"Extracted {xstats.pages} pages from {xstats.files} PDFs in {xstats.seconds:.1f}s "
 
-        settings=ChromaSettings(anonymized_telemetry=False),
+            f"({xstats.cached_pages} from cache; {xstats.extracted_pages} parsed at {xstats.pages_per_s:.1f} pages/s with {xstats.workers} workers)"
 
-    )
+        )
 
-    coll = client.get_or_create_collection("docs", metadata={"hnsw:space": "cosine"})
+    by_file = [(fp, load_pdf(fp, page_texts[fp]) if fp.suffix.lower() == ".pdf" else load_txt(fp)) for fp in files]
 
+    corpus = [d for _, docs in by_file for d in docs]
 
+    threshold = 0.0 if args.no_dedup else settings.DEDUP_THRESHOLD
 
-    all_ids, all_docs, all_meta = [], [], []
+    dedup = dedup_docs(corpus, threshold, settings.DEDUP_NUM_PERM, settings.DEDUP_BANDS)
 
-    for fp in files:
+    kept_by_source: Dict[str, List[Dict]] = {}
 
-        docs = load_pdf(fp) if fp.suffix.lower() == ".pdf" else load_txt(fp)
+    for d in dedup.kept:
+
+        kept_by_source.setdefault(d["metadata"]["source"], []).append(d)
+
+
+
+    all_ids, per_shard = [], [0] * n_shards
+
+    for fp, loaded in by_file:
+
+        docs = kept_by_source.get(str(fp), [])
+
+        for d in docs:
+
+            d["shard"] = shard_of(shard_key(d, settings.CHROMA_SHARD_BY), n_shards)
+
+        if args.shard is not None:
+
+            docs = [d for d in docs if d["shard"] == args.shard]
 
         if not docs:
 
             continue
 
-        ids = [d["id"] for d in docs]
-
         texts = [d["text"] for d in docs]
 
-        metas = [d["metadata"] for d in docs]
+        embs = asyncio.run(embed_texts_batched(texts))
+
 
 
+        for s, added in enumerate(add_to_shards(colls, docs, embs, summaries=summaries)):
 
-        embs = asyncio.run(embed_texts_batched(texts))
+            per_shard[s] += added
+
+        all_ids += [d["id"] for d in docs]
+
+        print(f"Indexed {len(docs)} chunks from {fp.name}" + (f" ({len(loaded) - len(docs)} duplicates skipped)" if args.shard is None and len(loaded) > len(docs) else ""))
 
-        coll.add(ids=ids, embeddings=embs, documents=texts, metadatas=metas)
 
-        all_ids += ids
 
-        print(f"Indexed {len(ids)} chunks from {fp.name}")
+    built = [args.shard] if args.shard is not None else list(range(n_shards))
 
+    # one shard of a small corpus (or of many shards) can legitimately hold nothing
 
+    problems = validate_build([colls[s] for s in built], [per_shard[s] for s in built], require_chunks=args.shard is None)
+
+    if problems:
+
+        for s in built:
+
+            client.delete_collection(names[s])
+
+            client.delete_collection(summary_name(names[s]))
+
+        if settings.EMBED_INDEX_DIM:
+
+            open_fullvecs().drop(names[s] for s in built)
+
+        raise SystemExit("Build failed validation, live index unchanged:\n  " + "\n  ".join(problems))
+
+    generation = flip_alias(client, names, n_shards)
+
+    dropped = gc_versions(client)
+
+    if settings.EMBED_INDEX_DIM:
+
+        open_fullvecs().drop(dropped)
 
     print(f"Done. Total chunks: {len(all_ids)} → store: {settings.CHROMA_DIR}")
 
+    print(f"Live index: v{version} (generation {generation}); removed old collections: {', '.join(dropped) or 'none'}")
+
+    if threshold > 0:
+
+        print(f"Dedup: {dedup.total} chunks → {len(dedup.kept)} unique, {dedup.removed} near-duplicates in {dedup.clusters} clusters ({dedup.rate:.1%} removed)")
+
+    if n_shards > 1:
+
+        print("Per shard: " + ", ".join(f"{names[s]}={per_shard[s] if s in built else colls[s].count()}" for s in range(n_shards)))
+
 
 
 if __name__ == "__main__":
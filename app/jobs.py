@@ -0,0 +1,378 @@
+# app/jobs.py
+"""
+Document uploads and the Redis-backed ingestion queue.
+
+POST /documents stores the file under DATA_DIR/uploads/{user}/ and enqueues a job:
+
+  job:{id}          hash: owner, file, status, chunks_total/done, timestamps, heartbeat
+  ingest:queue      list of job ids waiting (LPUSH in, BLMOVE out: FIFO)
+  ingest:processing list of job ids claimed by a worker
+  userjobs:{u}      the user's most recent job ids (not under user:{u}, the signup hashes)
+
+Workers run standalone via `python -m app.jobs`, which needs a Chroma server
+(CHROMA_HOST): an embedded store must not be written by several processes, and
+API workers would not see chunks indexed by another process. Without a server,
+uploads can be processed inside the API (INGEST_QUEUE_WORKERS tasks), as long as
+it runs a single worker process. With neither, uploads are refused (503). Embedded
+chunks are added to the live collections batch by batch, so a document becomes
+searchable while it is still being processed.
+A job whose worker stops heartbeating (crash, restart) is moved back onto the queue
+by the next worker, and resumes after its last committed batch. If the index alias
+flips mid-job, the job starts over in the new version, or stops there if a rebuild
+already indexed the file.
+"""
+from __future__ import annotations
+
+import asyncio, re, time, uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from redis.asyncio import Redis
+
+from .auth import get_current_user, is_admin
+from .dedup import dedup_docs
+from .embeddings import get_embedder
+from .extract import extract_pdfs
+from .ingest import add_to_shards, load_pdf, load_txt
+from .logger import log_event
+from .memory import get_redis
+from .ratelimit import enforce_rate_limit
+from .rcache import INDEX_WRITES_KEY
+from .retriever import get_rag
+from .schemas import JobStatus
+from .settings import settings
+from .shards import shard_key, shard_of
+
+QUEUE = "ingest:queue"
+PROCESSING = "ingest:processing"
+EMBED_BATCH = 64
+HEARTBEAT_S = 5.0
+STALE_AFTER_S = 120.0
+USER_JOBS_KEPT = 100
+ALLOWED_SUFFIXES = {".pdf", ".txt"}
+
+_INT_FIELDS = ("chunks_total", "chunks_done", "duplicates")
+_FLOAT_FIELDS = ("created_at", "started_at", "embed_started_at", "finished_at", "heartbeat")
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def _user_jobs_key(user_id: str) -> str:
+    return f"userjobs:{user_id}"
+
+
+class JobQueue:
+    def __init__(self, r: Redis, ttl_s: int):
+        self.r = r
+        self.ttl_s = ttl_s
+
+    async def enqueue(self, user_id: str, filename: str, path: Path, job_id: str) -> None:
+        key = _job_key(job_id)
+        pipe = self.r.pipeline()
+        pipe.hset(key, mapping={
+            "user": user_id,
+            "filename": filename,
+            "path": str(path),
+            "status": "queued",
+            "created_at": time.time(),
+        })
+        pipe.expire(key, self.ttl_s)
+        pipe.lpush(_user_jobs_key(user_id), job_id)
+        pipe.ltrim(_user_jobs_key(user_id), 0, USER_JOBS_KEPT - 1)
+        pipe.lpush(QUEUE, job_id)
+        await pipe.execute()
+
+    async def claim(self, timeout_s: int = 1) -> str | None:
+        # atomically moved, so a job is never lost between being popped and being worked on
+        job_id = await self.r.blmove(QUEUE, PROCESSING, timeout_s, "RIGHT", "LEFT")
+        # beat at once, so a sweep does not take a just-claimed job for an abandoned one (an expired
+        # job is left without a hash: process_job drops it)
+        if job_id is not None and await self.r.exists(_job_key(job_id)):
+            await self.r.hset(_job_key(job_id), "heartbeat", time.time())
+        return job_id
+
+    async def get(self, job_id: str) -> Dict[str, Any] | None:
+        raw = await self.r.hgetall(_job_key(job_id))
+        if not raw:
+            return None
+        job: Dict[str, Any] = {**raw, "job_id": job_id}
+        for f in _INT_FIELDS:
+            job[f] = int(job.get(f, 0))
+        for f in _FLOAT_FIELDS:
+            if f in job:
+                job[f] = float(job[f])
+        return job
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        await self.r.hset(_job_key(job_id), mapping={**fields, "heartbeat": time.time()})
+
+    async def finish(self, job_id: str, **fields: Any) -> None:
+        pipe = self.r.pipeline()
+        pipe.hset(_job_key(job_id), mapping={**fields, "finished_at": time.time()})
+        pipe.lrem(PROCESSING, 1, job_id)
+        await pipe.execute()
+
+    async def requeue_stale(self, stale_after_s: float) -> int:
+        moved = 0
+        for job_id in await self.r.lrange(PROCESSING, 0, -1):
+            beat, created = await self.r.hmget(_job_key(job_id), "heartbeat", "created_at")
+            # no heartbeat yet: claimed an instant ago, so only the job's age can make it stale;
+            # no hash at all: expired, and requeued so that a worker drops it
+            last = beat or created
+            if last is not None and time.time() - float(last) < stale_after_s:
+                continue
+            # LREM decides the race when several workers notice the same stale job
+            if await self.r.lrem(PROCESSING, 1, job_id):
+                await self.r.hset(_job_key(job_id), mapping={"status": "queued", "heartbeat": time.time()})
+                await self.r.rpush(QUEUE, job_id)  # right end: next to be claimed
+                moved += 1
+        return moved
+
+    async def for_user(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        ids = await self.r.lrange(_user_jobs_key(user_id), 0, limit - 1)
+        jobs = [await self.get(i) for i in ids]
+        return [j for j in jobs if j is not None]
+
+
+def get_queue() -> JobQueue:
+    return JobQueue(get_redis(), settings.JOB_TTL_S)
+
+
+def job_view(job: Dict[str, Any]) -> JobStatus:
+    total, done = job["chunks_total"], job["chunks_done"]
+    eta = None
+    if job["status"] == "embedding" and done and job.get("embed_started_at"):
+        rate = done / max(time.time() - job["embed_started_at"], 1e-3)
+        eta = round((total - done) / rate, 1)
+    return JobStatus(
+        job_id=job["job_id"],
+        status=job["status"],
+        filename=job["filename"],
+        chunks_total=total,
+        chunks_done=done,
+        duplicates=job["duplicates"],
+        progress=round(done / total, 3) if total else (1.0 if job["status"] == "done" else 0.0),
+        eta_s=eta,
+        error=job.get("error") or None,
+        created_at=job["created_at"],
+        started_at=job.get("started_at"),
+        finished_at=job.get("finished_at"),
+    )
+
+
+def _load_chunks(path: Path) -> tuple[List[Dict], int]:
+    """Chunks of one uploaded file (blocking: extraction, chunking, dedup) and the duplicates dropped."""
+    if path.suffix.lower() == ".pdf":
+        pages, _ = extract_pdfs([path], settings.INGEST_WORKERS, settings.EXTRACT_CACHE_DIR)
+        docs = load_pdf(path, pages[path])
+    else:
+        docs = load_txt(path)
+    kept = dedup_docs(docs, settings.DEDUP_THRESHOLD, settings.DEDUP_NUM_PERM, settings.DEDUP_BANDS)
+    return kept.kept, kept.removed
+
+
+def _indexed_by_build(shards: List, job: Dict[str, Any]) -> bool:
+    """Whether the live index already holds this upload from a full rebuild (which scans DATA_DIR, uploads included)."""
+    own = f"{job['job_id']}:"
+    for coll in shards:
+        got = coll.get(where={"source": job["path"]}, include=[])
+        if any(not i.startswith(own) for i in got["ids"]):
+            return True
+    return False
+
+
+async def process_job(queue: JobQueue, job_id: str) -> None:
+    job = await queue.get(job_id)
+    if job is None:  # expired while queued
+        await queue.r.lrem(PROCESSING, 1, job_id)
+        return
+    t0 = time.time()
+    await queue.update(job_id, status="extracting", started_at=t0)
+    try:
+        docs, duplicates = await asyncio.to_thread(_load_chunks, Path(job["path"]))
+        for d in docs:
+            # deterministic ids (upserted), so re-running a batch overwrites its chunks instead of duplicating them
+            d["id"] = f"{job_id}:{d['key'][len(job['path']) + 1:]}"
+        rag = get_rag()
+        await asyncio.to_thread(rag.refresh)  # a standalone worker has no IndexWatcher to follow the alias
+        generation = rag.generation
+        # a requeued job (its worker died) resumes after its last committed batch, if that batch is in the
+        # live version; extraction, chunking and dedup are deterministic, so the batches are the same as before
+        resumable = job["chunks_total"] == len(docs) and job.get("generation") == str(generation)
+        done = job["chunks_done"] if resumable else 0
+        await queue.update(
+            job_id, status="embedding", chunks_total=len(docs), chunks_done=done, duplicates=duplicates,
+            embed_started_at=time.time(), generation=generation,
+        )
+
+        by_build = await asyncio.to_thread(_indexed_by_build, rag.shards, job)
+        while not by_build:
+            if done < len(docs):
+                batch = docs[done:done + EMBED_BATCH]
+                embs = await get_embedder().embed([d["text"] for d in batch])
+            await asyncio.to_thread(rag.refresh)
+            if rag.generation != generation:
+                # the alias flipped (rebuild, snapshot import): what this job wrote is in a version that is
+                # no longer live and will be garbage-collected, so start over in the new one
+                log_event("ingest.job_restart", {"job_id": job_id, "from_generation": generation, "to_generation": rag.generation, "chunks_lost": done})
+                generation, done = rag.generation, 0
+                await queue.update(job_id, chunks_done=0, generation=generation)
+                by_build = await asyncio.to_thread(_indexed_by_build, rag.shards, job)
+                continue
+            if done == len(docs):
+                break  # every batch is in the version that is still live
+            # read after the generation: refresh() swaps the index first, so these are at least as new
+            shards, summaries = rag.shards, rag.summaries
+            for d in batch:
+                d["shard"] = shard_of(shard_key(d, settings.CHROMA_SHARD_BY), len(shards))
+            # each batch is searchable as soon as it lands
+            await asyncio.to_thread(add_to_shards, shards, batch, embs, summaries=summaries)
+            # cached retrieval results no longer cover the whole collection, in any worker
+            rag.note_writes(await queue.r.incr(INDEX_WRITES_KEY))
+            done += len(batch)
+            await queue.update(job_id, chunks_done=done)
+
+        if by_build:
+            done = len(docs)
+            await queue.update(job_id, chunks_done=done)
+        await queue.finish(job_id, status="done")
+        log_event("ingest.job_done", {"job_id": job_id, "chunks": done, "duplicates": duplicates, "seconds": round(time.time() - t0, 2)})
+    except Exception as e:
+        await queue.finish(job_id, status="failed", error=str(e))
+        log_event("error.ingest_job", {"job_id": job_id, "error": str(e)})
+
+
+def has_consumer() -> bool:
+    """Whether anything will process queued uploads: in-API workers, or `python -m app.jobs` (which needs CHROMA_HOST)."""
+    return settings.INGEST_QUEUE_WORKERS > 0 or bool(settings.CHROMA_HOST)
+
+
+class IngestWorkers:
+    def __init__(self, n: int):
+        self.n = n
+        self._tasks: List[asyncio.Task] = []
+
+    async def _heartbeat(self, queue: JobQueue, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_S)
+            await queue.r.hset(_job_key(job_id), "heartbeat", time.time())
+
+    async def _loop(self) -> None:
+        queue = get_queue()
+        last_sweep = 0.0
+        while True:
+            try:
+                if time.time() - last_sweep > STALE_AFTER_S / 2:
+                    last_sweep = time.time()
+                    await queue.requeue_stale(STALE_AFTER_S)
+                job_id = await queue.claim()
+                if job_id is None:
+                    continue
+                # long extraction steps don't update the job, so beat separately
+                beat = asyncio.create_task(self._heartbeat(queue, job_id))
+                try:
+                    await process_job(queue, job_id)
+                finally:
+                    beat.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # Redis blips must not kill the worker
+                log_event("error.ingest_worker", {"error": str(e)})
+                await asyncio.sleep(1.0)
+
+    def start(self) -> None:
+        if not has_consumer():
+            log_event("ingest.no_consumer", {"warning": "uploads are refused: set INGEST_QUEUE_WORKERS, or CHROMA_HOST and run python -m app.jobs"})
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.n)]
+
+    async def join(self) -> None:
+        await asyncio.gather(*self._tasks)
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+ingest_workers = IngestWorkers(settings.INGEST_QUEUE_WORKERS)
+
+
+router = APIRouter(prefix="/documents", tags=["documents"])
+
+
+def _safe_name(filename: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", Path(filename).name)[:120] or "upload"
+
+
+@router.post("", response_model=JobStatus, status_code=202)
+async def upload_document(file: UploadFile = File(...), user_id: str = Depends(enforce_rate_limit)):
+    filename = file.filename or "upload"
+    if Path(filename).suffix.lower() not in ALLOWED_SUFFIXES:
+        raise HTTPException(status_code=400, detail=f"Only {', '.join(sorted(ALLOWED_SUFFIXES))} files are accepted")
+    if not has_consumer():
+        # a queued job would never be indexed
+        raise HTTPException(status_code=503, detail="Uploads are disabled: no ingest worker is configured")
+
+    job_id = uuid.uuid4().hex
+    dest_dir = Path(settings.DATA_DIR) / "uploads" / _safe_name(user_id)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / f"{job_id[:8]}-{_safe_name(filename)}"
+    limit = settings.UPLOAD_MAX_MB * 1024 * 1024
+    size = 0
+    with dest.open("wb") as f:
+        while block := await file.read(1 << 20):
+            size += len(block)
+            if size > limit:
+                break
+            await asyncio.to_thread(f.write, block)
+    if size > limit:
+        dest.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail=f"File exceeds {settings.UPLOAD_MAX_MB} MB")
+
+    queue = get_queue()
+    await queue.enqueue(user_id, filename, dest, job_id)
+    log_event("documents.upload", {"user_id": user_id, "job_id": job_id, "filename": filename, "bytes": size})
+    return job_view(await queue.get(job_id))
+
+
+@router.get("/jobs", response_model=List[JobStatus])
+async def my_jobs(user_id: str = Depends(get_current_user)):
+    return [job_view(j) for j in await get_queue().for_user(user_id)]
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str, user_id: str = Depends(get_current_user)):
+    job = await get_queue().get(job_id)
+    # other users' jobs look missing rather than forbidden
+    if job is None or (job["user"] != user_id and not is_admin(user_id)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+
+async def _run_standalone(n: int) -> None:
+    workers = IngestWorkers(n)
+    workers.start()
+    try:
+        await workers.join()
+    finally:
+        await workers.stop()
+
+
+def main() -> None:
+    if not settings.CHROMA_HOST:
+        raise SystemExit(
+            "python -m app.jobs needs a Chroma server (CHROMA_HOST): the embedded store cannot be shared with the API processes. "
+            "Without one, run the API with a single worker and INGEST_QUEUE_WORKERS=1 instead."
+        )
+    n = max(1, settings.INGEST_QUEUE_WORKERS)
+    print(f"Ingest workers: {n} consuming {QUEUE} at {settings.REDIS_URL}")
+    asyncio.run(_run_standalone(n))
+
+
+if __name__ == "__main__":
+    main()
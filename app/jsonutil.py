@@ -0,0 +1,26 @@
+# app/jsonutil.py
+"""
+One JSON implementation (orjson) for API responses, Redis payloads and logs.
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode("utf-8")
+
+
+def dumpb(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+loads = orjson.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, for responses built by hand (errors, health)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
@@ -1,15 +1,51 @@
 import httpx, asyncio
 
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter
+from .deadline import attempt_timeout, retry_within_deadline, within_deadline
 
 from .settings import settings
 
+from .scheduler import llm_scheduler, estimate_tokens
+
+from .breaker import CircuitOpen, llm_breaker
+
+from .cassette import CassetteMiss, upstream_client
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential_jitter(initial=0.5, max=4))
 
 async def chat_complete(messages: list[dict[str,str]]) -> tuple[str,int|None,int|None]:
 
+    """
+
+    Admission-controlled completion: retries happen inside one scheduler slot,
+
+    so a retry storm cannot exceed the configured upstream concurrency.
+
+    """
+
+    estimate = estimate_tokens(sum(len(m["content"]) for m in messages)) + settings.LLM_COMPLETION_ESTIMATE
+
+    # fail fast while the breaker is open, before queueing for a slot
+
+    llm_breaker.check()
+
+    async with llm_scheduler.slot(estimate):
+
+        answer, tokens_in, tokens_out = await _post_chat(messages)
+
+    if tokens_in is not None:
+
+        llm_scheduler.reconcile(estimate, tokens_in + (tokens_out or 0))
+
+    return answer, tokens_in, tokens_out
+
+
+
+# completions are not idempotent (and cost tokens), so they are retried but never hedged
+
+@retry_within_deadline("llm", attempts=3, initial=0.5, max_wait=4, fatal=(CircuitOpen, CassetteMiss))
+
+async def _post_chat(messages: list[dict[str,str]]) -> tuple[str,int|None,int|None]:
+
     url = f"{settings.LLM_API_BASE}/chat/completions"
 
     headers = {
@@ -30,11 +66,11 @@ async def chat_complete(messages: list[dict[str,str]]) -> tuple[str,int|None,int
 
     }
 
-    timeout = httpx.Timeout(settings.TIMEOUT_S)
+    timeout = httpx.Timeout(attempt_timeout(settings.TIMEOUT_S, "llm"))
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    async with llm_breaker.guard(), upstream_client(timeout) as client:
 
-        r = await client.post(url, headers=headers, json=payload)
+        r = await within_deadline(client.post(url, headers=headers, json=payload), "llm")
 
         r.raise_for_status()
 
@@ -58,6 +94,12 @@ async def ping_openai() -> bool:
 
     """
 
+    if settings.CASSETTE_MODE == "replay":
+
+        # a replayed run is offline by design: the cassette stands in for the API, so there is nothing to probe
+
+        return True
+
     url = f"{settings.LLM_API_BASE}/models"
 
     headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}
@@ -66,6 +108,8 @@ async def ping_openai() -> bool:
 
     try:
 
+        # never recorded: a probe is not part of a run, and replay does not reach this point
+
         async with httpx.AsyncClient(timeout=timeout) as client:
 
             r = await client.get(url, headers=headers)
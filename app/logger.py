@@ -4,10 +4,12 @@ from pathlib import Path
 
 from datetime import datetime
 
-import json, os, time
+import os, time
 
 from typing import Any, Dict
 
+import orjson
+
 
 
 LOG_DIR = Path(os.getenv("LOG_DIR", "logs"))
@@ -38,7 +40,9 @@ def log_event(kind: str, payload: Dict[str, Any]) -> None:
 
     }
 
-    with _log_path().open("a", encoding="utf-8") as f:
+    # one write() per record keeps lines whole across worker processes
+
+    with _log_path().open("ab") as f:
 
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.write(orjson.dumps(record, default=str) + b"\n")
 
@@ -1,57 +1,162 @@
-from fastapi import FastAPI, Body, Depends
+from fastapi import FastAPI, Body, Depends, Request
 
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.middleware.cors import CORSMiddleware
 
-from uuid import uuid4
+from fastapi.responses import HTMLResponse
 
-from pathlib import Path
+from contextlib import asynccontextmanager
+
+from uuid import uuid4
 
 from typing import Any, Dict
 
+import asyncio, os, time
+
 
 
 from .settings import settings
 
-from .llm import chat_complete, ping_openai
+from .llm import chat_complete
 
-from .memory import memory
+from .health import health_monitor
+
+from .memory import get_memory, close_memory
 
 from .logger import log_event
 
-from .retriever import rag
+from .retriever import get_rag, close_rag, index_watcher
+
+from .embeddings import get_embedder, close_embedder
 
 from .users import router as user_router
 
-from .auth import get_current_user
+from .ratelimit import router as usage_router, enforce_rate_limit, check_rate_limit, get_limiter
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from .jobs import router as documents_router, ingest_workers
 
-app = FastAPI()
+from .sessions import router as sessions_router
+
+from .profiling import router as profiles_router, ProfilingMiddleware
+
+from .schemas import (
+
+    ChatRequest, ChatResponse, BatchRequest, BatchResponse,
+
+    RetrieveRequest, RetrieveResponse, SessionResponse,
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "https://rag-chatbot-frontend-uogt.onrender.com",  # deployed frontend
-        "http://localhost:3000",  # local dev
-        "http://localhost:3010",  # local dev
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
 )
 
+
+
+from .jsonutil import FastJSONResponse
+
+
+
+from .dedup import occurrences
+
+from .auth import get_current_user
+
+from .scheduler import AdmissionRejected, llm_scheduler, embed_scheduler
+
+from .deadline import DeadlineExceeded, request_deadline
+
+from .breaker import CircuitOpen, breaker_stats
+
+from .cassette import CassetteMiss, cassette_stats
+
+from .compression import CompressionMiddleware
+
+from .static import CachedPage
+
+from redis.exceptions import RedisError
+
+from tenacity import RetryError
+
+import httpx
+
+
+
 RAG_MIN_SCORE = 0.30  
 
 
 
-app = FastAPI(title="General Chatbot MVP (Redis)")
+@asynccontextmanager
+
+async def lifespan(app: FastAPI):
+
+    # Runs once per worker process, after any pre-fork, so Redis and Chroma
+
+    # handles are never inherited across processes.
+
+    t0 = time.perf_counter()
+
+    get_memory()
+
+    t_redis = time.perf_counter()
+
+    await asyncio.to_thread(get_embedder)  # loads the model for EMBED_PROVIDER=local
+
+    t_embed = time.perf_counter()
+
+    await asyncio.to_thread(get_rag)  # opening Chroma is blocking I/O
+
+    t_chroma = time.perf_counter()
+
+    app.state.startup = {
+
+        "pid": os.getpid(),
+
+        "redis_ms": round((t_redis - t0) * 1000, 1),
+
+        "embedder_ms": round((t_embed - t_redis) * 1000, 1),
+
+        "chroma_ms": round((t_chroma - t_embed) * 1000, 1),
+
+        "total_ms": round((t_chroma - t0) * 1000, 1),
+
+    }
+
+    log_event("app.startup", app.state.startup)
+
+    health_monitor.start()
+
+    ingest_workers.start()
+
+    index_watcher.start()
+
+    yield
+
+    await health_monitor.stop()
+
+    await ingest_workers.stop()
+
+    await index_watcher.stop()
+
+    await close_memory()
+
+    close_rag()
+
+    close_embedder()
+
+    log_event("app.shutdown", {"pid": os.getpid()})
+
+
+
+app = FastAPI(title="General Chatbot MVP (Redis)", lifespan=lifespan)
 
 app.add_middleware(
 
 CORSMiddleware,
 
-allow_origins=["http://localhost:3000", "http://localhost:3010"],
+allow_origins=[
+
+    "https://rag-chatbot-frontend-uogt.onrender.com",  # deployed frontend
+
+    "http://localhost:3000",  # local dev
+
+    "http://localhost:3010",  # local dev
+
+],
 
 allow_credentials=True,
 
@@ -65,179 +170,354 @@ allow_headers=["*"],
 
 app.include_router(user_router)
 
+app.include_router(usage_router)
+
+app.include_router(documents_router)
+
+app.include_router(sessions_router)
+
+app.include_router(profiles_router)
+
+if settings.COMPRESS_MIN_BYTES > 0:
+
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESS_MIN_BYTES)
+
+if settings.PROFILE_ENABLED:
+
+    # outermost, so the profile covers CORS and every handler
+
+    app.add_middleware(ProfilingMiddleware)
+
+
+
+@app.exception_handler(AdmissionRejected)
+
+async def admission_rejected(request, exc: AdmissionRejected) -> FastJSONResponse:
+
+    log_event("upstream.rejected", {"upstream": exc.name, "reason": exc.reason, "retry_after": exc.retry_after})
+
+    return FastJSONResponse(
+
+        {"error": f"Upstream {exc.name} is busy ({exc.reason}), retry later", "retry_after": exc.retry_after},
+
+        status_code=429,
+
+        headers={"Retry-After": str(exc.retry_after)},
+
+    )
+
+
+
+@app.exception_handler(DeadlineExceeded)
+
+async def deadline_exceeded(request, exc: DeadlineExceeded) -> FastJSONResponse:
+
+    log_event("deadline.exceeded", {"path": request.url.path, "stage": exc.stage})
+
+    return FastJSONResponse({"error": f"Request deadline exceeded during {exc.stage}"}, status_code=504)
+
+
+
+@app.exception_handler(CassetteMiss)
+
+async def cassette_miss(request, exc: CassetteMiss) -> FastJSONResponse:
+
+    # replay mode only: the request was never recorded, so there is nothing to serve
+
+    log_event("cassette.miss", {"path": request.url.path, "upstream_url": exc.url})
+
+    return FastJSONResponse({"error": str(exc)}, status_code=502)
+
+
+
+@app.exception_handler(CircuitOpen)
+
+async def circuit_open(request, exc: CircuitOpen) -> FastJSONResponse:
+
+    log_event("breaker.rejected", {"path": request.url.path, "dependency": exc.name, "retry_after": exc.retry_after})
+
+    return FastJSONResponse(
+
+        {"error": f"Upstream {exc.name} is unavailable, retry later", "retry_after": exc.retry_after},
+
+        status_code=503,
+
+        headers={"Retry-After": str(exc.retry_after)},
+
+    )
+
+
+
+index_page = CachedPage("web/index.html")
+
 
 
 @app.get("/", response_class=HTMLResponse)
 
-def home():
+def home(request: Request):
+
+    # served from memory; an unchanged page revalidates to a 304
 
-    return Path("web/index.html").read_text()
+    return index_page.response(request)
 
 
 
 @app.get("/health")
 
-async def health() -> JSONResponse:
+async def health() -> FastJSONResponse:
 
-    # Redis check
+    # Cached results from the background HealthMonitor; no I/O on this path
 
-    try:
+    deps = health_monitor.snapshot()
 
-        pong = await memory.r.ping()
+    status = {
 
-        redis_ok = bool(pong)
+        **deps,
 
-        dbsize = await memory.r.dbsize() if redis_ok else None
+        "app": {"system_prompt_len": len(settings.SYSTEM_PROMPT), "probe_interval_s": health_monitor.interval_s},
 
-    except Exception as e:
+        "breakers": breaker_stats(),
 
-        redis_ok = False
+    }
 
-        dbsize = None
+    http_status = 200 if all(d["ok"] for d in deps.values()) else 503
 
+    return FastJSONResponse(status, status_code=http_status)
 
 
-    # OpenAI check
 
-    openai_ok = await ping_openai()
+@app.get("/live")
 
+async def live() -> Dict[str, Any]:
 
+    # process is up and serving; never touches dependencies
 
-    status = {
+    return {"ok": True, "pid": os.getpid()}
+
+
+
+@app.get("/ready")
+
+async def ready() -> FastJSONResponse:
+
+    # ready once this worker has finished startup and Redis was reachable at the last probe
+
+    started = getattr(app.state, "startup", None) is not None
+
+    redis_ok = health_monitor.status("redis")["ok"]
+
+    ok = started and redis_ok
+
+    return FastJSONResponse({"ok": ok, "started": started, "redis": redis_ok}, status_code=200 if ok else 503)
+
+
+
+@app.get("/metrics")
 
-        "redis": {"ok": redis_ok, "dbsize": dbsize, "url": settings.REDIS_URL},
+async def metrics() -> Dict[str, Any]:
 
-        "openai": {"ok": openai_ok, "model": settings.MODEL_NAME},
+    return {
 
-        "app": {"system_prompt_len": len(settings.SYSTEM_PROMPT)},
+        "startup": getattr(app.state, "startup", None),
+
+        "upstream": {"llm": llm_scheduler.stats(), "embeddings": embed_scheduler.stats()},
+
+        "embed_hedging": hedger.stats() if (hedger := getattr(get_embedder(), "hedger", None)) else None,
+
+        "index": {"generation": get_rag().generation, "shards": get_rag().names},
+
+        "retrieval_cache": get_rag().cache.stats(),
+
+        "retrieval_coarse": get_rag().coarse_stats(),
+
+        "cassette": cassette_stats(),
 
     }
 
-    http_status = 200 if (redis_ok and openai_ok) else 503
 
-    return JSONResponse(status, status_code=http_status)
 
+def ground(docs: list[Dict[str, Any]], k: int) -> tuple[list[Dict[str, Any]], str, str]:
 
+    """(citations, system_prompt, context_block) for retrieved docs; plain chat when none qualify."""
 
-@app.post("/chat")
+    citations = []
 
-async def chat(req: Dict[str, Any], user_id: str = Depends(get_current_user)):
+    context_block = ""
 
-    try:
+    system_prompt = settings.SYSTEM_PROMPT  # default: normal assistant
 
-        session_id = req.get("session_id") or str(uuid4())
 
-        user_msg = (req.get("message") or "").strip()
 
-        use_rag = bool(req.get("use_rag", False))
+    if docs:
 
-        k = int(req.get("k", 6))  # default to 6 for balanced retrieval coverage
+        # keep only docs above a similarity threshold
 
+        good_docs = [d for d in docs if (d.get("score") or 0) >= RAG_MIN_SCORE]
 
 
-        if not user_msg:
 
-            log_event("error.empty_message", {"session_id": session_id})
+        if good_docs:
 
-            return JSONResponse({"error": "Empty message", "session_id": session_id}, status_code=400)
+            # use up to k best docs for context
 
+            top = good_docs[:k]
 
+            snippets = [d["text"] for d in top]
 
-        history = await memory.get(session_id, user_id)
 
 
+            citations = [
 
-        citations = []
+            {
 
-        context_block = ""
+                "source": d["metadata"].get("source"),
 
-        system_prompt = settings.SYSTEM_PROMPT  # default: normal assistant
+                "page": d["metadata"].get("page"),
 
+                "score": d.get("score"),
 
+                "snippet": d["text"][:300],
 
-        if use_rag:
+                "occurrences": occurrences(d["metadata"]) if d["metadata"].get("dup_count") else None,
+
+            }
+
+            for d in top
+
+            ]
+
+
+
+            # soft, friendly grounding: use context when useful, but answer normally
+
+            context_block = (
+
+            "\n\nYou have access to the following relevant document excerpts. "
+
+            "Use them to improve accuracy, especially for concrete facts (amounts, dates, IDs, terms). "
 
-            docs = await rag.retrieve(user_msg, k=k)
+            "Answer in a natural, conversational way. "
 
+            "If the excerpts do not contain the answer, you may rely on your general knowledge, "
 
+            "but do not invent specific personal details.\n"
 
-            # keep only docs above a similarity threshold
+            "DOCUMENT CONTEXT:\n"
 
-            good_docs = [d for d in docs if (d.get("score") or 0) >= RAG_MIN_SCORE]
+            + "\n---\n".join(snippets)
 
+            + "\n"
 
+            )
 
-            if good_docs:
 
-                # use up to k best docs for context
 
-                top = good_docs[:k]
+            system_prompt = (
 
-                snippets = [d["text"] for d in top]
+            "You are a helpful, conversational assistant. "
 
+            "You have access to relevant excerpts from uploaded documents. "
 
+            "Treat those excerpts as information you already know — use them naturally when they help answer the user's question. "
 
-                citations = [
+            "Speak like a normal assistant, not like you are reading files. "
 
-                {
+            "If the excerpts do not contain the answer, you can use general knowledge. "
 
-                    "source": d["metadata"].get("source"),
+            "Only say you are unsure if you truly have no reliable information."
 
-                    "page": d["metadata"].get("page"),
+            )
 
-                    "score": d.get("score"),
+        # if no good_docs: fall back to normal chat behavior (no context_block)
 
-                    "snippet": d["text"][:300],
+    return citations, system_prompt, context_block
 
-                }
 
-                for d in top
 
-                ]
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(request_deadline(settings.REQUEST_DEADLINE_S))])
 
+async def chat(req: ChatRequest, user_id: str = Depends(enforce_rate_limit)):
 
+    try:
+
+        session_id = req.session_id or str(uuid4())
+
+        user_msg = req.message.strip()
+
+        use_rag = req.use_rag
+
+        k = req.k
+
+
+
+        if not user_msg:
+
+            log_event("error.empty_message", {"session_id": session_id})
+
+            return FastJSONResponse({"error": "Empty message", "session_id": session_id}, status_code=400)
+
+
+
+        t0 = time.perf_counter()
+
+        timings: Dict[str, float] = {}
+
+        async def timed(name: str, coro):
+
+            t = time.perf_counter()
+
+            try:
 
-                # soft, friendly grounding: use context when useful, but answer normally
+                return await coro
 
-                context_block = (
+            finally:
 
-                "\n\nYou have access to the following relevant document excerpts. "
+                timings[name] = round((time.perf_counter() - t) * 1000, 1)
 
-                "Use them to improve accuracy, especially for concrete facts (amounts, dates, IDs, terms). "
+        degraded: list = []
 
-                "Answer in a natural, conversational way. "
+        async def degradable(name: str, coro, fallback, errors):
 
-                "If the excerpts do not contain the answer, you may rely on your general knowledge, "
+            # answer without this dependency rather than fail the whole request
 
-                "but do not invent specific personal details.\n"
+            try:
 
-                "DOCUMENT CONTEXT:\n"
+                return await coro
 
-                + "\n---\n".join(snippets)
+            except errors as e:
 
-                + "\n"
+                degraded.append(name)
 
-                )
+                log_event("chat.degraded", {"session_id": session_id, "dependency": name, "error": str(e) or type(e).__name__})
 
+                return fallback
 
+        history_load = degradable("history", timed("history_ms", get_memory().get(session_id, user_id)), [], (CircuitOpen, RedisError, OSError))
 
-                system_prompt = (
+        # history load and retrieval are independent; run them concurrently
 
-                "You are a helpful, conversational assistant. "
+        if use_rag:
+
+            # any retrieval failure but an admission or deadline rejection, which stay the caller's answer
+
+            rag_errors = (CircuitOpen, RetryError, httpx.HTTPError, OSError)
+
+            history, docs = await asyncio.gather(
+
+                history_load,
 
-                "You have access to relevant excerpts from uploaded documents. "
+                degradable("rag", timed("retrieve_ms", get_rag().retrieve(user_msg, k=k)), [], rag_errors),
 
-                "Treat those excerpts as information you already know — use them naturally when they help answer the user's question. "
+            )
 
-                "Speak like a normal assistant, not like you are reading files. "
+        else:
 
-                "If the excerpts do not contain the answer, you can use general knowledge. "
+            history = await history_load
 
-                "Only say you are unsure if you truly have no reliable information."
 
-                )
 
-            # if no good_docs: fall back to normal chat behavior (no context_block)
+        citations, system_prompt, context_block = ground(docs if use_rag else [], k)
+
 
 
 
@@ -277,13 +557,17 @@ async def chat(req: Dict[str, Any], user_id: str = Depends(get_current_user)):
 
 
 
-        answer, tokens_in, tokens_out = await chat_complete(messages)
+        answer, tokens_in, tokens_out = await timed("llm_ms", chat_complete(messages))
+
+        timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
 
 
+        # persistence and usage accounting happen after the response is on its way
 
-        await memory.append(session_id, "user", user_msg, user_id)
+        get_memory().persist_turn(session_id, user_msg, answer, user_id)
 
-        await memory.append(session_id, "assistant", answer, user_id)
+        get_memory().writer.submit(f"ratelimit:{user_id}", lambda: get_limiter().record_tokens(user_id, (tokens_in or 0) + (tokens_out or 0)))
 
 
 
@@ -305,36 +589,252 @@ async def chat(req: Dict[str, Any], user_id: str = Depends(get_current_user)):
 
             "rag_docs_used": len(citations),
 
+            "degraded": degraded,
+
+            "timings": timings,
+
         },
 
         )
 
 
 
-        return {
+        return ChatResponse(
 
-            "answer": answer,
+            answer=answer,
 
-            "session_id": session_id,
+            session_id=session_id,
 
-            "tokens_in": tokens_in,
+            tokens_in=tokens_in,
 
-            "tokens_out": tokens_out,
+            tokens_out=tokens_out,
+
+            sources=citations,  # list of {source, page, score, snippet}
+
+            timings=timings,
 
-            "sources": citations,  # list of {source, page, score, snippet}
+            degraded=degraded or None,
 
-        }
+        )
+    except (AdmissionRejected, DeadlineExceeded, CircuitOpen, CassetteMiss):
+        raise
     except Exception as e:
         log_event("error.chat_exception", {"session_id": session_id if 'session_id' in locals() else "unknown", "error": str(e)})
         import traceback
         traceback.print_exc()
-        return JSONResponse(
+        return FastJSONResponse(
             {"error": f"Internal server error: {str(e)}", "session_id": session_id if 'session_id' in locals() else None},
             status_code=500
         )
 
 
 
+@app.post("/chat/batch", response_model=BatchResponse, dependencies=[Depends(request_deadline(settings.BATCH_DEADLINE_S))])
+
+async def chat_batch(req: BatchRequest, user_id: str = Depends(get_current_user)):
+
+    """
+
+    Many independent, stateless questions in one request: all RAG queries are embedded
+
+    in one call and searched in one multi-query vector search, then completions run
+
+    concurrently (at most BATCH_CONCURRENCY). Results keep request order; failures are per item.
+
+    """
+
+    n = len(req.items)
+
+    if not n or n > settings.BATCH_MAX_ITEMS:
+
+        return FastJSONResponse({"error": f"Batch must have 1..{settings.BATCH_MAX_ITEMS} items"}, status_code=400)
+
+    await check_rate_limit(user_id, cost=n)
+
+
+
+    t0 = time.perf_counter()
+
+    timings: Dict[str, float] = {}
+
+    messages = [it.message.strip() for it in req.items]
+
+    rag_idx = [i for i, it in enumerate(req.items) if it.use_rag and messages[i]]
+
+    docs_for: Dict[int, list] = {}
+
+    retrieve_error = None
+
+    if rag_idx:
+
+        try:
+
+            found = await get_rag().retrieve_many([messages[i] for i in rag_idx], [req.items[i].k for i in rag_idx])
+
+            docs_for = dict(zip(rag_idx, found))
+
+        except Exception as e:
+
+            retrieve_error = f"Retrieval failed: {e}"
+
+        timings["retrieve_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+
+
+    sem = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def run(i: int) -> Dict[str, Any]:
+
+        item = req.items[i]
+
+        out: Dict[str, Any] = {"index": i}
+
+        t_item = time.perf_counter()
+
+        try:
+
+            if not messages[i]:
+
+                raise ValueError("Empty message")
+
+            if item.use_rag and retrieve_error:
+
+                raise RuntimeError(retrieve_error)
+
+            citations, system_prompt, context_block = ground(docs_for.get(i, []), item.k)
+
+            async with sem:
+
+                t_llm = time.perf_counter()
+
+                answer, tokens_in, tokens_out = await chat_complete([
+
+                    {"role": "system", "content": system_prompt + context_block},
+
+                    {"role": "user", "content": messages[i]},
+
+                ])
+
+            out.update(answer=answer, sources=citations, tokens_in=tokens_in, tokens_out=tokens_out)
+
+            out["timings"] = {
+
+                "queue_ms": round((t_llm - t_item) * 1000, 1),
+
+                "llm_ms": round((time.perf_counter() - t_llm) * 1000, 1),
+
+            }
+
+        except Exception as e:
+
+            out["error"] = str(e)
+
+        out["latency_ms"] = round((time.perf_counter() - t_item) * 1000, 1)
+
+        return out
+
+
+
+    results = await asyncio.gather(*(run(i) for i in range(n)))
+
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+
+
+    used = sum((r.get("tokens_in") or 0) + (r.get("tokens_out") or 0) for r in results)
+
+    get_memory().writer.submit(f"ratelimit:{user_id}", lambda: get_limiter().record_tokens(user_id, used))
+
+    log_event("chat.batch", {
+
+        "user_id": user_id,
+
+        "items": n,
+
+        "rag_items": len(rag_idx),
+
+        "errors": sum(1 for r in results if r.get("error")),
+
+        "tokens": used,
+
+        "timings": timings,
+
+    })
+
+    return BatchResponse(results=results, timings=timings)
+
+
+
+@app.post("/retrieve", response_model=RetrieveResponse, response_model_exclude_none=True, dependencies=[Depends(request_deadline(settings.REQUEST_DEADLINE_S))])
+
+async def retrieve(req: RetrieveRequest, user_id: str = Depends(get_current_user)):
+
+    """Ranked chunks for one or many queries, without a completion."""
+
+    queries = [q.strip() for q in ([req.query] if req.query else []) + req.queries]
+
+    if not queries or not all(queries) or len(queries) > settings.BATCH_MAX_ITEMS:
+
+        return FastJSONResponse({"error": f"Provide 1..{settings.BATCH_MAX_ITEMS} non-empty queries"}, status_code=400)
+
+    await check_rate_limit(user_id, cost=len(queries))
+
+
+
+    t0 = time.perf_counter()
+
+    where = {"source": {"$in": req.sources}} if req.sources else None
+
+    found = await get_rag().retrieve_many(queries, [req.k] * len(queries), min_score=req.min_score, where=where)
+
+    if req.ids_only:
+
+        results = [{"query": q, "hits": [{"id": d["id"], "score": d["score"]} for d in docs]} for q, docs in zip(queries, found)]
+
+    else:
+
+        results = [
+
+            {
+
+                "query": q,
+
+                "hits": [
+
+                    {
+
+                        "id": d["id"],
+
+                        "score": d["score"],
+
+                        "source": d["metadata"].get("source"),
+
+                        "page": d["metadata"].get("page"),
+
+                        "text": d["text"],
+
+                        "occurrences": occurrences(d["metadata"]) if d["metadata"].get("dup_count") else None,
+
+                    }
+
+                    for d in docs
+
+                ],
+
+            }
+
+            for q, docs in zip(queries, found)
+
+        ]
+
+    latency_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    log_event("retrieve", {"user_id": user_id, "queries": len(queries), "k": req.k, "latency_ms": latency_ms})
+
+    return RetrieveResponse(results=results, latency_ms=latency_ms)
+
+
+
 @app.post("/reset_session")
 
 async def reset_session(payload: dict = Body(...), user_id: str = Depends(get_current_user)):
@@ -347,9 +847,7 @@ async def reset_session(payload: dict = Body(...), user_id: str = Depends(get_cu
 
     try:
 
-        key = f"user:{user_id}:session:{session_id}"
-
-        await memory.r.delete(key)
+        await get_memory().delete_sessions(user_id, [session_id])
 
         return {"ok": True}
 
@@ -358,25 +856,17 @@ async def reset_session(payload: dict = Body(...), user_id: str = Depends(get_cu
         return {"ok": False, "error": str(e)}
 
 
-@app.get("/session/{session_id}")
+@app.get("/session/{session_id}", response_model=SessionResponse)
 
 async def get_session(session_id: str, user_id: str = Depends(get_current_user)):
 
     """Return the full chat history for a given session_id."""
 
-    history = await memory.get(session_id, user_id)
+    history = await get_memory().get(session_id, user_id)
 
     if not history:
 
-        return JSONResponse({"error": "Session not found or empty"}, status_code=404)
-
-    return JSONResponse({
+        return FastJSONResponse({"error": "Session not found or empty"}, status_code=404)
 
-        "username": user_id,
-
-        "session_id": session_id,
-
-        "history": history
-
-    })
+    return SessionResponse(username=user_id, session_id=session_id, history=history)
 
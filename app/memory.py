@@ -1,26 +1,98 @@
-import json
+import asyncio, math, os, re, time
 
-from typing import List, Dict, Literal
+from typing import Any, Awaitable, Callable, List, Dict, Literal
 
 from redis.asyncio import Redis
 
 from .settings import settings
 
+from .logger import log_event
+
+from .jsonutil import dumpb, loads
+
+from .breaker import redis_breaker
+
 
 
 Role = Literal["system","user","assistant"]
 
 
 
+class OrderedWriter:
+
+    """
+
+    Runs writes in the background while keeping them in submission order per key:
+
+    each write for a key is chained behind the previous one for that key.
+
+    """
+
+    def __init__(self):
+
+        self._tails: Dict[str, asyncio.Task] = {}
+
+    def submit(self, key: str, write: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+
+        prev = self._tails.get(key)
+
+        task = asyncio.create_task(self._run(key, prev, write))
+
+        self._tails[key] = task
+
+        task.add_done_callback(lambda t: self._tails.pop(key, None) if self._tails.get(key) is t else None)
+
+        return task
+
+    async def _run(self, key: str, prev: asyncio.Task | None, write: Callable[[], Awaitable[Any]]) -> None:
+
+        if prev is not None:
+
+            await asyncio.wait([prev])  # ordering only; prev logs its own failure
+
+        t0 = time.perf_counter()
+
+        try:
+
+            await write()
+
+            log_event("memory.persist", {"key": key, "persist_ms": round((time.perf_counter() - t0) * 1000, 2)})
+
+        except Exception as e:
+
+            log_event("error.memory_persist", {"key": key, "error": str(e)})
+
+    async def wait(self, key: str) -> None:
+
+        task = self._tails.get(key)
+
+        if task is not None:
+
+            await asyncio.wait([task])
+
+    async def drain(self) -> None:
+
+        if self._tails:
+
+            await asyncio.wait(list(self._tails.values()))
+
+
+
 class RedisMemory:
 
-    def __init__(self, url: str, max_turns: int):
+    def __init__(self, url: str, max_turns: int, ttl_s: int = 0):
 
         # max messages kept = user+assistant per turn
 
         self.max_msgs = max_turns * 2
 
-        self.r = Redis.from_url(url, decode_responses=True)
+        self.ttl_s = ttl_s
+
+        # a short connect timeout so a dead Redis trips the breaker instead of stalling requests
+
+        self.r = Redis.from_url(url, decode_responses=True, socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_S)
+
+        self.writer = OrderedWriter()
 
 
 
@@ -30,19 +102,79 @@ class RedisMemory:
 
 
 
+    # Per-user session index, so listing and deleting never SCANs the keyspace:
+
+    #   sessionidx:{u}                zset of session ids scored by last activity
+
+    #   sessionmeta:{u}:{sid}         hash: title, created_at, updated_at
+
+
+
+    def _index_key(self, user_id: str) -> str:
+
+        # not under user:{u}: bob's index would be user:bob:sessions, the signup hash of user "bob:sessions"
+
+        return f"sessionidx:{user_id}"
+
+
+
+    def _meta_key(self, user_id: str, session_id: str) -> str:
+
+        # session ids are client-chosen: under the history prefix, session "foo:meta" would be "foo"'s metadata
+
+        return f"sessionmeta:{user_id}:{session_id}"
+
+
+
+    def _touch(self, pipe, user_id: str, session_id: str, first_user_msg: str | None) -> None:
+
+        """Queue the index/meta updates for a write onto the same pipeline as the write itself."""
+
+        now = time.time()
+
+        meta = self._meta_key(user_id, session_id)
+
+        pipe.zadd(self._index_key(user_id), {session_id: now})
+
+        if first_user_msg:
+
+            pipe.hsetnx(meta, "title", " ".join(first_user_msg.split())[:80])
+
+        pipe.hsetnx(meta, "created_at", now)
+
+        pipe.hset(meta, "updated_at", now)
+
+        if self.ttl_s > 0:
+
+            # idle sessions expire on their own; their index entries are pruned on the user's next write
+
+            for key in (self._key(user_id, session_id), meta, self._index_key(user_id)):
+
+                pipe.expire(key, self.ttl_s)
+
+            pipe.zremrangebyscore(self._index_key(user_id), "-inf", f"({now - self.ttl_s}")
+
+
+
     async def get(self, session_id: str, user_id: str = "anonymous") -> List[Dict[str,str]]:
 
         key = f"user:{user_id}:session:{session_id}"
 
-        vals = await self.r.lrange(key, 0, -1)
+        # read-your-writes: a turn still being persisted in the background lands first
+
+        await self.writer.wait(key)
+
+        async with redis_breaker.guard():
 
-        return [json.loads(v) for v in vals]
+            vals = await self.r.lrange(key, 0, -1)
+
+        return [loads(v) for v in vals]
 
 
 
     async def append(self, session_id: str, role: Role, content: str, user_id: str = "anonymous") -> None:
 
-        item = json.dumps({"role": role, "content": content})
+        item = dumpb({"role": role, "content": content})
 
         key = f"user:{user_id}:session:{session_id}"
 
@@ -52,12 +184,231 @@ class RedisMemory:
 
         pipe.ltrim(key, -self.max_msgs, -1)   # keep last N
 
+        self._touch(pipe, user_id, session_id, content if role == "user" else None)
+
         await pipe.execute()
 
 
 
-memory = RedisMemory(settings.REDIS_URL, settings.MAX_TURNS)
+    async def append_turn(self, session_id: str, user_msg: str, answer: str, user_id: str = "anonymous") -> None:
+
+        # both messages in one round trip, so a turn is never half-written
+
+        key = self._key(user_id, session_id)
+
+        pipe = self.r.pipeline()
+
+        pipe.rpush(key, dumpb({"role": "user", "content": user_msg}), dumpb({"role": "assistant", "content": answer}))
+
+        pipe.ltrim(key, -self.max_msgs, -1)
+
+        self._touch(pipe, user_id, session_id, user_msg)
+
+        async with redis_breaker.guard():
+
+            await pipe.execute()
+
+
+
+    def persist_turn(self, session_id: str, user_msg: str, answer: str, user_id: str = "anonymous") -> None:
+
+        """Persist a finished turn off the response path, ordered per session."""
+
+        self.writer.submit(self._key(user_id, session_id), lambda: self.append_turn(session_id, user_msg, answer, user_id))
+
+
+
+    async def list_sessions(self, user_id: str, limit: int = 20, before: str | None = None) -> tuple[List[Dict[str, Any]], str | None]:
+
+        """One page of sessions, most recently active first; pass the returned cursor as `before` for the next page (ValueError if malformed)."""
+
+        index = self._index_key(user_id)
+
+        # read-only: expired sessions whose index entries are not pruned yet are skipped, not deleted
+
+        min_score = time.time() - self.ttl_s if self.ttl_s > 0 else "-inf"
+
+        if before is None:
+
+            page = await self.r.zrevrangebyscore(index, "+inf", min_score, start=0, num=limit, withscores=True)
+
+        else:
+
+            # the cursor is the last (score, id) shown: sessions active at the same instant are ordered by id
+
+            # (descending, as ZREVRANGEBYSCORE returns them), so none of them is skipped or repeated
+
+            raw_score, _, last_id = before.partition(":")
+
+            score = float(raw_score)
+
+            if not math.isfinite(score):
+
+                raise ValueError(f"invalid cursor score {raw_score!r}")
+
+            ties = await self.r.zcount(index, score, score)
+
+            page = await self.r.zrevrangebyscore(index, score, min_score, start=0, num=limit + ties, withscores=True)
+
+            page = [(sid, s) for sid, s in page if s < score or sid < last_id][:limit]
+
+        pipe = self.r.pipeline()
+
+        for session_id, _ in page:
+
+            pipe.hgetall(self._meta_key(user_id, session_id))
+
+            # history is trimmed to max_msgs, so count what is kept rather than what was ever appended
+
+            pipe.llen(self._key(user_id, session_id))
+
+        replies = await pipe.execute() if page else []
+
+        metas, lengths = replies[0::2], replies[1::2]
+
+        sessions = [
+
+            {
+
+                "session_id": session_id,
+
+                "title": meta.get("title", ""),
+
+                "messages": length,
+
+                "created_at": float(meta.get("created_at", score)),
+
+                "updated_at": score,
+
+            }
+
+            for (session_id, score), meta, length in zip(page, metas, lengths)
+
+        ]
+
+        cursor = f"{page[-1][1]!r}:{page[-1][0]}" if len(page) == limit else None
+
+        return sessions, cursor
+
+
+
+    async def delete_sessions(self, user_id: str, session_ids: List[str]) -> int:
+
+        """Delete sessions and their index entries in one round trip; returns how many existed."""
+
+        if not session_ids:
+
+            return 0
+
+        for session_id in session_ids:
+
+            # a background turn write must not resurrect a session deleted after it was queued
+
+            await self.writer.wait(self._key(user_id, session_id))
+
+        pipe = self.r.pipeline()
+
+        pipe.zrem(self._index_key(user_id), *session_ids)
+
+        for session_id in session_ids:
+
+            pipe.delete(self._key(user_id, session_id), self._meta_key(user_id, session_id))
+
+        removed, *_ = await pipe.execute()
+
+        return removed
+
+
+
+    async def delete_all_sessions(self, user_id: str) -> int:
+
+        ids = await self.r.zrange(self._index_key(user_id), 0, -1)
+
+        deleted = await self.delete_sessions(user_id, ids)
+
+        await self.r.delete(self._index_key(user_id))
+
+        return deleted
+
+
+
+    async def backfill_index(self) -> int:
+
+        """One-off: index sessions written before the index existed (the only SCAN over the keyspace)."""
+
+        pattern = re.compile(r"^user:(?P<user>.+?):session:(?P<sid>[^:]+)$")
+
+        indexed = 0
+
+        async for key in self.r.scan_iter(match="user:*:session:*", count=1000):
+
+            m = pattern.match(key)
+
+            if not m or await self.r.type(key) != "list":
+
+                continue
+
+            user_id, session_id = m["user"], m["sid"]
+
+            if await self.r.zscore(self._index_key(user_id), session_id) is not None:
+
+                continue
+
+            msgs = [loads(v) for v in await self.r.lrange(key, 0, -1)]
+
+            first = next((x["content"] for x in msgs if x.get("role") == "user"), None)
+
+            pipe = self.r.pipeline()
+
+            self._touch(pipe, user_id, session_id, first)
+
+            await pipe.execute()
+
+            indexed += 1
+
+        return indexed
+
+
+
+_memory: RedisMemory | None = None
+
+_memory_pid: int | None = None
+
+
+
+def get_memory() -> RedisMemory:
+
+    """Per-process singleton; a forked worker gets its own connection pool."""
+
+    global _memory, _memory_pid
+
+    if _memory is None or _memory_pid != os.getpid():
+
+        _memory = RedisMemory(settings.REDIS_URL, settings.MAX_TURNS, settings.SESSION_TTL_S)
+
+        _memory_pid = os.getpid()
+
+    return _memory
+
+
+
+def get_redis() -> Redis:
+
+    # Shared Redis connection for other modules (e.g., auth, rate limits)
+
+    return get_memory().r
+
+
+
+async def close_memory() -> None:
+
+    global _memory
+
+    if _memory is not None and _memory_pid == os.getpid():
+
+        await _memory.writer.drain()
+
+        await _memory.r.aclose()
 
-# Export Redis connection for use in other modules (e.g., auth)
-redis = memory.r
+    _memory = None
 
@@ -0,0 +1,210 @@
+# app/profiling.py
+"""
+Opt-in per-request profiling.
+
+With PROFILE_ENABLED the ProfilingMiddleware profiles a PROFILE_SAMPLE_RATE fraction
+of requests, plus any request from an admin carrying `X-Profile: 1` (or
+`X-Profile: alloc` to add a tracemalloc diff). A profiled request gets a sampler
+thread that reads every thread's stack each PROFILE_INTERVAL_MS and counts the
+busy ones. The output is written to PROFILE_DIR:
+
+  {id}.collapsed   "thread;outer;...;inner count" lines, ready for flamegraph.pl or speedscope
+  {id}.alloc.txt   top allocation sites grown during the request (tracemalloc only)
+  {id}.json        method, path, status, duration, sample count
+
+The event loop interleaves requests, so samples taken while other requests run on
+the same worker appear too; profile a quiet worker, or a low sample rate, for a
+clean picture. Without PROFILE_ENABLED the middleware is not installed, so
+requests pay nothing.
+"""
+from __future__ import annotations
+
+import asyncio, os, random, re, sys, threading, time, tracemalloc, uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from .auth import decode_token, is_admin, require_admin
+from .logger import log_event
+from .settings import settings
+
+# leaf frames of threads that are parked, not working
+_IDLE = {
+    ("select", "selectors.py"),
+    ("wait", "threading.py"),
+    ("get", "queue.py"),
+    ("_worker", "thread.py"),  # ThreadPoolExecutor worker blocked on its (C) work queue
+}
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, interval_s: float):
+        super().__init__(name="profiler", daemon=True)
+        self.interval_s = interval_s
+        self.counts: Counter[str] = Counter()
+        self.samples = 0
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._halt.wait(self.interval_s):
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                code = frame.f_code
+                if (code.co_name, os.path.basename(code.co_filename)) in _IDLE:
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    c = frame.f_code
+                    stack.append(f"{c.co_name} ({os.path.basename(c.co_filename)}:{c.co_firstlineno})")
+                    frame = frame.f_back
+                self.counts[";".join([names.get(tid, str(tid)), *reversed(stack)])] += 1
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+
+class _AllocTrace:
+    """tracemalloc is process-wide, so overlapping profiled requests share one tracing session."""
+
+    _lock = threading.Lock()
+    _users = 0
+
+    def __enter__(self):
+        with self._lock:
+            if _AllocTrace._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(16)
+            _AllocTrace._users += 1
+        self.before = tracemalloc.take_snapshot()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.after = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        with self._lock:
+            _AllocTrace._users -= 1
+            if _AllocTrace._users == 0:
+                tracemalloc.stop()
+
+    def report(self, top: int = 40) -> str:
+        # leave out the sampler's own bookkeeping and tracemalloc itself
+        own = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = self.after.filter_traces(own).compare_to(self.before.filter_traces(own), "lineno")
+        lines = [f"peak traced: {self.peak / 1e6:.1f} MB", ""]
+        lines += [str(s) for s in stats[:top]]
+        return "\n".join(lines) + "\n"
+
+
+def _profile_mode(headers: Dict[bytes, bytes]) -> str | None:
+    """'cpu' or 'alloc' when this request should be profiled, else None."""
+    requested = headers.get(b"x-profile", b"").decode().strip().lower()
+    if requested:
+        auth = headers.get(b"authorization", b"").decode()
+        if auth.lower().startswith("bearer "):
+            try:
+                if is_admin(decode_token(auth[7:])):
+                    return "alloc" if requested == "alloc" else "cpu"
+            except HTTPException:
+                pass
+    if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "cpu"
+    return None
+
+
+def _prune(root: Path, keep: int) -> None:
+    metas = sorted(root.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for meta in metas[keep:]:
+        for f in root.glob(f"{meta.stem}.*"):
+            f.unlink(missing_ok=True)
+
+
+def _write(root: Path, pid: str, sampler: StackSampler, alloc: _AllocTrace | None, meta: Dict[str, Any]) -> None:
+    root.mkdir(parents=True, exist_ok=True)
+    (root / f"{pid}.collapsed").write_text("".join(f"{stack} {n}\n" for stack, n in sampler.counts.most_common()))
+    if alloc is not None:
+        (root / f"{pid}.alloc.txt").write_text(alloc.report())
+    (root / f"{pid}.json").write_bytes(orjson.dumps(meta))
+    _prune(root, settings.PROFILE_KEEP)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.root = Path(settings.PROFILE_DIR)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode = _profile_mode(dict(scope["headers"]))
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        status = {"code": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        pid = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9]+', '_', scope['path']).strip('_') or 'root'}-{uuid.uuid4().hex[:6]}"
+        alloc = _AllocTrace() if mode == "alloc" or settings.PROFILE_TRACEMALLOC else None
+        sampler = StackSampler(settings.PROFILE_INTERVAL_MS / 1000)
+        t0 = time.perf_counter()
+        if alloc is not None:
+            alloc.__enter__()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            if alloc is not None:
+                alloc.__exit__(None, None, None)
+            meta = {
+                "id": pid,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status["code"],
+                "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+                "samples": sampler.samples,
+                "alloc": alloc is not None,
+                "created_at": time.time(),
+            }
+            await asyncio.to_thread(_write, self.root, pid, sampler, alloc, meta)
+            log_event("profile.saved", meta)
+
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+_PROFILE_FILE = re.compile(r"^[A-Za-z0-9_-]+\.(collapsed|alloc\.txt|json)$")
+
+
+@router.get("")
+async def list_profiles(limit: int = 50, admin: str = Depends(require_admin)) -> List[Dict[str, Any]]:
+    root = Path(settings.PROFILE_DIR)
+    if not root.exists():
+        return []
+    metas = sorted(root.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
+    out = []
+    for m in metas:
+        meta = orjson.loads(m.read_bytes())
+        meta["files"] = sorted(f.name for f in root.glob(f"{m.stem}.*") if f.suffix != ".json")
+        out.append(meta)
+    return out
+
+
+@router.get("/{filename}")
+async def get_profile(filename: str, admin: str = Depends(require_admin)):
+    path = Path(settings.PROFILE_DIR) / filename
+    if not _PROFILE_FILE.match(filename) or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain" if not filename.endswith(".json") else "application/json")
@@ -0,0 +1,223 @@
+# app/ratelimit.py
+"""
+Per-user sliding-window limits on requests and LLM tokens.
+
+Uses the sliding-window-counter approximation: the previous fixed window's
+count is weighted by how much of it still overlaps the sliding window. The
+whole check (read per-user overrides, read both windows, admit + count) is a
+single Lua script, so it is atomic and costs one Redis round trip.
+"""
+from __future__ import annotations
+
+import math, time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from .auth import get_current_user, require_admin
+from .breaker import CircuitOpen, redis_breaker
+from .logger import log_event
+from .memory import get_redis
+from .settings import settings
+
+
+# KEYS: req_prev, req_cur, tok_prev, tok_cur, limits_hash
+# ARGV: prev_weight, default_req_limit, default_tok_limit, ttl_s, cost (requests to admit; 0 = read only)
+_CHECK_LUA = """
+local lim = redis.call('HMGET', KEYS[5], 'requests', 'tokens')
+local req_lim = tonumber(lim[1] or ARGV[2])
+local tok_lim = tonumber(lim[2] or ARGV[3])
+local w = tonumber(ARGV[1])
+local v = redis.call('MGET', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+local req = (tonumber(v[1] or '0') * w) + tonumber(v[2] or '0')
+local tok = (tonumber(v[3] or '0') * w) + tonumber(v[4] or '0')
+local cost = tonumber(ARGV[5])
+local blocked = ''
+if cost > 0 then
+  if req_lim > 0 and req + cost > req_lim then
+    blocked = 'requests'
+  elseif tok_lim > 0 and tok >= tok_lim then
+    blocked = 'tokens'
+  else
+    redis.call('INCRBY', KEYS[2], cost)
+    redis.call('EXPIRE', KEYS[2], ARGV[4])
+    req = req + cost
+  end
+end
+-- raw window counts too, for the caller to work out when a blocked request would fit
+local raw = {}
+for i = 1, 4 do raw[i] = tostring(tonumber(v[i] or '0')) end
+return {blocked, tostring(req), tostring(tok), req_lim, tok_lim, raw[1], raw[2], raw[3], raw[4]}
+"""
+
+
+@dataclass
+class Usage:
+    allowed: bool
+    blocked_on: Optional[str]
+    requests: float
+    tokens: float
+    request_limit: int
+    token_limit: int
+    window_s: int
+    retry_after: int
+    check_ms: float
+
+
+def _wait(prev: float, cur: float, budget: float, elapsed: float, window_s: int) -> float:
+    """
+    Seconds until the sliding count prev * (1 - (elapsed + t) / window_s) + cur is
+    down to `budget`: within the current window the previous one's weight runs
+    out; past its end the current count becomes the previous one and decays in
+    turn. Capped at two windows, after which both counts have aged out.
+    """
+    if budget < 0:
+        return 2.0 * window_s  # more than the limit at once: never admitted
+    weight = 1.0 - elapsed / window_s
+    if prev * weight + cur <= budget:
+        return 0.0
+    if cur <= budget:
+        return (prev * weight + cur - budget) / prev * window_s
+    return (window_s - elapsed) + window_s * (1.0 - budget / cur)
+
+
+class RateLimiter:
+    def __init__(self, client, window_s: int, default_requests: int, default_tokens: int):
+        self.r = client
+        self.window_s = window_s
+        self.default_requests = default_requests
+        self.default_tokens = default_tokens
+        self._script = client.register_script(_CHECK_LUA)
+
+    def _keys(self, user_id: str, idx: int) -> list[str]:
+        base = f"ratelimit:{user_id}"
+        return [f"{base}:req:{idx - 1}", f"{base}:req:{idx}", f"{base}:tok:{idx - 1}", f"{base}:tok:{idx}", f"{base}:limits"]
+
+    def _window(self) -> tuple[int, float]:
+        now = time.time()
+        idx = int(now // self.window_s)
+        elapsed = now - idx * self.window_s
+        return idx, elapsed
+
+    async def _run(self, user_id: str, cost: int) -> Usage:
+        t0 = time.perf_counter()
+        idx, elapsed = self._window()
+        weight = 1.0 - elapsed / self.window_s
+        blocked, req, tok, req_lim, tok_lim, req_prev, req_cur, tok_prev, tok_cur = await self._script(
+            keys=self._keys(user_id, idx),
+            args=[weight, self.default_requests, self.default_tokens, self.window_s * 2, cost],
+        )
+        check_ms = (time.perf_counter() - t0) * 1000
+        retry_after = 0
+        if blocked:
+            waits = [1.0]
+            if int(req_lim) > 0:
+                waits.append(math.ceil(_wait(float(req_prev), float(req_cur), int(req_lim) - cost, elapsed, self.window_s)))
+            if int(tok_lim) > 0:
+                # tokens admit only while strictly under the limit
+                waits.append(math.ceil(_wait(float(tok_prev), float(tok_cur), int(tok_lim) - 1e-6, elapsed, self.window_s)))
+            retry_after = int(max(waits))
+        return Usage(
+            allowed=not blocked,
+            blocked_on=blocked or None,
+            requests=round(float(req), 2),
+            tokens=round(float(tok), 2),
+            request_limit=int(req_lim),
+            token_limit=int(tok_lim),
+            window_s=self.window_s,
+            retry_after=retry_after,
+            check_ms=round(check_ms, 3),
+        )
+
+    async def hit(self, user_id: str, cost: int = 1) -> Usage:
+        return await self._run(user_id, cost=cost)
+
+    async def usage(self, user_id: str) -> Usage:
+        return await self._run(user_id, cost=0)
+
+    async def record_tokens(self, user_id: str, tokens: int) -> None:
+        if tokens <= 0:
+            return
+        idx, _ = self._window()
+        key = self._keys(user_id, idx)[3]
+        pipe = self.r.pipeline(transaction=False)
+        pipe.incrby(key, tokens)
+        pipe.expire(key, self.window_s * 2)
+        try:
+            async with redis_breaker.guard():
+                await pipe.execute()
+        except (RedisError, CircuitOpen) as e:
+            log_event("error.ratelimit", {"user_id": user_id, "error": str(e)})
+
+    async def set_limits(self, user_id: str, requests: Optional[int], tokens: Optional[int]) -> None:
+        key = f"ratelimit:{user_id}:limits"
+        pipe = self.r.pipeline()
+        for field, value in (("requests", requests), ("tokens", tokens)):
+            if value is None:
+                pipe.hdel(key, field)  # fall back to the configured default
+            else:
+                pipe.hset(key, field, value)
+        await pipe.execute()
+
+
+_limiter: RateLimiter | None = None
+
+
+def get_limiter() -> RateLimiter:
+    # bound to the current process's Redis client (see memory.get_memory)
+    global _limiter
+    r = get_redis()
+    if _limiter is None or _limiter.r is not r:
+        _limiter = RateLimiter(
+            r,
+            window_s=settings.RATE_LIMIT_WINDOW_S,
+            default_requests=settings.RATE_LIMIT_REQUESTS,
+            default_tokens=settings.RATE_LIMIT_TOKENS,
+        )
+    return _limiter
+
+
+async def check_rate_limit(user_id: str, cost: int = 1) -> None:
+    """Admit `cost` requests for the user or raise 429."""
+    try:
+        async with redis_breaker.guard():
+            usage = await get_limiter().hit(user_id, cost)
+    except (RedisError, CircuitOpen) as e:
+        # fail open: losing the limiter must not take /chat down with it
+        log_event("error.ratelimit", {"user_id": user_id, "error": str(e)})
+        return
+    if not usage.allowed:
+        log_event("ratelimit.blocked", {"user_id": user_id, "on": usage.blocked_on, "retry_after": usage.retry_after})
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded ({usage.blocked_on} per {usage.window_s}s)",
+            headers={"Retry-After": str(usage.retry_after)},
+        )
+
+
+async def enforce_rate_limit(user_id: str = Depends(get_current_user)) -> str:
+    """Dependency: authenticate, then admit or reject with 429."""
+    await check_rate_limit(user_id)
+    return user_id
+
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+
+class Limits(BaseModel):
+    requests: Optional[int] = None
+    tokens: Optional[int] = None
+
+
+@router.get("")
+async def my_usage(user_id: str = Depends(get_current_user)):
+    return {"username": user_id, **asdict(await get_limiter().usage(user_id))}
+
+
+@router.put("/{username}/limits")
+async def set_user_limits(username: str, limits: Limits, admin: str = Depends(require_admin)):
+    await get_limiter().set_limits(username, limits.requests, limits.tokens)
+    return {"username": username, **asdict(await get_limiter().usage(username))}
@@ -0,0 +1,126 @@
+# app/rcache.py
+"""
+Per-process retrieval cache in front of RAG.retrieve / retrieve_many.
+
+Two bounded LRUs:
+
+  results  (normalised query hash, k, min_score, where) -> ranked [(chunk id, score)]
+  chunks   chunk id -> (text, metadata)
+
+A hit skips the query embedding, the vector search, the fragment filter and
+the sort. Results are only valid for one index state, the version
+(alias generation, ingest write counter). Any change to it empties the results
+LRU. The ingest write counter is the Redis key INDEX_WRITES_KEY: the ingestion
+queue increments it after every batch it adds to the live collections, and each
+API worker's IndexWatcher reads it on every poll. The worker that ran the
+batch sees the change immediately. Chunk ids are unique per build and their
+bodies never change, so the chunks LRU is only emptied when the generation moves.
+"""
+from __future__ import annotations
+
+import hashlib, re
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+import orjson
+
+INDEX_WRITES_KEY = "index:writes"
+
+_WS_RE = re.compile(r"\s+")
+
+
+class LRU:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._items[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_items <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def result_key(query: str, k: int, min_score: float | None, where: Dict | None) -> Tuple:
+    # whitespace-insensitive but otherwise exact: the embedding sees case and punctuation
+    digest = hashlib.blake2b(_WS_RE.sub(" ", query).strip().encode("utf-8"), digest_size=16).digest()
+    return digest, k, min_score, orjson.dumps(where, option=orjson.OPT_SORT_KEYS) if where else None
+
+
+class RetrievalCache:
+    def __init__(self, max_results: int, max_chunks: int, version: Tuple[int, int] = (0, 0)):
+        self.results = LRU(max_results)
+        self.chunks = LRU(max_chunks)
+        self.version = version
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.results.max_items > 0
+
+    def sync(self, version: Tuple[int, int]) -> None:
+        """Drop everything computed against an older index state."""
+        if version == self.version:
+            return
+        if version[0] != self.version[0]:
+            self.chunks.clear()
+        self.results.clear()
+        self.version = version
+        self.invalidations += 1
+
+    def get(self, version: Tuple[int, int], key: Tuple) -> List[Dict] | None:
+        """The cached ranking with bodies attached, or None (a body evicted since counts as a miss)."""
+        self.sync(version)
+        ranked = self.results.get(key)
+        if ranked is None:
+            return None
+        docs = []
+        for id_, score in ranked:
+            body = self.chunks.get(id_)
+            if body is None:
+                return None
+            text, meta = body
+            docs.append({"id": id_, "text": text, "metadata": meta, "score": score, "length": len(text.strip())})
+        return docs
+
+    def put(self, version: Tuple[int, int], key: Tuple, docs: List[Dict]) -> None:
+        # a search that overlapped an index change must not be stored under the new version
+        if version != self.version:
+            return
+        self.results.put(key, [(d["id"], d["score"]) for d in docs])
+        for d in docs:
+            self.chunks.put(d["id"], (d["text"], d["metadata"]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": {"generation": self.version[0], "writes": self.version[1]},
+            "results": self.results.stats(),
+            "chunks": self.chunks.stats(),
+            "invalidations": self.invalidations,
+        }
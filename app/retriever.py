@@ -4,89 +4,566 @@ from __future__ import annotations
 
 from typing import List, Dict
 
-import httpx
+import asyncio, os, threading, time
 
-from tenacity import retry, wait_exponential_jitter, stop_after_attempt
+from concurrent.futures import ThreadPoolExecutor
 
-import chromadb
+from .settings import settings
 
-from chromadb.config import Settings as ChromaSettings
+from .embeddings import get_embedder
 
-from .settings import settings
+from .logger import log_event
+
+from .memory import get_redis
+
+from .store import open_client, open_collection, resolve_index
 
-OPENAI_API_KEY = settings.OPENAI_API_KEY
+from .fullvec import index_model_id, open_fullvecs, rescore, truncate
 
-EMBED_MODEL = settings.EMBED_MODEL
+from .rcache import INDEX_WRITES_KEY, RetrievalCache, result_key
 
-HEADERS = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
+from .docsum import summary_name, top_sections
 
-@retry(wait=wait_exponential_jitter(initial=0.5, max=8), stop=stop_after_attempt(6))
+MIN_CHUNK_CHARS = 200
 
 async def embed_query(text: str) -> list[float]:
 
-    payload = {"model": EMBED_MODEL, "input": [text]}
+    return (await get_embedder().embed([text]))[0]
 
-    async with httpx.AsyncClient(timeout=60) as client:
+class RAG:
 
-        r = await client.post("https://api.openai.com/v1/embeddings", headers=HEADERS, json=payload)
+    def __init__(self, path: str | None = None, name: str = "docs", shards: int | None = None, embed_model: str | None = None, index_dim: int | None = None, rescore_k: int | None = None, top_m: int | None = None):
 
-        r.raise_for_status()
+        self.client = open_client(path)
 
-        data = r.json()
+        self.base = name
 
-        return data["data"][0]["embedding"]
+        self.n_shards = shards or settings.CHROMA_SHARDS
 
-class RAG:
+        # with index_dim set the collections hold vector prefixes (see fullvec)
 
-    def __init__(self):
+        self.index_dim = settings.EMBED_INDEX_DIM if index_dim is None else index_dim
 
-        self.client = chromadb.PersistentClient(
+        self.rescore_k = settings.EMBED_RESCORE_K if rescore_k is None else rescore_k
 
-            path=settings.CHROMA_DIR,
+        self.fullvecs = open_fullvecs(path) if self.index_dim else None
 
-            settings=ChromaSettings(anonymized_telemetry=False),
+        # coarse-to-fine: search only the chunks of the top_m document sections by summary vector (see docsum)
 
-        )
+        self.top_m = settings.DOCSUM_TOP_M if top_m is None else top_m
+
+        self.coarse = {"queries": 0, "narrowed": 0, "fallbacks": 0, "docs": 0, "chunks": 0}
+
+        # searches run in to_thread workers: each counts locally and merges once under the lock
+
+        self._coarse_lock = threading.Lock()
+
+        self.embed_model = embed_model or index_model_id(get_embedder().model_id, self.index_dim)
+
+        names, self.generation = resolve_index(self.client, self.n_shards, self.base)
+
+        # (names, collections, pool, summaries) is replaced as one tuple on an index swap, and every
+
+        # search reads it once, so a query never mixes shards from two versions
+
+        self._index = self._open(names, None)
+
+        # ingest write counter last seen (see rcache); with the generation it versions the cache
+
+        self.writes = 0
+
+        self.cache = RetrievalCache(settings.RETRIEVAL_CACHE_SIZE, settings.CHUNK_CACHE_SIZE, self.version)
+
+    @property
+
+    def names(self) -> List[str]:
+
+        return self._index[0]
+
+    @property
+
+    def shards(self) -> list:
+
+        return self._index[1]
+
+    @property
+
+    def summaries(self) -> list:
+
+        return self._index[3]
+
+
+
+    @property
+
+    def version(self) -> tuple[int, int]:
+
+        return self.generation, self.writes
+
+    def note_writes(self, writes: int) -> None:
+
+        """Chunks were added to the live collections (writes = the shared counter's new value)."""
+
+        self.writes = writes
+
+        # the cache is only touched from the event loop, never from refresh()'s thread
+
+        self.cache.sync(self.version)
+
+    def _open(self, names: List[str], pool: ThreadPoolExecutor | None) -> tuple:
+
+        shards = [open_collection(self.client, n, self.embed_model) for n in names]
+
+        summaries = [open_collection(self.client, summary_name(n), self.embed_model) for n in names]
+
+        if len(shards) > 1 and (pool is None or pool._max_workers < len(shards)):
+
+            # one thread per shard so a query fans out concurrently across them
+
+            pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="rag-shard")
+
+        return names, shards, pool, summaries
+
+    def refresh(self) -> bool:
+
+        """Follow the alias: open and warm a newly flipped index version, then switch to it."""
+
+        names, generation = resolve_index(self.client, self.n_shards, self.base)
+
+        if generation == self.generation:
+
+            return False
+
+        t0 = time.perf_counter()
+
+        index = self._open(names, self._index[2])
+
+        for coll in index[1] + index[3]:
+
+            # load each HNSW segment now, so the first real query after the swap is not slow
+
+            probe = coll.get(limit=1, include=["embeddings"])
+
+            if probe["ids"]:
+
+                coll.query(query_embeddings=[probe["embeddings"][0]], n_results=1, include=["distances"])
+
+        old = self.names
+
+        self._index, self.generation = index, generation
+
+        log_event("index.swap", {
+
+            "pid": os.getpid(),
+
+            "generation": generation,
+
+            "from": old,
+
+            "to": names,
 
-        self.coll = self.client.get_or_create_collection("docs", metadata={"hnsw:space": "cosine"})
+            "warm_ms": round((time.perf_counter() - t0) * 1000, 1),
+
+        })
+
+        return True
+
+    def close(self) -> None:
+
+        if self._index[2] is not None:
+
+            self._index[2].shutdown(wait=False)
 
     async def retrieve(self, query: str, k: int = 4) -> List[Dict]:
 
-        q_emb = await embed_query(query)
+        return (await self.retrieve_many([query], [k]))[0]
+
+    async def retrieve_many(self, queries: List[str], ks: List[int], min_score: float | None = None, where: Dict | None = None) -> List[List[Dict]]:
+
+        """One embedding call and one multi-query vector search for the queries not answered from the cache."""
+
+        version = self.version
+
+        keys = [result_key(q, k, min_score, where) for q, k in zip(queries, ks)]
+
+        found = [self.cache.get(version, key) for key in keys] if self.cache.enabled else [None] * len(queries)
+
+        miss = [i for i, docs in enumerate(found) if docs is None]
+
+        if miss:
+
+            q_embs = await get_embedder().embed([queries[i] for i in miss])
+
+            # vector search is blocking; keep it off the event loop
+
+            searched = await asyncio.to_thread(self.search_many, q_embs, [ks[i] for i in miss], min_score, where)
+
+            for i, docs in zip(miss, searched):
+
+                found[i] = docs
+
+                self.cache.put(version, keys[i], docs)
+
+        return found
+
+    @staticmethod
+
+    def _map_shards(pool: ThreadPoolExecutor | None, fn, items: list) -> list:
+
+        if pool is None or len(items) == 1:
+
+            return [fn(x) for x in items]
+
+        return list(pool.map(fn, items))
+
+    def _candidates(self, q_embs: list[list[float]], n_results: int, ks: list[int], where: Dict | None = None, index: tuple | None = None) -> list[list[tuple[str, str, dict, float]]]:
+
+        """Per query: (id, text, metadata, distance) in ascending distance, enough to yield k usable chunks."""
+
+        index = index or self._index
+
+        if not self.top_m or where is not None:
+
+            return self._search(index, q_embs, n_results, ks, where)
+
+        # coarse: the top_m sections by centroid; a caller's own filter is searched as given
+
+        _, _, pool, summaries = index
+
+        outs = self._map_shards(
+
+            pool,
+
+            lambda c: c.query(query_embeddings=q_embs, n_results=self.top_m, include=["documents","distances"]),  # type: ignore
+
+            summaries,
+
+        )
+
+        results: list = [None] * len(q_embs)
+
+        counts = {"queries": len(q_embs), "narrowed": 0, "fallbacks": 0, "docs": 0, "chunks": 0}
+
+        # fewer sections than top_m in the whole store: pruning would gain nothing
+
+        if sum(len(out["ids"][0]) for out in outs) >= self.top_m:
+
+            for q, (chunk_ids, n_docs) in enumerate(top_sections(outs, len(q_embs), self.top_m)):
+
+                # fine: the same search, restricted to the chosen sections' chunks
+
+                hits = self._search(index, [q_embs[q]], n_results, [ks[q]], None, chunk_ids)[0]
+
+                counts["narrowed"] += 1
+
+                counts["docs"] += n_docs
+
+                counts["chunks"] += sum(map(len, chunk_ids))
+
+                if sum(len(h[1].strip()) >= MIN_CHUNK_CHARS for h in hits) >= ks[q]:
+
+                    results[q] = hits
+
+                else:
+
+                    counts["fallbacks"] += 1
+
+        with self._coarse_lock:
+
+            for key, n in counts.items():
+
+                self.coarse[key] += n
+
+        # everything not answered from the chosen sections gets the full search, in one call
+
+        full = [q for q, r in enumerate(results) if r is None]
+
+        if full:
+
+            for q, hits in zip(full, self._search(index, [q_embs[q] for q in full], n_results, [ks[q] for q in full], None)):
+
+                results[q] = hits
+
+        return results
+
+
+
+    def coarse_stats(self) -> Dict:
+
+        with self._coarse_lock:
+
+            c = dict(self.coarse)
+
+        return {
+
+            "top_m": self.top_m,
+
+            **c,
+
+            "narrowed_rate": round(c["narrowed"] / c["queries"], 4) if c["queries"] else 0.0,
+
+            "fallback_rate": round(c["fallbacks"] / c["narrowed"], 4) if c["narrowed"] else 0.0,
+
+            "docs_per_query": round(c["docs"] / c["narrowed"], 2) if c["narrowed"] else None,
+
+            "chunks_per_query": round(c["chunks"] / c["narrowed"], 1) if c["narrowed"] else None,
+
+        }
+
+
+
+    def _search(self, index: tuple, q_embs: list[list[float]], n_results: int, ks: list[int], where: Dict | None, ids: List[List[str]] | None = None) -> list[list[tuple[str, str, dict, float]]]:
+
+        """_candidates without the coarse stage; `ids` (per shard) restricts the search to those chunks."""
+
+        _, shards, pool, _ = index
+
+        # a prefix index only needs bodies for the max(k, rescore_k) candidates it re-scores: read
+
+        # those via the paged path below, not all n_results; likewise a search restricted to a few
+
+        # sections (ids) is cheap enough that loading 100 bodies would dominate it
+
+        if len(shards) == 1 and not self.index_dim and ids is None:
+
+            out = shards[0].query(query_embeddings=q_embs, n_results=n_results, where=where, include=["documents","metadatas","distances"])  # type: ignore
+
+            return [list(zip(out["ids"][q], out["documents"][q], out["metadatas"][q], out["distances"][q])) for q in range(len(q_embs))]
+
+        # Fan out for ids + distances only and merge into the global top-n. Loading documents
+
+        # is most of a query's cost, so bodies are fetched afterwards in score order, a page
+
+        # at a time (one get per shard for all queries), until k of them survive the fragment filter.
+
+        # Chroma rejects ids a collection does not hold, so each shard gets only its own
+
+        searched = [s for s in range(len(shards)) if ids is None or ids[s]]
+
+        outs = self._map_shards(
+
+            pool,
+
+            lambda s: shards[s].query(query_embeddings=q_embs, ids=ids[s] if ids else None, n_results=n_results, where=where, include=["distances"]),  # type: ignore
+
+            searched,
+
+        )
+
+        merged = [
+
+            sorted(
+
+                ((dist, s, id_) for s, out in zip(searched, outs) for id_, dist in zip(out["ids"][q], out["distances"][q])),
+
+                key=lambda h: h[0],
+
+            )[:n_results]
+
+            for q in range(len(q_embs))
+
+        ]
+
+        results: list[list[tuple[str, str, dict, float]]] = [[] for _ in q_embs]
+
+        usable = [0] * len(q_embs)
+
+        page = max(2 * max(ks), 8)
+
+        pending, start = list(range(len(q_embs))), 0
+
+        while pending:
+
+            chunks = {q: merged[q][start:start + page] for q in pending}
+
+            wanted = [(s, sorted({id_ for c in chunks.values() for _, hs, id_ in c if hs == s})) for s in range(len(shards))]
+
+            got = self._map_shards(
+
+                pool,
+
+                lambda w: shards[w[0]].get(ids=w[1], include=["documents","metadatas"]),
+
+                [w for w in wanted if w[1]],
+
+            )
+
+            bodies = {id_: (doc, meta) for g in got for id_, doc, meta in zip(g["ids"], g["documents"], g["metadatas"])}
+
+            for q, chunk in chunks.items():
+
+                for dist, _, id_ in chunk:
+
+                    if id_ in bodies:
+
+                        results[q].append((id_, *bodies[id_], dist))
+
+                        usable[q] += len(bodies[id_][0].strip()) >= MIN_CHUNK_CHARS
+
+            start += page
+
+            pending = [q for q in pending if usable[q] < ks[q] and start < len(merged[q])]
+
+        return results
+
+    def search(self, q_emb: list[float], k: int = 4) -> List[Dict]:
+
+        """Rank stored chunks against an already-embedded query (no network)."""
+
+        return self.search_many([q_emb], [k])[0]
+
+    def search_many(self, q_embs: list[list[float]], ks: list[int], min_score: float | None = None, where: Dict | None = None) -> List[List[Dict]]:
+
+        """Per query, the top-k chunks by score; optionally only those scoring >= min_score / matching a metadata filter."""
+
+        if self.index_dim:
+
+            # search the prefix index, then rank at least rescore_k candidates by their full vectors
+
+            fetch = [max(k, self.rescore_k) for k in ks]
+
+            # one index version for the search and the full-vector lookup
+
+            index = self._index
+
+            hits_per_query = self._candidates(truncate(q_embs, self.index_dim).tolist(), n_results=min(max(fetch) * 20, 100), ks=fetch, where=where, index=index)
+
+            # only the nearest fetch usable chunks (at least k) can make the cut, so only they are re-scored
+
+            hits_per_query = [[h for h in hits if len(h[1].strip()) >= MIN_CHUNK_CHARS][:n] for hits, n in zip(hits_per_query, fetch)]
+
+            full = self.fullvecs.get(index[0], [h[0] for hits in hits_per_query for h in hits]) if self.rescore_k else {}
+
+            hits_per_query = [rescore(hits, q if self.rescore_k else None, full) for hits, q in zip(hits_per_query, q_embs)]
+
+        else:
+
+            # Request more results to filter out tiny fragments and prefer larger chunks
+
+            hits_per_query = self._candidates(q_embs, n_results=min(max(ks) * 20, 100), ks=ks, where=where)
+
+        ranked = []
+
+        for hits, k in zip(hits_per_query, ks):
+
+            candidates = []
+
+            for id_, text, meta, dist in hits:
+
+                # Filter out very small chunks (less than 200 chars) - likely fragments
+
+                if len(text.strip()) < MIN_CHUNK_CHARS:
+
+                    continue
+
+                if min_score is not None and 1 - dist < min_score:
+
+                    continue
+
+                candidates.append({
+
+                    "id": id_,
+
+                    "text": text,
+
+                    "metadata": meta,
+
+                    "score": 1 - dist,  # cosine similarity approx
+
+                    "length": len(text.strip()),
+
+                })
+
+            # Sort by score first, then by length (prefer larger chunks with similar scores)
+            candidates.sort(key=lambda x: (x["score"], x["length"]), reverse=True)
+
+            # Return top k chunks
+            ranked.append(candidates[:k])
+
+        return ranked
+
+_rag: RAG | None = None
+
+_rag_pid: int | None = None
+
+def get_rag() -> RAG:
+
+    """Per-process singleton, opened on first use (normally in the app lifespan)."""
+
+    global _rag, _rag_pid
+
+    if _rag is None or _rag_pid != os.getpid():
+
+        _rag = RAG()
+
+        _rag_pid = os.getpid()
+
+    return _rag
+
+class IndexWatcher:
+
+    """Polls the index alias every INDEX_POLL_S and swaps this worker's RAG onto a new version; also follows the ingest write counter."""
+
+    def __init__(self, interval_s: float):
+
+        self.interval_s = interval_s
+
+        self._task: asyncio.Task | None = None
+
+    async def _loop(self) -> None:
+
+        while True:
+
+            await asyncio.sleep(self.interval_s)
+
+            try:
+
+                await asyncio.to_thread(get_rag().refresh)
+
+            except Exception as e:  # e.g. the new version was built with another embedding model
+
+                log_event("error.index_swap", {"pid": os.getpid(), "error": str(e)})
+
+            try:
+
+                # uploads processed by other workers invalidate this worker's retrieval cache
+
+                get_rag().note_writes(int(await get_redis().get(INDEX_WRITES_KEY) or 0))
+
+            except Exception as e:
+
+                log_event("error.index_writes", {"pid": os.getpid(), "error": str(e)})
 
-        # Request more results to filter out tiny fragments and prefer larger chunks
-        out = self.coll.query(query_embeddings=[q_emb], n_results=min(k * 20, 100), include=["documents","metadatas","distances"])  # type: ignore
+    def start(self) -> None:
 
-        candidates = []
+        if self._task is None and self.interval_s > 0:
 
-        for i in range(len(out["ids"][0])):
+            self._task = asyncio.create_task(self._loop())
 
-            text = out["documents"][0][i]
+    async def stop(self) -> None:
 
-            # Filter out very small chunks (less than 200 chars) - likely fragments
+        if self._task is not None:
 
-            if len(text.strip()) < 200:
+            self._task.cancel()
 
-                continue
+            try:
 
-            candidates.append({
+                await self._task
 
-                "id": out["ids"][0][i],
+            except asyncio.CancelledError:
 
-                "text": text,
+                pass
 
-                "metadata": out["metadatas"][0][i],
+            self._task = None
 
-                "score": 1 - out["distances"][0][i],  # cosine similarity approx
+index_watcher = IndexWatcher(settings.INDEX_POLL_S)
 
-                "length": len(text.strip()),
+def close_rag() -> None:
 
-            })
+    global _rag
 
-        # Sort by score first, then by length (prefer larger chunks with similar scores)
-        candidates.sort(key=lambda x: (x["score"], x["length"]), reverse=True)
+    if _rag is not None and _rag_pid == os.getpid():
 
-        # Return top k chunks
-        return candidates[:k]
+        _rag.close()
 
-rag = RAG()
+    _rag = None
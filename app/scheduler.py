@@ -0,0 +1,186 @@
+# app/scheduler.py
+"""
+Admission control for upstream (OpenAI) calls.
+
+Each UpstreamScheduler enforces a concurrency cap and a tokens-per-minute
+budget. Callers that cannot start immediately wait in a bounded queue for at
+most `max_wait_s`; when the queue is full (or the wait runs out) the call is
+rejected with AdmissionRejected, which the API turns into a 429 + Retry-After.
+A request deadline (see deadline.py) shortens the wait; running out of it
+raises DeadlineExceeded instead.
+"""
+from __future__ import annotations
+
+import asyncio, math, time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from .deadline import DeadlineExceeded, remaining
+from .settings import settings
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, name: str, reason: str, retry_after: int):
+        super().__init__(f"{name} upstream busy: {reason}")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+    """Continuous-refill bucket; tokens_per_minute <= 0 disables it."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, n: int) -> None:
+        if self.rate <= 0:
+            return
+        n = min(n, self.capacity)  # a single oversize request must still be admissible
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+    def adjust(self, delta: int) -> None:
+        """Correct an estimate once real usage is known (delta > 0 means we under-reserved)."""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    def seconds_until(self, n: int) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (min(n, self.capacity) - self.tokens) / self.rate)
+
+
+class UpstreamScheduler:
+    def __init__(self, name: str, max_concurrency: int, tokens_per_minute: int, max_queue: int, max_wait_s: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._bucket = _TokenBucket(tokens_per_minute)
+        self._waiting = 0
+        self._in_flight = 0
+        self._waits: deque[float] = deque(maxlen=1024)
+        self._service: deque[float] = deque(maxlen=256)
+        self.admitted = 0
+        self.rejected = 0
+
+    def _retry_after(self, tokens: int) -> int:
+        # rough drain time of the current queue, floored at one second
+        svc = sum(self._service) / len(self._service) if self._service else 1.0
+        drain = svc * (self._waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(max(drain, self._bucket.seconds_until(tokens))))
+
+    async def _acquire(self, tokens: int, held: bool) -> None:
+        if not held:
+            await self._sem.acquire()
+        try:
+            await self._bucket.take(tokens)
+        except BaseException:
+            self._sem.release()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0) -> AsyncIterator["UpstreamScheduler"]:
+        """Hold one upstream slot for the duration of the block."""
+        # A free slot is taken synchronously; only callers that must wait count against the queue.
+        held = not self._sem.locked()
+        if held:
+            await self._sem.acquire()  # does not block while unlocked
+        elif self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, "queue full", self._retry_after(tokens))
+
+        t0 = time.monotonic()
+        # never queue past the request's deadline
+        left = remaining()
+        max_wait = self.max_wait_s if left is None else max(0.0, min(self.max_wait_s, left))
+        self._waiting += not held
+        try:
+            await asyncio.wait_for(self._acquire(tokens, held), timeout=max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            if max_wait < self.max_wait_s:
+                raise DeadlineExceeded(f"{self.name} admission") from None
+            raise AdmissionRejected(self.name, "queue wait exceeded", self._retry_after(tokens)) from None
+        finally:
+            self._waiting -= not held
+
+        started = time.monotonic()
+        self._waits.append(started - t0)
+        self.admitted += 1
+        self._in_flight += 1
+        try:
+            yield self
+        finally:
+            self._in_flight -= 1
+            self._service.append(time.monotonic() - started)
+            self._sem.release()
+
+    @property
+    def has_free_slot(self) -> bool:
+        """True when a call could start right now (used to decide whether a hedge is affordable)."""
+        return not self._sem.locked()
+
+    def reconcile(self, estimated: int, actual: int | None) -> None:
+        if actual is not None:
+            self._bucket.adjust(actual - estimated)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            return round(waits[int(p * (len(waits) - 1))] * 1000, 1) if waits else 0.0
+
+        return {
+            "queue_depth": self._waiting,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "tokens_available": None if self._bucket.rate <= 0 else int(self._bucket.tokens),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_ms_p50": pct(0.5),
+            "wait_ms_p95": pct(0.95),
+        }
+
+
+def estimate_tokens(text_chars: int) -> int:
+    # ~4 characters per token for English text
+    return max(1, text_chars // 4)
+
+
+llm_scheduler = UpstreamScheduler(
+    "llm",
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    tokens_per_minute=settings.LLM_TPM,
+    max_queue=settings.UPSTREAM_MAX_QUEUE,
+    max_wait_s=settings.UPSTREAM_MAX_WAIT_S,
+)
+
+embed_scheduler = UpstreamScheduler(
+    "embeddings",
+    max_concurrency=settings.EMBED_MAX_CONCURRENCY,
+    tokens_per_minute=settings.EMBED_TPM,
+    max_queue=settings.UPSTREAM_MAX_QUEUE,
+    max_wait_s=settings.UPSTREAM_MAX_WAIT_S,
+)
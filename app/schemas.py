@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Literal
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Literal
 
 
 
@@ -19,7 +19,25 @@ class ChatRequest(BaseModel):
 
     session_id: Optional[str] = None
 
-    message: str
+    message: str = ""
+
+    use_rag: bool = False
+
+    k: int = Field(6, ge=1, le=50)  # default to 6 for balanced retrieval coverage
+
+
+
+class Source(BaseModel):
+
+    source: Optional[str] = None
+
+    page: Optional[int] = None
+
+    score: Optional[float] = None
+
+    snippet: str = ""
+
+    occurrences: Optional[List[Dict[str, Any]]] = None  # every source/page of a collapsed duplicate
 
 
 
@@ -33,3 +51,171 @@ class ChatResponse(BaseModel):
 
     tokens_out: int | None = None
 
+    sources: List[Source] = []
+
+    timings: Dict[str, float] = {}
+
+    # dependencies the answer was produced without ("rag", "history"), when any were unavailable
+
+    degraded: Optional[List[str]] = None
+
+
+
+class BatchItem(BaseModel):
+
+    message: str
+
+    use_rag: bool = False
+
+    k: int = Field(6, ge=1, le=50)
+
+
+
+class BatchRequest(BaseModel):
+
+    items: List[BatchItem]
+
+
+
+class RetrieveRequest(BaseModel):
+
+    query: Optional[str] = None
+
+    queries: List[str] = []
+
+    k: int = Field(6, ge=1, le=50)
+
+    min_score: Optional[float] = None
+
+    sources: Optional[List[str]] = None  # exact `source` values as returned in citations
+
+    ids_only: bool = False
+
+
+
+class BatchResult(BaseModel):
+
+    index: int
+
+    answer: Optional[str] = None
+
+    sources: List[Source] = []
+
+    tokens_in: int | None = None
+
+    tokens_out: int | None = None
+
+    error: Optional[str] = None
+
+    timings: Dict[str, float] = {}
+
+    latency_ms: float = 0.0
+
+
+
+class BatchResponse(BaseModel):
+
+    results: List[BatchResult]
+
+    timings: Dict[str, float] = {}
+
+
+
+class RetrieveHit(BaseModel):
+
+    id: str
+
+    score: float
+
+    source: Optional[str] = None
+
+    page: Optional[int] = None
+
+    text: Optional[str] = None
+
+    occurrences: Optional[List[Dict[str, Any]]] = None
+
+
+
+class RetrieveResult(BaseModel):
+
+    query: str
+
+    hits: List[RetrieveHit]
+
+
+
+class RetrieveResponse(BaseModel):
+
+    results: List[RetrieveResult]
+
+    latency_ms: float
+
+
+
+class SessionResponse(BaseModel):
+
+    username: str
+
+    session_id: str
+
+    history: List[Message]
+
+
+
+class JobStatus(BaseModel):
+
+    job_id: str
+
+    status: Literal["queued", "extracting", "embedding", "done", "failed"]
+
+    filename: str
+
+    chunks_total: int = 0
+
+    chunks_done: int = 0
+
+    duplicates: int = 0
+
+    progress: float = 0.0
+
+    eta_s: Optional[float] = None
+
+    error: Optional[str] = None
+
+    created_at: float
+
+    started_at: Optional[float] = None
+
+    finished_at: Optional[float] = None
+
+
+
+class SessionSummary(BaseModel):
+
+    session_id: str
+
+    title: str = ""
+
+    messages: int = 0
+
+    created_at: float
+
+    updated_at: float
+
+
+
+class SessionList(BaseModel):
+
+    sessions: List[SessionSummary]
+
+    next_cursor: Optional[str] = None  # opaque; pass as ?before= for the next page
+
+
+
+class DeleteSessionsRequest(BaseModel):
+
+    session_ids: List[str] = []
+
+    all: bool = False
+
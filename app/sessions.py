@@ -0,0 +1,63 @@
+# app/sessions.py
+"""
+"My conversations": paginated listing and bulk deletion of a user's sessions,
+served from the per-user session index in RedisMemory (no keyspace scans).
+
+`python -m app.sessions backfill` indexes sessions written before the index existed.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .auth import get_current_user
+from .logger import log_event
+from .memory import get_memory, close_memory
+from .schemas import DeleteSessionsRequest, SessionList
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+
+MAX_BULK_DELETE = 500
+
+
+@router.get("", response_model=SessionList)
+async def list_sessions(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    user_id: str = Depends(get_current_user),
+):
+    try:
+        sessions, cursor = await get_memory().list_sessions(user_id, limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return SessionList(sessions=sessions, next_cursor=cursor)
+
+
+# POST rather than DELETE with a body, which many clients and proxies drop or reject
+@router.post("/delete")
+async def delete_sessions(req: DeleteSessionsRequest, user_id: str = Depends(get_current_user)):
+    if req.all:
+        deleted = await get_memory().delete_all_sessions(user_id)
+    else:
+        if not req.session_ids or len(req.session_ids) > MAX_BULK_DELETE:
+            raise HTTPException(status_code=400, detail=f"Provide 1..{MAX_BULK_DELETE} session_ids, or all=true")
+        deleted = await get_memory().delete_sessions(user_id, list(dict.fromkeys(req.session_ids)))
+    log_event("sessions.delete", {"user_id": user_id, "all": req.all, "deleted": deleted})
+    return {"ok": True, "deleted": deleted}
+
+
+async def _backfill() -> None:
+    try:
+        print(f"Indexed {await get_memory().backfill_index()} existing sessions")
+    finally:
+        await close_memory()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["backfill"]:
+        raise SystemExit("usage: python -m app.sessions backfill")
+    asyncio.run(_backfill())
@@ -14,16 +14,186 @@ class Settings(BaseSettings):
 
     MAX_TURNS: int = 8
 
+    SESSION_TTL_S: int = 0  # sessions idle this long expire, e.g. 30 * 24 * 3600 (0 = keep forever)
+
     TIMEOUT_S: int = 30
 
     REDIS_URL: str = "redis://localhost:6379/0"
 
     EMBED_MODEL: str = "text-embedding-3-small"  # cheap & good; or text-embedding-3-large
 
+    EMBED_PROVIDER: str = "openai"  # "openai" or "local"
+
+    EMBED_LOCAL_PATH: str = ""  # dir with model.onnx + tokenizer.json for EMBED_PROVIDER=local
+
+    EMBED_WORKERS: int = 2
+
+    EMBED_BATCH_SIZE: int = 32
+
+    EMBED_MAX_TOKENS: int = 256
+
+    # Index only a renormalised prefix of each vector (text-embedding-3 supports e.g. 256 or 512);
+
+    # full vectors are kept in a side store (see fullvec.py) and used to re-score the nearest candidates
+
+    EMBED_INDEX_DIM: int = 0  # 0 = index full vectors
+
+    EMBED_RESCORE_K: int = 20  # candidates per query re-scored with full vectors (0 = rank by the prefix alone)
+
+    FULLVEC_PATH: str = ""  # SQLite file holding the full vectors; "" = fullvec.sqlite3 in CHROMA_DIR
+
+    # Coarse-to-fine retrieval over per-document summary vectors (see docsum.py)
+
+    DOCSUM_TOP_M: int = 0  # summary sections whose chunks are searched per query; 0 = always search every chunk
+
+    DOCSUM_SECTION_CHUNKS: int = 16  # consecutive chunks of a document averaged into one summary vector
+
     CHROMA_DIR: str = "./vectorstore"
 
+    CHROMA_HOST: str = ""  # use a Chroma server instead of CHROMA_DIR (needed for uploads to reach every API worker)
+
+    CHROMA_PORT: int = 8000
+
     DATA_DIR: str = "./data"
 
+    INGEST_WORKERS: int = 0  # PDF extraction processes; 0 = one per CPU
+
+    EXTRACT_CACHE_DIR: str = "./.cache/extract"  # per (extractor version, file hash, page) text
+
+    CHROMA_SHARDS: int = 1  # 1 = single "docs" collection; N = docs-s0..docs-s{N-1}
+
+    CHROMA_SHARD_BY: str = "source"  # "source" (whole document per shard) or "hash" (per chunk)
+
+    INDEX_POLL_S: float = 2.0  # how often API workers check the index alias for a new version (0 = never)
+
+    # Per-worker retrieval cache (see rcache), emptied on an index swap or an ingest write
+
+    RETRIEVAL_CACHE_SIZE: int = 2048  # cached rankings (query, k, min_score, filter); 0 disables the cache
+
+    CHUNK_CACHE_SIZE: int = 8192  # chunk bodies those rankings point at
+
+
+
+    # Upstream admission control (TPM <= 0 disables the token budget)
+
+    LLM_MAX_CONCURRENCY: int = 8
+
+    LLM_TPM: int = 0
+
+    LLM_COMPLETION_ESTIMATE: int = 500  # tokens reserved per completion until real usage is known
+
+    EMBED_MAX_CONCURRENCY: int = 8
+
+    EMBED_TPM: int = 0
+
+    UPSTREAM_MAX_QUEUE: int = 64
+
+    UPSTREAM_MAX_WAIT_S: float = 10.0
+
+    # Circuit breakers for the LLM, embeddings and Redis (see breaker.py); BREAKER_FAILURES <= 0 disables them
+
+    BREAKER_FAILURES: int = 5  # consecutive failures that open a breaker
+
+    BREAKER_RESET_S: float = 30.0  # how long it stays open before a half-open probe
+
+    REDIS_CONNECT_TIMEOUT_S: float = 2.0
+
+
+
+    # Response compression (see compression.py); brotli when the Brotli package is installed, else gzip
+
+    COMPRESS_MIN_BYTES: int = 1024  # smaller bodies are sent as they are; <= 0 disables compression
+
+    COMPRESS_GZIP_LEVEL: int = 6
+
+    COMPRESS_BROTLI_QUALITY: int = 4  # 4-5 is the usual trade-off for dynamic responses (11 is for build-time assets)
+
+    # Record/replay of OpenAI calls for offline, deterministic benchmarks and evals (see cassette.py)
+
+    CASSETTE_MODE: str = ""  # "" (off), "record" or "replay"
+
+    CASSETTE_PATH: str = "./.cache/cassette.sqlite"
+
+    CASSETTE_LATENCY_MS: float = 0.0  # synthetic delay per replayed response; -1 = the latency measured when recording
+
+    # End-to-end request deadlines (0 = none); clients may ask for less with `X-Request-Timeout: <seconds>`
+
+    REQUEST_DEADLINE_S: float = 30.0  # /chat and /retrieve
+
+    BATCH_DEADLINE_S: float = 120.0  # /chat/batch
+
+    # Hedged embedding calls: a duplicate is sent when the first has not answered after the recent p95
+
+    EMBED_HEDGE_MAX_TEXTS: int = 8  # calls with more texts (ingest batches) are never hedged; 0 disables hedging
+
+    EMBED_HEDGE_DEFAULT_MS: float = 300.0  # hedge delay until enough latencies have been observed
+
+
+
+    # Per-user sliding-window limits (0 disables); overridable per user via PUT /usage/{user}/limits
+
+    RATE_LIMIT_WINDOW_S: int = 60
+
+    RATE_LIMIT_REQUESTS: int = 30
+
+    RATE_LIMIT_TOKENS: int = 100_000
+
+    ADMIN_USERS: str = ""  # comma-separated usernames
+
+
+
+    # Background dependency probes behind /health and /ready
+
+    HEALTH_INTERVAL_S: float = 15.0
+
+    HEALTH_TIMEOUT_S: float = 5.0
+
+    HEALTH_MAX_AGE_S: float = 60.0
+
+
+
+    # /chat/batch
+
+    BATCH_MAX_ITEMS: int = 200
+
+    BATCH_CONCURRENCY: int = 8  # completions in flight per batch request
+
+
+
+    # Near-duplicate chunk collapsing at ingest (MinHash/LSH); threshold <= 0 disables
+
+    DEDUP_THRESHOLD: float = 0.85  # estimated Jaccard similarity of word 5-gram shingles
+
+    DEDUP_NUM_PERM: int = 128
+
+    DEDUP_BANDS: int = 16  # LSH bands; rows per band = NUM_PERM / BANDS
+
+
+
+    # Document uploads and the Redis-backed ingestion queue
+
+    INGEST_QUEUE_WORKERS: int = 0  # job consumers per API process (only with a single API worker unless CHROMA_HOST is set); 0 = run `python -m app.jobs`
+
+    UPLOAD_MAX_MB: int = 25
+
+    JOB_TTL_S: int = 7 * 24 * 3600
+
+
+
+    # Opt-in request profiling (admin-gated); with PROFILE_ENABLED=false the middleware is not installed
+
+    PROFILE_ENABLED: bool = False
+
+    PROFILE_SAMPLE_RATE: float = 0.0  # fraction of requests profiled; admins can also send `X-Profile: 1` (or `alloc`)
+
+    PROFILE_INTERVAL_MS: float = 5.0
+
+    PROFILE_TRACEMALLOC: bool = False  # allocation diff for every profiled request, not just `X-Profile: alloc`
+
+    PROFILE_DIR: str = "./profiles"
+
+    PROFILE_KEEP: int = 200  # newest profiles kept on disk
+
 
 
     # Pydantic v2 config (replaces Config class)
@@ -0,0 +1,34 @@
+# app/shards.py
+"""
+Shard layout for the `docs` vector store.
+
+With CHROMA_SHARDS=1 the single collection keeps its historical name `docs`;
+with N > 1 the shards are `docs-s0` .. `docs-s{N-1}`. Chunks are routed by a
+stable hash of either their source file (CHROMA_SHARD_BY=source, so a whole
+document lives in one shard) or their chunk key (CHROMA_SHARD_BY=hash, for an
+even spread).
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, List
+
+
+def shard_names(n: int, base: str = "docs") -> List[str]:
+    return [base] if n <= 1 else [f"{base}-s{i}" for i in range(n)]
+
+
+def shard_of(key: str, n: int) -> int:
+    # not hash(): that is salted per process and would move chunks between runs
+    if n <= 1:
+        return 0
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % n
+
+
+def shard_key(doc: Dict, by: str) -> str:
+    if by == "source":
+        return str(doc["metadata"]["source"])
+    if by == "hash":
+        return doc["key"]
+    raise ValueError(f"unknown shard assignment {by!r} (expected 'source' or 'hash')")
@@ -0,0 +1,243 @@
+# app/snapshot.py
+"""
+Portable snapshots of the live vector index, for cold-starting or replicating a
+node without sharing CHROMA_DIR and without re-embedding anything.
+
+A snapshot is a directory:
+
+  manifest.json      format, embed_model, dim, dtype, row count, per-shard row
+                     ranges, and the sha256 + size of every other file
+  embeddings.npy     (rows, dim) float16 or float32, loadable with mmap_mode="r"
+  records.jsonl.gz   one {"id", "document", "metadata"} per row, same order
+  fullvec.npy        (rows, full dim) float16 full vectors, same order; only for a
+                     reduced-dimension index (see fullvec.py)
+
+Import loads the rows into a new index version, validates it and flips the
+alias (see store.py), so running API workers switch to it live. Document
+summary vectors (docsum.py) are not exported; import recomputes them from the
+imported vectors.
+
+Usage:
+    python -m app.snapshot export snapshots/2024-06-01 [--dtype float16]
+    python -m app.snapshot verify snapshots/2024-06-01
+    python -m app.snapshot import snapshots/2024-06-01 [--no-flip]
+"""
+from __future__ import annotations
+
+import argparse, gzip, hashlib, time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import orjson
+
+from .fullvec import FullVectorStore, index_model_id, open_fullvecs
+from .settings import settings
+from .shards import shard_names
+from .store import open_client, open_collection, resolve_index, next_version, version_base, flip_alias, gc_versions
+
+FORMAT = 1
+PAGE = 5000
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def export_snapshot(client, out_dir: str | Path, dtype: str = "float16", n_shards: int | None = None, fullvecs: FullVectorStore | None = None) -> Dict:
+    """Write the live index to out_dir; returns the manifest (with export timings). `fullvecs` is required for a reduced-dimension index."""
+    t0 = time.perf_counter()
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    names, generation = resolve_index(client, n_shards or settings.CHROMA_SHARDS)
+    colls = [client.get_collection(n) for n in names]
+    counts = [c.count() for c in colls]
+    total = sum(counts)
+    if not total:
+        raise SystemExit("The live index is empty; nothing to export")
+
+    probe = next(c for c, n in zip(colls, counts) if n).get(limit=1, include=["embeddings"])
+    dim = len(probe["embeddings"][0])
+    embs = np.lib.format.open_memmap(out / "embeddings.npy", mode="w+", dtype=np.dtype(dtype), shape=(total, dim))
+    full_dim = None
+    if fullvecs is not None:
+        first = fullvecs.get(names, probe["ids"])
+        full_dim = len(first[probe["ids"][0]]) if first else None
+    full = np.lib.format.open_memmap(out / "fullvec.npy", mode="w+", dtype="<f2", shape=(total, full_dim)) if full_dim else None
+
+    shards, row = [], 0
+    with gzip.open(out / "records.jsonl.gz", "wb", compresslevel=1) as rec:
+        for name, coll, count in zip(names, colls, counts):
+            start = row
+            for offset in range(0, count, PAGE):
+                page = coll.get(limit=PAGE, offset=offset, include=["embeddings", "documents", "metadatas"])
+                n = len(page["ids"])
+                embs[row:row + n] = np.asarray(page["embeddings"], dtype=np.float32)
+                if full is not None:
+                    vecs = fullvecs.get([name], page["ids"])
+                    if len(vecs) < n:
+                        raise SystemExit(f"{name}: {n - len(vecs)} chunks have no full vector in {fullvecs.path}; re-ingest")
+                    full[row:row + n] = np.stack([vecs[i] for i in page["ids"]])
+                rec.write(b"".join(
+                    orjson.dumps({"id": i, "document": d, "metadata": m}) + b"\n"
+                    for i, d, m in zip(page["ids"], page["documents"], page["metadatas"])
+                ))
+                row += n
+            shards.append({"name": name, "start": start, "stop": row})
+    embs.flush()
+    del embs
+    if full is not None:
+        full.flush()
+        del full
+    t_write = time.perf_counter()
+
+    names_out = ("embeddings.npy", "records.jsonl.gz") + (("fullvec.npy",) if full_dim else ())
+    files = {f: {"sha256": _sha256(out / f), "bytes": (out / f).stat().st_size} for f in names_out}
+    manifest = {
+        "format": FORMAT,
+        "created_at": time.time(),
+        "embed_model": (colls[0].metadata or {}).get("embed_model"),
+        "dim": dim,
+        "full_dim": full_dim,
+        "dtype": dtype,
+        "rows": row,
+        "source_generation": generation,
+        "shards": shards,
+        "files": files,
+    }
+    (out / "manifest.json").write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    manifest["timings"] = {"write_s": round(t_write - t0, 2), "checksum_s": round(time.perf_counter() - t_write, 2)}
+    return manifest
+
+
+def read_manifest(snap_dir: str | Path, verify: bool = True) -> Dict:
+    snap = Path(snap_dir)
+    manifest = orjson.loads((snap / "manifest.json").read_bytes())
+    if manifest.get("format") != FORMAT:
+        raise SystemExit(f"Unsupported snapshot format {manifest.get('format')!r} (expected {FORMAT})")
+    for name, meta in manifest["files"].items():
+        path = snap / name
+        if not path.exists() or path.stat().st_size != meta["bytes"]:
+            raise SystemExit(f"{name}: missing or truncated")
+        if verify and _sha256(path) != meta["sha256"]:
+            raise SystemExit(f"{name}: checksum mismatch")
+    return manifest
+
+
+def load_embeddings(snap_dir: str | Path) -> np.ndarray:
+    """The snapshot's vectors, memory-mapped (nothing is read until rows are touched)."""
+    return np.load(Path(snap_dir) / "embeddings.npy", mmap_mode="r")
+
+
+def import_snapshot(client, snap_dir: str | Path, embed_model: str, verify: bool = True, flip: bool = True, fullvecs: FullVectorStore | None = None) -> Dict:
+    """Load a snapshot into a new index version; returns a report with timings. `fullvecs` receives the full vectors, if any."""
+    # imported here: ingest pulls in the PDF/embedding stack, which export does not need
+    from .docsum import add_summaries, summary_name
+    from .ingest import validate_build
+
+    t0 = time.perf_counter()
+    manifest = read_manifest(snap_dir, verify=verify)
+    t_verify = time.perf_counter()
+    if manifest["embed_model"] != embed_model:
+        raise SystemExit(
+            f"Snapshot was built with {manifest['embed_model']!r} but this node embeds queries "
+            f"with {embed_model!r}; set EMBED_PROVIDER/EMBED_MODEL/EMBED_INDEX_DIM to match"
+        )
+
+    embs = load_embeddings(snap_dir)
+    full = np.load(Path(snap_dir) / "fullvec.npy", mmap_mode="r") if manifest.get("full_dim") else None
+    if full is not None and fullvecs is None:
+        raise SystemExit("Snapshot holds full vectors for re-scoring; pass a FullVectorStore to import them")
+    names = shard_names(len(manifest["shards"]), version_base(next_version(client)))
+    colls = [open_collection(client, n, embed_model) for n in names]
+    summaries = [open_collection(client, summary_name(n), embed_model) for n in names]
+    batch = min(PAGE, client.get_max_batch_size())
+    with gzip.open(Path(snap_dir) / "records.jsonl.gz", "rb") as rec:
+        for coll, summary, shard in zip(colls, summaries, manifest["shards"]):
+            for start in range(shard["start"], shard["stop"], batch):
+                stop = min(start + batch, shard["stop"])
+                rows = [orjson.loads(rec.readline()) for _ in range(start, stop)]
+                vecs = np.asarray(embs[start:stop], dtype=np.float32)
+                if full is not None:
+                    fullvecs.put(coll.name, [r["id"] for r in rows], full[start:stop])
+                coll.add(
+                    ids=[r["id"] for r in rows],
+                    embeddings=vecs,
+                    documents=[r["document"] for r in rows],
+                    metadatas=[r["metadata"] for r in rows],
+                )
+                add_summaries(summary, rows, vecs, settings.DOCSUM_SECTION_CHUNKS)
+    t_load = time.perf_counter()
+
+    expected = [s["stop"] - s["start"] for s in manifest["shards"]]
+    problems = validate_build(colls, expected)
+    if problems:
+        for n in names:
+            client.delete_collection(n)
+            client.delete_collection(summary_name(n))
+        if full is not None:
+            fullvecs.drop(names)
+        raise SystemExit("Imported index failed validation, live index unchanged:\n  " + "\n  ".join(problems))
+    generation = flip_alias(client, names, len(names)) if flip else None
+    dropped = gc_versions(client) if flip else []
+    if fullvecs is not None:
+        fullvecs.drop(dropped)
+    return {
+        "rows": manifest["rows"],
+        "names": names,
+        "generation": generation,
+        "dropped": dropped,
+        "timings": {
+            "verify_s": round(t_verify - t0, 2),
+            "load_s": round(t_load - t_verify, 2),
+            "total_s": round(time.perf_counter() - t0, 2),
+        },
+    }
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Export / import portable snapshots of the vector index.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="write the live index to a snapshot directory")
+    ex.add_argument("out")
+    ex.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    ve = sub.add_parser("verify", help="check a snapshot's checksums")
+    ve.add_argument("snapshot")
+    im = sub.add_parser("import", help="load a snapshot as a new index version and make it live")
+    im.add_argument("snapshot")
+    im.add_argument("--no-verify", action="store_true", help="skip sha256 checks (sizes are still checked)")
+    im.add_argument("--no-flip", action="store_true", help="load and validate, but leave the alias unchanged")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "verify":
+        m = read_manifest(args.snapshot)
+        print(f"OK: {m['rows']} rows, dim {m['dim']} {m['dtype']}, {len(m['shards'])} shard(s), model {m['embed_model']}")
+        return
+
+    client = open_client()
+    # a reduced-dimension index keeps its full vectors outside Chroma
+    fullvecs = open_fullvecs() if settings.EMBED_INDEX_DIM else None
+    if args.cmd == "export":
+        m = export_snapshot(client, args.out, args.dtype, fullvecs=fullvecs)
+        size = sum(f["bytes"] for f in m["files"].values()) / 1e6
+        print(
+            f"Exported {m['rows']} rows (dim {m['dim']}, {m['dtype']}) to {args.out}: {size:.1f} MB, "
+            f"write {m['timings']['write_s']}s + checksums {m['timings']['checksum_s']}s"
+        )
+        return
+
+    from .embeddings import get_embedder
+
+    r = import_snapshot(client, args.snapshot, index_model_id(get_embedder().model_id), verify=not args.no_verify, flip=not args.no_flip, fullvecs=fullvecs)
+    t = r["timings"]
+    print(f"Imported {r['rows']} rows into {', '.join(r['names'])}: verify {t['verify_s']}s, load {t['load_s']}s, total {t['total_s']}s")
+    if r["generation"] is not None:
+        print(f"Live index generation {r['generation']}; removed old collections: {', '.join(r['dropped']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
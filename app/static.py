@@ -0,0 +1,51 @@
+# app/static.py
+"""
+Static pages served from memory with ETag revalidation.
+
+The file is read once and re-read only when its mtime or size changes, so an
+edited page is picked up without a restart at the cost of one stat() per
+request. Responses carry a content-hash ETag and `Cache-Control: no-cache`:
+browsers keep the page but revalidate it, and an unchanged page costs a
+bodiless 304.
+"""
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison (RFC 9110): compression may have turned our ETag into W/"..."."""
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == bare for t in if_none_match.split(","))
+
+
+class CachedPage:
+    def __init__(self, path: str | Path, media_type: str = "text/html; charset=utf-8"):
+        self.path = Path(path)
+        self.media_type = media_type
+        self._stamp: Tuple[int, int] | None = None
+        self.body = b""
+        self.etag = ""
+
+    def _load(self) -> None:
+        st = self.path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            self.body = self.path.read_bytes()
+            self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+            self._stamp = stamp
+
+    def response(self, request: Request) -> Response:
+        self._load()
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        inm = request.headers.get("if-none-match")
+        if inm and etag_matches(inm, self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
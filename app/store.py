@@ -0,0 +1,123 @@
+# app/store.py
+"""
+Opening the Chroma store and its collections, shared by the API and ingestion.
+
+Index versions (blue/green): each rebuild goes into fresh collections
+`docs-v{n}` (or `docs-v{n}-s{i}` when sharded). The small `docs-alias`
+collection's metadata names the live shard collections, and the previous set
+is kept for rollback. Flipping the alias is a single metadata write, which
+API workers pick up (see retriever.IndexWatcher). Stores built before
+versioning have no alias and use the legacy names from shard_names(). Each
+shard collection `X` has a companion `X-docsum` of document summary vectors
+(see docsum.py) that lives and dies with it.
+"""
+from __future__ import annotations
+
+import re, time
+from typing import Dict, List, Tuple
+
+from .docsum import DOCSUM_SUFFIX, summary_name
+from .settings import settings
+from .shards import shard_names
+
+
+def open_client(path: str | None = None):
+    # imported here so that importing the API does not pay for chromadb
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+
+    if settings.CHROMA_HOST and path is None:
+        # a server is shared by all API workers and the ingest queue, so uploads are
+        # visible everywhere; embedded PersistentClients only see their own writes
+        return chromadb.HttpClient(
+            host=settings.CHROMA_HOST,
+            port=settings.CHROMA_PORT,
+            settings=ChromaSettings(anonymized_telemetry=False),
+        )
+    return chromadb.PersistentClient(
+        path=path or settings.CHROMA_DIR,
+        settings=ChromaSettings(anonymized_telemetry=False),
+    )
+
+
+def open_collection(client, name: str, embed_model: str):
+    """
+    get_or_create a cosine collection tagged with the embedding model that fills it.
+
+    Vectors from different models (or dimensions) are not comparable, so opening a
+    collection built with another model is an error rather than silent garbage.
+    """
+    coll = client.get_or_create_collection(name, metadata={"hnsw:space": "cosine", "embed_model": embed_model})
+    # collections from before the tag existed could only have been built with the OpenAI model
+    built_with = (coll.metadata or {}).get("embed_model", f"openai:{settings.EMBED_MODEL}")
+    if built_with != embed_model:
+        raise RuntimeError(
+            f"Collection {name!r} was built with {built_with!r} but the configured embedding "
+            f"provider is {embed_model!r}. Re-ingest, or point CHROMA_DIR at a matching store."
+        )
+    return coll
+
+
+def alias_name(base: str = "docs") -> str:
+    return f"{base}-alias"
+
+
+def version_base(version: int, base: str = "docs") -> str:
+    """Base name for one version's collections; pass to shard_names()."""
+    return f"{base}-v{version}"
+
+
+def _collection_names(client) -> List[str]:
+    # list_collections returns names or Collection objects depending on the chromadb version
+    return [getattr(c, "name", c) for c in client.list_collections()]
+
+
+def read_alias(client, base: str = "docs") -> Dict | None:
+    try:
+        return dict(client.get_collection(alias_name(base)).metadata or {})
+    except Exception:  # no alias yet (the exception type differs across chromadb versions)
+        return None
+
+
+def resolve_index(client, n_shards: int, base: str = "docs") -> Tuple[List[str], int]:
+    """(live shard collection names, alias generation); generation 0 = legacy, unversioned store."""
+    alias = read_alias(client, base)
+    if not alias or not alias.get("shards"):
+        return shard_names(n_shards, base), 0
+    return alias["shards"].split(","), int(alias.get("generation", 0))
+
+
+def next_version(client, base: str = "docs") -> int:
+    pattern = re.compile(rf"^{re.escape(base)}-v(\d+)(-s\d+)?$")
+    versions = [int(m.group(1)) for n in _collection_names(client) if (m := pattern.match(n))]
+    return max(versions, default=0) + 1
+
+
+def flip_alias(client, names: List[str], n_shards: int, base: str = "docs") -> int:
+    """Point the alias at `names` (keeping the current set as `previous`); returns the new generation."""
+    current, generation = resolve_index(client, n_shards, base)
+    existing = set(_collection_names(client))
+    alias = client.get_or_create_collection(alias_name(base))
+    alias.modify(metadata={
+        "shards": ",".join(names),
+        "previous": ",".join(n for n in current if n in existing and n not in names),
+        "generation": generation + 1,
+        "updated_at": time.time(),
+    })
+    return generation + 1
+
+
+def gc_versions(client, base: str = "docs") -> List[str]:
+    """Drop index collections that are neither live nor the previous (rollback) set."""
+    alias = read_alias(client, base)
+    if not alias:
+        return []
+    keep = set(alias.get("shards", "").split(",")) | set(filter(None, alias.get("previous", "").split(",")))
+    keep |= {summary_name(n) for n in keep}
+    owned = re.compile(rf"^{re.escape(base)}(-v\d+)?(-s\d+)?({re.escape(DOCSUM_SUFFIX)})?$")
+    dropped = []
+    for name in _collection_names(client):
+        if owned.match(name) and name not in keep:
+            client.delete_collection(name)
+            dropped.append(name)
+    return dropped
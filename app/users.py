@@ -8,7 +8,7 @@ import hashlib
 
 from .auth import create_token
 
-from .memory import redis
+from .memory import get_redis
 
 
 
@@ -36,13 +36,13 @@ async def signup(user: User):
 
     key = f"user:{user.username}"
 
-    exists = await redis.exists(key)
+    exists = await get_redis().exists(key)
 
     if exists:
 
         raise HTTPException(status_code=400, detail="User already exists")
 
-    await redis.hset(key, mapping={"password": hash_password(user.password)})
+    await get_redis().hset(key, mapping={"password": hash_password(user.password)})
 
     # Automatically log in the user after signup
     token = create_token(user.username)
@@ -56,7 +56,7 @@ async def login(user: User):
 
     key = f"user:{user.username}"
 
-    data = await redis.hgetall(key)
+    data = await get_redis().hgetall(key)
 
     if not data or data.get("password") != hash_password(user.password):
 
@@ -0,0 +1,180 @@
+# bench/chat_path.py
+"""
+Critical-path comparison for /chat: the old fully sequential handler versus the
+overlapped one (history || retrieval, persistence off the response path).
+
+Both handlers run for real, one request at a time, against REDIS_URL (or, with
+--fake-redis, fakeredis with --redis-rtt-ms added to every round trip).
+Retrieval and the completion are stubbed with sleeps, and each request gives
+both handlers the same latencies. They are drawn from the API's own logs
+(chat.response "timings" in LOG_DIR) or, with --synthetic N, from log-normal
+distributions.
+
+  overlapped  app.main.chat itself; its background writes are drained between
+              requests, outside the timed section
+  sequential  the same stages awaited in the order the handler used before:
+              history, retrieval, completion, token accounting, then one
+              append per message
+
+The bench's own request logs go to a temporary LOG_DIR.
+
+Usage:
+    python -m bench.chat_path                                  # latencies from logs/chat-*.jsonl
+    python -m bench.chat_path --synthetic 300 --fake-redis --redis-rtt-ms 0.5
+"""
+from __future__ import annotations
+
+import argparse, asyncio, json, os, tempfile, time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from bench.retrieval_scale import percentiles
+
+SESSIONS = 20
+
+
+def load_logs(log_dir: Path) -> List[Dict[str, float]]:
+    turns = []
+    for fp in sorted(log_dir.glob("chat-*.jsonl")):
+        with fp.open(encoding="utf-8") as f:
+            for line in f:
+                ev = json.loads(line)
+                if ev.get("event") == "chat.response" and ev.get("timings"):
+                    turns.append(ev["timings"])
+    return turns
+
+
+def synthetic(n: int, seed: int) -> List[Dict[str, float]]:
+    rng = np.random.default_rng(seed)
+
+    def ln(median_ms: float, sigma: float) -> np.ndarray:
+        return rng.lognormal(np.log(median_ms), sigma, n)
+
+    return [{"retrieve_ms": float(r), "llm_ms": float(l)} for r, l in zip(ln(250, 0.5), ln(1400, 0.4))]
+
+
+class StubRAG:
+    """retrieve() sleeps for the current request's retrieval latency."""
+
+    def __init__(self):
+        self.delay_ms = 0.0
+        self.docs = [
+            {"id": f"d{i}", "text": f"passage {i} " + "lorem ipsum dolor sit amet " * 12, "metadata": {"source": f"data/doc{i}.pdf", "page": i + 1}, "score": 0.8 - i * 0.01, "length": 340}
+            for i in range(8)
+        ]
+
+    async def retrieve(self, query: str, k: int = 4) -> List[Dict]:
+        await asyncio.sleep(self.delay_ms / 1000)
+        return self.docs[:k]
+
+
+class StubLLM:
+    def __init__(self):
+        self.delay_ms = 0.0
+
+    async def __call__(self, messages):
+        await asyncio.sleep(self.delay_ms / 1000)
+        return "stub answer " * 40, 600, 120
+
+
+def use_fake_redis(rtt_ms: float) -> None:
+    import fakeredis
+
+    from app.memory import get_memory
+
+    class SlowConnection(fakeredis.FakeAsyncRedisConnection):
+        async def send_packed_command(self, command, check_health=True):
+            # one sleep per round trip: a pipeline is sent as one packed command
+            await asyncio.sleep(rtt_ms / 1000)
+            return await super().send_packed_command(command, check_health)
+
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    r.connection_pool.connection_class = SlowConnection
+    get_memory().r = r
+
+
+async def sequential_chat(req, user_id: str) -> str:
+    """The /chat schedule before overlap: every stage awaited in turn, persistence on the response path."""
+    from app import main
+    from app.memory import get_memory
+    from app.ratelimit import get_limiter
+
+    memory = get_memory()
+    history = await memory.get(req.session_id, user_id)
+    docs = await main.get_rag().retrieve(req.message, k=req.k) if req.use_rag else []
+    citations, system_prompt, context_block = main.ground(docs, req.k)
+    messages = [{"role": "system", "content": system_prompt + context_block}] + history + [{"role": "user", "content": req.message}]
+    answer, tokens_in, tokens_out = await main.chat_complete(messages)
+    await get_limiter().record_tokens(user_id, tokens_in + tokens_out)
+    await memory.append(req.session_id, "user", req.message, user_id)
+    await memory.append(req.session_id, "assistant", answer, user_id)
+    return answer
+
+
+async def run(turns: List[Dict[str, float]], args) -> Dict[str, List[float]]:
+    from app import main
+    from app.memory import close_memory, get_memory
+    from app.schemas import ChatRequest
+
+    rag, llm = StubRAG(), StubLLM()
+    main.get_rag = lambda: rag
+    main.chat_complete = llm
+    if args.fake_redis:
+        use_fake_redis(args.redis_rtt_ms)
+    memory = get_memory()
+
+    async def overlapped(req, user_id: str):
+        return await main.chat(req, user_id=user_id)
+
+    out: Dict[str, List[float]] = {"sequential": [], "overlapped": []}
+    rng = np.random.default_rng(args.seed)
+    try:
+        for i, t in enumerate(turns):
+            rag.delay_ms, llm.delay_ms = t.get("retrieve_ms", 0.0), t["llm_ms"]
+            use_rag = bool(t.get("retrieve_ms"))
+            # alternate which handler goes first, so neither always meets a warmer Redis
+            order = ["sequential", "overlapped"] if rng.random() < 0.5 else ["overlapped", "sequential"]
+            for name in order:
+                handler = sequential_chat if name == "sequential" else overlapped
+                req = ChatRequest(message=f"question {i}", session_id=f"bench-{name}-{i % SESSIONS}", use_rag=use_rag, k=4)
+                t0 = time.perf_counter()
+                await handler(req, "bench-user")
+                out[name].append((time.perf_counter() - t0) * 1000)
+                await memory.writer.drain()
+    finally:
+        await close_memory()
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--log-dir", default=os.getenv("LOG_DIR", "logs"))
+    ap.add_argument("--synthetic", type=int, default=0, help="simulate N requests instead of reading logs")
+    ap.add_argument("--limit", type=int, default=300, help="replay at most this many logged requests")
+    ap.add_argument("--fake-redis", action="store_true", help="use fakeredis (pip install fakeredis) instead of REDIS_URL")
+    ap.add_argument("--redis-rtt-ms", type=float, default=0.5, help="round-trip time added to each fakeredis call")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    turns = synthetic(args.synthetic, args.seed) if args.synthetic else load_logs(Path(args.log_dir))[-args.limit:]
+    if not turns:
+        raise SystemExit(f"No chat.response timings in {args.log_dir}; run some /chat traffic or use --synthetic N")
+    # set before app.logger is imported, so replayed requests do not land in the logs they came from
+    os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="bench-chat-logs-")
+
+    res = asyncio.run(run(turns, args))
+    s, p = percentiles(res["sequential"]), percentiles(res["overlapped"])
+    redis = f"fakeredis, {args.redis_rtt_ms} ms RTT" if args.fake_redis else "REDIS_URL"
+    print(f"requests: {len(turns)}  (rag: {sum(1 for t in turns if t.get('retrieve_ms'))}; redis: {redis})")
+    print(f"{'':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print(f"{'sequential':>12} {s['p50']:>9.1f} {s['p95']:>9.1f} {s['p99']:>9.1f}")
+    print(f"{'overlapped':>12} {p['p50']:>9.1f} {p['p95']:>9.1f} {p['p99']:>9.1f}")
+    # the two handlers saw the same stage latencies per request, so compare them request by request
+    d = percentiles([a - b for a, b in zip(res["sequential"], res["overlapped"])])
+    print(f"{'saved':>12} {d['p50']:>9.1f} {d['p95']:>9.1f} {d['p99']:>9.1f}  (per request)")
+
+
+if __name__ == "__main__":
+    main()
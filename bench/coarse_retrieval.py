@@ -0,0 +1,147 @@
+# bench/coarse_retrieval.py
+"""
+Coarse-to-fine retrieval (DOCSUM_TOP_M) against a full search, at scale.
+
+Builds a synthetic corpus of --docs documents with --chunks chunks each through
+`app.ingest.add_to_shards`, so the per-document summary vectors are produced as
+in a real build. Each document is a random point near one of --topics topics
+and its chunks scatter around it, so documents are distinguishable but related
+documents compete. Queries are perturbed copies of random chunks. Ground truth
+is the exact cosine top-k over all chunks.
+
+For each --top-m (0 = full search) it reports, over the same queries:
+
+  * query latency p50/p95 of RAG.search
+  * recall@k against the exact top-k
+  * documents and chunks searched per query, and the fallback rate to the full search
+
+Usage:
+    python -m bench.coarse_retrieval --docs 2000 --chunks 20 --dim 384
+    python -m bench.coarse_retrieval --docs 5000 --chunks 20 --top-m 0,10,20,50 --shards 2
+"""
+from __future__ import annotations
+
+import argparse, shutil, tempfile, time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from bench.retrieval_scale import dir_size, percentiles, synthetic_texts, topic_centroids
+
+
+def corpus(args) -> Tuple[List[Dict], np.ndarray, np.ndarray]:
+    """(chunks, chunk vectors, query vectors)"""
+    rng = np.random.default_rng(args.seed)
+    centroids = topic_centroids(args.dim, args.topics, args.seed)
+    scale = 1 / np.sqrt(args.dim)
+    doc_vecs = centroids[rng.integers(0, args.topics, size=args.docs)] + args.doc_spread * scale * rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    n = args.docs * args.chunks
+    x = np.repeat(doc_vecs, args.chunks, axis=0) + args.chunk_spread * scale * rng.standard_normal((n, args.dim)).astype(np.float32)
+    embs = (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+    texts = synthetic_texts(0, n, args.seed)
+    docs = [
+        {"id": f"syn:{i}", "key": f"syn:{i}", "text": t, "metadata": {"source": f"synthetic/doc-{i // args.chunks}.pdf", "page": i % args.chunks + 1}}
+        for i, t in enumerate(texts)
+    ]
+    rows = rng.choice(n, size=min(args.queries, n), replace=False)
+    q = embs[rows] + 0.3 * scale * rng.standard_normal((len(rows), args.dim)).astype(np.float32)
+    return docs, embs, (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_topk(docs: List[Dict], embs: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    from app.retriever import MIN_CHUNK_CHARS
+
+    usable = np.array([len(d["text"].strip()) >= MIN_CHUNK_CHARS for d in docs])
+    out = []
+    for i in range(0, len(queries), 64):
+        s = queries[i:i + 64] @ embs.T
+        s[:, ~usable] = -np.inf
+        out += [{docs[j]["id"] for j in row} for row in np.argsort(-s, axis=1)[:, :k]]
+    return out
+
+
+def build(docs: List[Dict], embs: np.ndarray, args, path: Path):
+    from app.ingest import add_to_shards
+    from app.retriever import RAG
+    from app.shards import shard_of, shard_key
+
+    rag = RAG(path=str(path), shards=args.shards, embed_model=f"bench@{args.dim}", index_dim=0)
+    for d in docs:
+        d["shard"] = shard_of(shard_key(d, "source"), args.shards)
+    batch = rag.client.get_max_batch_size()
+    t0 = time.perf_counter()
+    # whole documents per batch, so each gets the same sections as in a file-by-file build
+    step = max(1, batch // args.chunks) * args.chunks
+    for i in range(0, len(docs), step):
+        add_to_shards(rag.shards, docs[i:i + step], embs[i:i + step].tolist(), index_dim=0, summaries=rag.summaries)
+    return rag, time.perf_counter() - t0
+
+
+def measure(rag, queries: np.ndarray, truth: List[set], top_m: int, k: int) -> Dict:
+    rag.top_m = top_m
+    rag.coarse = {key: 0 for key in rag.coarse}
+    for q in queries[:50]:  # warm-up
+        rag.search(q.tolist(), k=k)
+    rag.coarse = {key: 0 for key in rag.coarse}
+    lat, hits = [], 0
+    for q, gt in zip(queries, truth):
+        t = time.perf_counter()
+        got = rag.search(q.tolist(), k=k)
+        lat.append((time.perf_counter() - t) * 1000)
+        hits += len({h["id"] for h in got} & gt)
+    stats = rag.coarse_stats()
+    return {
+        "top_m": top_m,
+        "latency_ms": percentiles(lat),
+        "recall": round(hits / (len(queries) * k), 4),
+        "docs_per_query": stats["docs_per_query"],
+        "chunks_per_query": stats["chunks_per_query"],
+        "narrowed_rate": stats["narrowed_rate"],
+        "fallback_rate": stats["fallback_rate"],
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=2000)
+    ap.add_argument("--chunks", type=int, default=20, help="chunks per document")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--topics", type=int, default=64)
+    ap.add_argument("--doc-spread", type=float, default=1.0, help="spread of documents around their topic")
+    ap.add_argument("--chunk-spread", type=float, default=0.7, help="spread of chunks around their document")
+    ap.add_argument("--shards", type=int, default=1)
+    ap.add_argument("--top-m", default="0,10,20,50", help="comma-separated DOCSUM_TOP_M values (0 = full search)")
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    docs, embs, queries = corpus(args)
+    truth = exact_topk(docs, embs, queries, args.k)
+    work = Path(tempfile.mkdtemp(prefix="bench-coarse-"))
+    try:
+        rag, build_s = build(docs, embs, args, work)
+        sections = sum(c.count() for c in rag.summaries)
+        print(
+            f"{args.docs} documents x {args.chunks} chunks = {len(docs)} chunks ({sections} summary sections), dim {args.dim}, "
+            f"{args.shards} shard(s), built in {build_s:.1f}s, {dir_size(work) / 1e6:.0f} MB on disk; {len(queries)} queries, k={args.k}"
+        )
+        print(f"{'top_m':>6} {'p50 ms':>7} {'p95 ms':>7} {'recall':>7} {'docs/query':>11} {'chunks/query':>13} {'narrowed':>9} {'fallback':>9}")
+        for m in [int(x) for x in args.top_m.split(",")]:
+            r = measure(rag, queries, truth, m, args.k)
+            lat = r["latency_ms"]
+            docs_q = f"{r['docs_per_query']:.1f}" if r["docs_per_query"] is not None else f"{args.docs} (all)"
+            chunks_q = f"{r['chunks_per_query']:.0f}" if r["chunks_per_query"] is not None else f"{len(docs)} (all)"
+            print(
+                f"{m or 'full':>6} {lat['p50']:>7.2f} {lat['p95']:>7.2f} {r['recall']:>7.3f} {docs_q:>11} {chunks_q:>13} "
+                f"{r['narrowed_rate']:>9.1%} {r['fallback_rate']:>9.1%}",
+                flush=True,
+            )
+        rag.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
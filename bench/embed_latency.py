@@ -0,0 +1,55 @@
+# bench/embed_latency.py
+"""
+Embedding latency of the configured provider (EMBED_PROVIDER) for single
+queries and for ingestion-sized batches.
+
+Usage:
+    EMBED_PROVIDER=local EMBED_LOCAL_PATH=models/all-MiniLM-L6-v2 python -m bench.embed_latency
+    python -m bench.embed_latency          # OpenAI (needs OPENAI_API_KEY + network)
+"""
+from __future__ import annotations
+
+import argparse, asyncio, time
+from typing import List
+
+from app.embeddings import get_embedder
+from bench.retrieval_scale import percentiles
+
+QUERIES = [
+    "What is the submission deadline for the coursework?",
+    "How many marks is the report worth?",
+    "Which dataset should be used for the dashboard?",
+    "What are the assessment criteria for the analysis section?",
+]
+
+
+async def run(n: int, batch: int) -> None:
+    emb = get_embedder()
+    await emb.embed(QUERIES[:1])  # warm-up: connection / model load
+
+    single: List[float] = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        await emb.embed([QUERIES[i % len(QUERIES)]])
+        single.append((time.perf_counter() - t0) * 1000)
+
+    texts = [" ".join(QUERIES) * 4] * batch  # ~1k-char chunks, like ingestion
+    t0 = time.perf_counter()
+    await emb.embed(texts)
+    batch_s = time.perf_counter() - t0
+
+    print(f"provider: {emb.model_id}")
+    print(f"single query ms: {percentiles(single)}")
+    print(f"batch of {batch}: {batch_s * 1000:.1f} ms ({batch / batch_s:.0f} chunks/s)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=100, help="single-query samples")
+    ap.add_argument("--batch", type=int, default=128)
+    args = ap.parse_args()
+    asyncio.run(run(args.n, args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# bench/payloads.py
+"""
+Wire size of API responses before and after compression (app.compression).
+
+Payloads are built with the API's own response models, shaped like real traffic:
+
+  index     web/index.html
+  chat      /chat: an ~800-char answer and six 300-char source snippets
+  session   /session/{id}: a full history (MAX_TURNS turns, ~700-char answers)
+  retrieve  /retrieve: 3 queries x 6 hits with full chunk text
+
+Text is cut from the DATA_DIR chunks, so it compresses like the documents being
+served; with --synthetic (or an empty DATA_DIR) random words stand in, which
+compress noticeably worse than prose and so understate the savings.
+
+For each payload and codec it reports the compressed size, the ratio, the
+compression time, and the transfer time at each --mbps link speed. `app`
+marks the codec and level the middleware actually uses (COMPRESS_* settings).
+
+Usage:
+    python -m bench.payloads
+    python -m bench.payloads --synthetic --mbps 1,10,100
+"""
+from __future__ import annotations
+
+import argparse, gzip, random
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from app.compression import brotli, compress
+from app.schemas import ChatResponse, RetrieveResponse, SessionResponse
+from app.settings import settings
+from bench.serialization import bench, text
+
+
+def snippets(synthetic: bool, seed: int) -> Callable[[int], str]:
+    """A function returning `n` characters of document text."""
+    rng = random.Random(seed)
+    texts: List[str] = []
+    if not synthetic:
+        from bench.reduced_dim import corpus_chunks
+
+        try:
+            texts = [d["text"] for d in corpus_chunks() if len(d["text"]) >= 300]
+        except Exception as e:
+            print(f"Could not load DATA_DIR chunks ({e}); using synthetic text")
+    if not texts:
+        return lambda n: text(rng, n)
+
+    def cut(n: int) -> str:
+        t = rng.choice(texts)
+        start = rng.randint(0, max(0, len(t) - n))
+        return " ".join(t[start:start + n].split())
+
+    return cut
+
+
+def payloads(cut: Callable[[int], str], seed: int) -> Dict[str, bytes]:
+    rng = random.Random(seed)
+    sources = [
+        {"source": f"data/report-{i}.pdf", "page": rng.randint(1, 40), "score": round(rng.random(), 4), "snippet": cut(300)}
+        for i in range(6)
+    ]
+    chat = ChatResponse(
+        answer=cut(800),
+        session_id="3f1c2a9e-8f5b-4c1d-9a7e-2b6d0c4e1f10",
+        tokens_in=1834,
+        tokens_out=212,
+        sources=sources,
+        timings={"history_ms": 1.4, "retrieve_ms": 231.9, "llm_ms": 1402.3, "total_ms": 1636.0},
+    )
+    session = SessionResponse(
+        username="alice",
+        session_id=chat.session_id,
+        history=[
+            {"role": "user" if i % 2 == 0 else "assistant", "content": cut(120 if i % 2 == 0 else 700)}
+            for i in range(settings.MAX_TURNS * 2)
+        ],
+    )
+    retrieve = RetrieveResponse(
+        results=[
+            {
+                "query": cut(60),
+                "hits": [
+                    {"id": f"c{q}-{j}", "text": cut(1000), "source": f"data/report-{j}.pdf", "page": j + 1, "score": round(rng.random(), 4)}
+                    for j in range(6)
+                ],
+            }
+            for q in range(3)
+        ],
+        latency_ms=41.7,
+    )
+    out = {
+        "chat": chat.model_dump_json().encode("utf-8"),
+        "session": session.model_dump_json().encode("utf-8"),
+        "retrieve": retrieve.model_dump_json(exclude_none=True).encode("utf-8"),
+    }
+    index = Path("web/index.html")
+    if index.exists():
+        out = {"index": index.read_bytes(), **out}
+    return out
+
+
+def codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    out: Dict[str, Callable[[bytes], bytes]] = {
+        f"gzip-{lvl}": (lambda b, lvl=lvl: gzip.compress(b, compresslevel=lvl, mtime=0)) for lvl in (1, 6, 9)
+    }
+    if brotli is not None:
+        out.update({f"br-{q}": (lambda b, q=q: brotli.compress(b, quality=q)) for q in (4, 6, 11)})
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=500)
+    ap.add_argument("--mbps", default="2,20", help="comma-separated link speeds for transfer times")
+    ap.add_argument("--synthetic", action="store_true", help="random words instead of DATA_DIR text")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    links = [float(m) for m in args.mbps.split(",")]
+    app_codec = f"br-{settings.COMPRESS_BROTLI_QUALITY}" if brotli is not None else f"gzip-{settings.COMPRESS_GZIP_LEVEL}"
+    fns = codecs()
+    fns.setdefault(app_codec, lambda b: compress(b, "br" if app_codec.startswith("br") else "gzip"))
+    if brotli is None:
+        print("Brotli is not installed: gzip only")
+
+    link_cols = " ".join(f"{f'ms@{m:g}Mbps':>12}" for m in links)
+    for name, body in payloads(snippets(args.synthetic, args.seed), args.seed).items():
+        print(f"\n{name}: {len(body)} bytes raw" + ("" if len(body) >= settings.COMPRESS_MIN_BYTES else f" (below COMPRESS_MIN_BYTES={settings.COMPRESS_MIN_BYTES}, sent raw)"))
+        print(f"{'codec':>10} {'bytes':>8} {'ratio':>6} {'us':>8} {link_cols}")
+        rows = [("raw", len(body), 0.0)] + [(c, len(fn(body)), bench(lambda fn=fn: fn(body), args.rounds)) for c, fn in fns.items()]
+        for codec, size, us in rows:
+            wire = " ".join(f"{size * 8 / (m * 1e6) * 1000:>12.2f}" for m in links)
+            mark = "  app" if codec == app_codec else ""
+            print(f"{codec:>10} {size:>8} {size / len(body):>6.2f} {us:>8.1f} {wire}{mark}")
+
+
+if __name__ == "__main__":
+    main()
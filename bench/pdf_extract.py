@@ -0,0 +1,94 @@
+# bench/pdf_extract.py
+"""
+PDF text-extraction throughput (pages/s) per worker count, plus the cached re-run.
+
+Uses the PDFs in --pdf-dir (default DATA_DIR), or with --synthetic N writes N
+text-heavy pages across a few generated PDFs. Every worker count is measured
+against an empty cache; the last row re-runs the first worker count against
+a warm cache.
+
+Usage:
+    python -m bench.pdf_extract --synthetic 400 --workers 1,2,4,8
+    python -m bench.pdf_extract --pdf-dir data --workers 1,4
+"""
+from __future__ import annotations
+
+import argparse, random, shutil, string, tempfile
+from pathlib import Path
+from typing import List
+
+from pypdf import PdfWriter
+from pypdf.generic import ContentStream, DecodedStreamObject, DictionaryObject, NameObject
+
+from app.extract import extract_pdfs, resolve_workers
+from app.settings import settings
+
+
+def write_pdf(path: Path, pages: int, rng: random.Random) -> None:
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for _ in range(pages):
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)}),
+        })
+        lines = []
+        for row in range(50):
+            words = " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(14))
+            lines.append(f"1 0 0 1 40 {760 - row * 14} Tm ({words}) Tj")
+        stream = DecodedStreamObject()
+        stream.set_data(("BT /F1 10 Tf " + " ".join(lines) + " ET").encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(ContentStream(stream, writer))
+    with path.open("wb") as f:
+        writer.write(f)
+
+
+def synthetic_corpus(root: Path, pages: int, seed: int) -> List[Path]:
+    rng = random.Random(seed)
+    files, per_file = [], 50
+    for i in range(0, pages, per_file):
+        path = root / f"synthetic-{i // per_file:03d}.pdf"
+        write_pdf(path, min(per_file, pages - i), rng)
+        files.append(path)
+    return files
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pdf-dir", default=settings.DATA_DIR)
+    ap.add_argument("--synthetic", type=int, default=0, help="generate N pages instead of reading --pdf-dir")
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated worker counts (0 = one per CPU)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="bench-pdf-"))
+    try:
+        if args.synthetic:
+            pdfs = synthetic_corpus(work, args.synthetic, args.seed)
+        else:
+            pdfs = sorted(Path(args.pdf_dir).rglob("*.pdf"))
+        if not pdfs:
+            raise SystemExit(f"No PDFs in {args.pdf_dir}; add some or use --synthetic N")
+
+        counts = [resolve_workers(int(w)) for w in args.workers.split(",")]
+        print(f"files: {len(pdfs)}")
+        print(f"{'workers':>8} {'pages':>7} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+        base = None
+        for w in counts:
+            cache = work / f"cache-{w}"
+            _, st = extract_pdfs(pdfs, w, cache)
+            base = base or st.pages_per_s
+            print(f"{w:>8} {st.pages:>7} {st.seconds:>9.2f} {st.pages_per_s:>9.1f} {st.pages_per_s / base:>7.1f}x")
+
+        _, st = extract_pdfs(pdfs, counts[0], work / f"cache-{counts[0]}")
+        print(f"{'cached':>8} {st.pages:>7} {st.seconds:>9.2f} {st.pages / st.seconds:>9.1f}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# bench/reduced_dim.py
+"""
+Memory / latency / recall trade-off of indexing reduced-dimension embeddings
+(EMBED_INDEX_DIM) with full-dimension re-scoring (EMBED_RESCORE_K).
+
+By default the corpus is DATA_DIR, chunked and deduplicated as `app.ingest` would,
+and embedded with the configured provider. Queries are random word windows cut
+from the chunks, embedded the same way. Ground truth is exact cosine top-k over
+the full vectors. Embeddings can be cached with --cache so reruns cost no API calls.
+
+For every dimension in --dims (0 = full vectors) a store is built in a temp dir
+and measured for:
+
+  * index vector payload (n x dim x 4 bytes, what HNSW keeps in memory)
+  * disk size, and the share of it taken by the full-vector side store (fullvec.sqlite3)
+  * query latency (p50/p95) of RAG.search with re-scoring
+  * recall@k ranking by the prefix alone, and after re-scoring
+
+A reduced dimension is meant to shrink the store as well as the index; one that
+takes more disk than the full-vector baseline is flagged as a regression.
+
+With --synthetic N, clustered random vectors stand in for the corpus. Their
+variance decays along the dimensions, which roughly mimics how text-embedding-3
+concentrates information in the leading components; real embeddings are the
+better guide.
+
+Usage:
+    python -m bench.reduced_dim --dims 0,256,512 --cache .cache/bench-embeddings.npz
+    python -m bench.reduced_dim --synthetic 20000 --dim 1536
+"""
+from __future__ import annotations
+
+import argparse, asyncio, shutil, tempfile, time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from bench.retrieval_scale import dir_size, percentiles, synthetic_texts, topic_centroids
+
+
+def corpus_chunks() -> List[Dict]:
+    from app.dedup import dedup_docs
+    from app.extract import extract_pdfs
+    from app.ingest import load_pdf, load_txt
+    from app.settings import settings
+
+    data_dir = Path(settings.DATA_DIR)
+    files = sorted(data_dir.rglob("*.pdf")) + sorted(data_dir.rglob("*.txt"))
+    pdfs = [fp for fp in files if fp.suffix.lower() == ".pdf"]
+    pages, _ = extract_pdfs(pdfs, settings.INGEST_WORKERS, settings.EXTRACT_CACHE_DIR)
+    docs = [d for fp in files for d in (load_pdf(fp, pages[fp]) if fp in pages else load_txt(fp))]
+    return dedup_docs(docs, settings.DEDUP_THRESHOLD, settings.DEDUP_NUM_PERM, settings.DEDUP_BANDS).kept
+
+
+def query_windows(texts: List[str], n: int, seed: int, words: int = 25) -> List[str]:
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in rng.choice(len(texts), size=min(n, len(texts)), replace=False):
+        w = texts[i].split()
+        start = int(rng.integers(0, max(1, len(w) - words)))
+        out.append(" ".join(w[start:start + words]))
+    return out
+
+
+def load_corpus(args) -> Tuple[List[Dict], np.ndarray, np.ndarray]:
+    """(chunks, full chunk vectors, full query vectors)"""
+    cache = Path(args.cache) if args.cache else None
+    docs = corpus_chunks()
+    if not docs:
+        raise SystemExit("No chunks in DATA_DIR; add documents or use --synthetic N")
+    texts = [d["text"] for d in docs]
+    if cache and cache.exists():
+        z = np.load(cache, allow_pickle=False)
+        if list(z["ids"]) == [d["key"] for d in docs]:
+            return docs, z["embs"], z["queries"]
+        print(f"{cache} was built from another corpus; re-embedding")
+
+    from app.ingest import embed_texts_batched
+
+    embs = np.asarray(asyncio.run(embed_texts_batched(texts)), dtype=np.float32)
+    queries = np.asarray(asyncio.run(embed_texts_batched(query_windows(texts, args.queries, args.seed))), dtype=np.float32)
+    if cache:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(cache, ids=np.array([d["key"] for d in docs]), embs=embs, queries=queries)
+    return docs, embs, queries
+
+
+def synthetic_corpus(args) -> Tuple[List[Dict], np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(args.seed)
+    decay = (1 + np.arange(args.dim) / 64.0) ** -1.0
+    centroids = topic_centroids(args.dim, args.topics, args.seed) * decay
+    topics = rng.integers(0, args.topics, size=args.synthetic)
+    x = centroids[topics] + rng.standard_normal((args.synthetic, args.dim)).astype(np.float32) * decay / np.sqrt(args.dim)
+    embs = (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+    rows = rng.choice(args.synthetic, size=min(args.queries, args.synthetic), replace=False)
+    q = embs[rows] + 0.5 * rng.standard_normal((len(rows), args.dim)).astype(np.float32) * decay / np.sqrt(args.dim)
+    texts = synthetic_texts(0, args.synthetic, args.seed)
+    docs = [{"id": f"syn:{i}", "text": t, "metadata": {"source": f"synthetic/doc-{i // 50}.pdf", "page": i % 50 + 1}} for i, t in enumerate(texts)]
+    return docs, embs, (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_topk(docs: List[Dict], embs: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    from app.retriever import MIN_CHUNK_CHARS
+
+    # RAG never returns fragments, so they cannot be expected hits either
+    usable = np.array([len(d["text"].strip()) >= MIN_CHUNK_CHARS for d in docs])
+    s = queries @ embs.T
+    s[:, ~usable] = -np.inf
+    top = np.argsort(-s, axis=1)[:, :k]
+    return [{docs[i]["id"] for i in row} for row in top]
+
+
+def run_dim(dim: int, docs: List[Dict], embs: np.ndarray, queries: np.ndarray, truth: List[set], args, work: Path) -> Dict:
+    from app.ingest import add_to_shards
+    from app.retriever import RAG
+
+    path = work / f"dim{dim}"
+    rag = RAG(path=str(path), shards=1, embed_model=f"bench@{dim}", index_dim=dim, rescore_k=args.rescore_k)
+    for d in docs:
+        d["shard"] = 0
+    batch = rag.client.get_max_batch_size()
+    t0 = time.perf_counter()
+    for i in range(0, len(docs), batch):
+        add_to_shards(rag.shards, docs[i:i + batch], embs[i:i + batch].tolist(), index_dim=dim, fullvecs=rag.fullvecs)
+    build_s = time.perf_counter() - t0
+
+    def measure() -> Tuple[List[float], float]:
+        lat, hits = [], 0
+        for q, gt in zip(queries, truth):
+            t = time.perf_counter()
+            got = rag.search(q.tolist(), k=args.k)
+            lat.append((time.perf_counter() - t) * 1000)
+            hits += len({h["id"] for h in got} & gt)
+        return lat, hits / (len(queries) * args.k)
+
+    lat, recall = measure()
+    prefix_recall = recall
+    if dim:
+        rag.rescore_k = 0
+        _, prefix_recall = measure()
+    if rag.fullvecs is not None:
+        rag.fullvecs.checkpoint()
+    row = {
+        "dim": dim or embs.shape[1],
+        "vectors_mb": round(len(docs) * (dim or embs.shape[1]) * 4 / 1e6, 1),
+        "disk_mb": round(dir_size(path) / 1e6, 1),
+        "fullvec_mb": round(sum(f.stat().st_size for f in path.glob("fullvec.sqlite3*")) / 1e6, 1),
+        "build_s": round(build_s, 2),
+        "latency_ms": percentiles(lat),
+        "recall_prefix": round(prefix_recall, 4),
+        "recall": round(recall, 4),
+    }
+    rag.close()
+    shutil.rmtree(path, ignore_errors=True)
+    return row
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dims", default="0,256,512", help="comma-separated index dimensions (0 = full vectors)")
+    ap.add_argument("--rescore-k", type=int, default=20, help="candidates re-scored with full vectors")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--cache", default=None, help="npz file to keep corpus and query embeddings in")
+    ap.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of DATA_DIR")
+    ap.add_argument("--dim", type=int, default=1536, help="synthetic vector dimension")
+    ap.add_argument("--topics", type=int, default=64)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    docs, embs, queries = synthetic_corpus(args) if args.synthetic else load_corpus(args)
+    truth = exact_topk(docs, embs, queries, args.k)
+    print(f"{len(docs)} chunks, {len(queries)} queries, full dimension {embs.shape[1]}, k={args.k}, rescore_k={args.rescore_k}")
+    print(f"{'dim':>6} {'vectors MB':>11} {'disk MB':>8} {'fullvec MB':>11} {'build s':>8} {'p50 ms':>7} {'p95 ms':>7} {'recall prefix':>14} {'recall':>7}")
+    work = Path(tempfile.mkdtemp(prefix="bench-dim-"))
+    rows = []
+    try:
+        for dim in [int(d) for d in args.dims.split(",")]:
+            r = run_dim(dim, docs, embs, queries, truth, args, work)
+            rows.append(r)
+            lat = r["latency_ms"]
+            print(
+                f"{r['dim']:>6} {r['vectors_mb']:>11.1f} {r['disk_mb']:>8.1f} {r['fullvec_mb']:>11.1f} {r['build_s']:>8.2f} {lat['p50']:>7.2f} {lat['p95']:>7.2f} "
+                f"{r['recall_prefix']:>14.3f} {r['recall']:>7.3f}",
+                flush=True,
+            )
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    base = next((r for r in rows if r["dim"] == embs.shape[1]), None)
+    if base is None:
+        return
+    for r in rows:
+        if r is not base and r["disk_mb"] >= base["disk_mb"]:
+            print(f"REGRESSION: dim {r['dim']} takes {r['disk_mb']:.1f} MB on disk, not less than {base['disk_mb']:.1f} MB with full vectors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# bench/retrieval_scale.py
+"""
+Synthetic-corpus scaling benchmark for RAG retrieval.
+
+Builds a Chroma collection of N synthetic chunks (clustered random unit vectors
+plus filler text) entirely offline, then measures for each size:
+
+  * ingest rate (chunks/s)
+  * index size on disk
+  * process RSS after ingest
+  * cold-open time of PersistentClient (fresh subprocess) + first query
+  * query latency (p50/p95/p99) and recall@k of RAG.search vs exact search
+
+With --shards 1,2,4,8 every size is built once per shard count (chunks routed
+by hash of id), showing how fan-out query latency scales with shard count.
+
+Usage:
+    python -m bench.retrieval_scale --sizes 10000,100000,1000000 --dim 1536
+    python -m bench.retrieval_scale --sizes 100000 --shards 1,2,4,8
+"""
+from __future__ import annotations
+
+import argparse, json, os, shutil, subprocess, sys, tempfile, time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+
+BATCH = 5000
+WORDS = (
+    "coursework report analysis data model business intelligence dashboard metric "
+    "deadline submission marks criteria dataset warehouse schema query insight "
+    "visualisation stakeholder assessment section module table figure result"
+).split()
+
+
+def _rng(seed: int, *stream: int) -> np.random.Generator:
+    return np.random.default_rng([seed, *stream])
+
+
+def topic_centroids(dim: int, n_topics: int, seed: int) -> np.ndarray:
+    c = _rng(seed, 0).standard_normal((n_topics, dim)).astype(np.float32)
+    return c / np.linalg.norm(c, axis=1, keepdims=True)
+
+
+def synthetic_batch(b: int, n: int, centroids: np.ndarray, seed: int, noise: float = 1.0) -> np.ndarray:
+    """Embeddings for rows [b*BATCH, b*BATCH+n). Deterministic per batch so they can be regenerated."""
+    rng = _rng(seed, 1, b)
+    topics = rng.integers(0, len(centroids), size=n)
+    x = centroids[topics] + noise * rng.standard_normal((n, centroids.shape[1])).astype(np.float32) / np.sqrt(centroids.shape[1])
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def synthetic_texts(b: int, n: int, seed: int) -> List[str]:
+    rng = _rng(seed, 2, b)
+    lengths = rng.integers(60, 300, size=n)  # words → roughly 400-2000 chars, above RAG's 200-char filter
+    vocab = np.array(WORDS)
+    return [" ".join(vocab[rng.integers(0, len(vocab), size=L)]) + "." for L in lengths]
+
+
+def iter_batches(size: int):
+    for b in range(0, (size + BATCH - 1) // BATCH):
+        yield b, min(BATCH, size - b * BATCH)
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentiles(xs: List[float]) -> Dict[str, float]:
+    a = np.asarray(xs)
+    return {f"p{p}": round(float(np.percentile(a, p)), 3) for p in (50, 95, 99)}
+
+
+def make_queries(size: int, n: int, centroids: np.ndarray, seed: int) -> np.ndarray:
+    """Perturbed copies of random corpus rows, so each query has a meaningful neighbourhood."""
+    rng = _rng(seed, 3)
+    rows = np.sort(rng.choice(size, size=n, replace=False))
+    out = []
+    for r in rows:
+        b, off = divmod(int(r), BATCH)
+        base = synthetic_batch(b, min(BATCH, size - b * BATCH), centroids, seed)[off]
+        q = base + 0.3 * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(len(base))
+        out.append(q / np.linalg.norm(q))
+    return np.stack(out)
+
+
+def exact_topk(size: int, queries: np.ndarray, centroids: np.ndarray, seed: int, k: int) -> List[List[str]]:
+    """Brute-force cosine top-k over the regenerated corpus, streamed batch by batch."""
+    best_s = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_i = np.zeros((len(queries), k), dtype=np.int64)
+    for b, n in iter_batches(size):
+        s = queries @ synthetic_batch(b, n, centroids, seed).T
+        idx = np.arange(b * BATCH, b * BATCH + n)
+        all_s = np.concatenate([best_s, s], axis=1)
+        all_i = np.concatenate([best_i, np.broadcast_to(idx, s.shape)], axis=1)
+        top = np.argpartition(-all_s, k - 1, axis=1)[:, :k]
+        best_s = np.take_along_axis(all_s, top, axis=1)
+        best_i = np.take_along_axis(all_i, top, axis=1)
+    return [[f"syn:{i}" for i in row] for row in best_i]
+
+
+def build(rag, size: int, centroids: np.ndarray, seed: int) -> float:
+    from app.shards import shard_of
+
+    n_shards = len(rag.shards)
+    t0 = time.perf_counter()
+    for b, n in iter_batches(size):
+        embs = synthetic_batch(b, n, centroids, seed).tolist()
+        texts = synthetic_texts(b, n, seed)
+        ids = [f"syn:{b * BATCH + i}" for i in range(n)]
+        metas = [{"source": f"synthetic/doc-{(b * BATCH + i) // 50}.pdf", "page": (i % 50) + 1} for i in range(n)]
+        route = [shard_of(i, n_shards) for i in ids]
+        for s, coll in enumerate(rag.shards):
+            idx = [i for i in range(n) if route[i] == s]
+            if idx:
+                coll.add(ids=[ids[i] for i in idx], embeddings=[embs[i] for i in idx],
+                         documents=[texts[i] for i in idx], metadatas=[metas[i] for i in idx])
+    return time.perf_counter() - t0
+
+
+def cold_open(path: Path, dim: int, shards: int) -> Dict[str, float]:
+    """Open the store in a fresh interpreter so no client/segment cache is shared."""
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.retrieval_scale", "--cold-open", str(path), "--dim", str(dim), "--shards", str(shards)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _cold_open_child(path: str, dim: int, shards: int) -> None:
+    t0 = time.perf_counter()
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    from app.shards import shard_names
+    t_import = time.perf_counter()
+    client = chromadb.PersistentClient(path=path, settings=ChromaSettings(anonymized_telemetry=False))
+    colls = [client.get_collection(n) for n in shard_names(shards)]
+    t_open = time.perf_counter()
+    q = np.random.default_rng(0).standard_normal(dim).astype(np.float32)
+    for coll in colls:
+        coll.query(query_embeddings=[(q / np.linalg.norm(q)).tolist()], n_results=10)
+    t_query = time.perf_counter()
+    print(json.dumps({
+        "import_ms": round((t_import - t0) * 1000, 1),
+        "open_ms": round((t_open - t_import) * 1000, 1),
+        "first_query_ms": round((t_query - t_open) * 1000, 1),
+    }))
+
+
+def run_size(size: int, shards: int, args, workdir: Path) -> Dict:
+    from app.retriever import RAG
+
+    path = workdir / f"n{size}-s{shards}"
+    shutil.rmtree(path, ignore_errors=True)
+    centroids = topic_centroids(args.dim, args.topics, args.seed)
+
+    rss0 = rss_bytes()
+    rag = RAG(path=str(path), shards=shards, embed_model="synthetic")
+    ingest_s = build(rag, size, centroids, args.seed)
+    rss1 = rss_bytes()
+
+    nq = min(args.queries, size)
+    queries = make_queries(size, nq, centroids, args.seed)
+    truth = exact_topk(size, queries, centroids, args.seed, args.k)
+
+    lat, hits = [], 0
+    for q, gt in zip(queries, truth):
+        t0 = time.perf_counter()
+        got = rag.search(q.tolist(), k=args.k)
+        lat.append((time.perf_counter() - t0) * 1000)
+        hits += len({d["id"] for d in got} & set(gt))
+
+    row = {
+        "size": size,
+        "shards": shards,
+        "dim": args.dim,
+        "ingest_s": round(ingest_s, 2),
+        "ingest_rate": round(size / ingest_s, 1),
+        "disk_mb": round(dir_size(path) / 1e6, 1),
+        "rss_mb": round(rss1 / 1e6, 1),
+        "rss_delta_mb": round((rss1 - rss0) / 1e6, 1),
+        "cold": cold_open(path, args.dim, shards),
+        "latency_ms": percentiles(lat),
+        f"recall@{args.k}": round(hits / (nq * args.k), 4),
+    }
+    rag.close()
+    del rag
+    if not args.keep:
+        shutil.rmtree(path, ignore_errors=True)
+    return row
+
+
+def print_table(rows: List[Dict], k: int) -> None:
+    print(f"\n{'size':>9} {'shards':>6} {'ingest/s':>9} {'disk MB':>8} {'RSS MB':>8} {'cold ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'recall':>7}")
+    for r in rows:
+        cold = r["cold"]["open_ms"] + r["cold"]["first_query_ms"]
+        lat = r["latency_ms"]
+        print(f"{r['size']:>9} {r['shards']:>6} {r['ingest_rate']:>9.0f} {r['disk_mb']:>8.1f} {r['rss_mb']:>8.1f} {cold:>8.1f} "
+              f"{lat['p50']:>7.2f} {lat['p95']:>7.2f} {lat['p99']:>7.2f} {r[f'recall@{k}']:>7.3f}")
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated corpus sizes")
+    ap.add_argument("--dim", type=int, default=1536, help="embedding dimension (text-embedding-3-small = 1536)")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--shards", default="1", help="comma-separated shard counts to compare")
+    ap.add_argument("--topics", type=int, default=256, help="number of synthetic topic clusters")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workdir", default=None, help="where to build stores (default: a temp dir)")
+    ap.add_argument("--keep", action="store_true", help="keep the built stores on disk")
+    ap.add_argument("--out", default=None, help="write results as JSON to this path")
+    ap.add_argument("--cold-open", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.cold_open:
+        _cold_open_child(args.cold_open, args.dim, int(args.shards))
+        return
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        for shards in [int(s) for s in args.shards.split(",") if s]:
+            print(f"Building {size} chunks (dim={args.dim}, shards={shards}) in {workdir} ...", flush=True)
+            rows.append(run_size(size, shards, args, workdir))
+            print(json.dumps(rows[-1]), flush=True)
+
+    print_table(rows, args.k)
+    if args.out:
+        Path(args.out).write_text(json.dumps(rows, indent=2))
+    if not args.workdir and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
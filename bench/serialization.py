@@ -0,0 +1,120 @@
+# bench/serialization.py
+"""
+Per-request JSON cost on the /chat path: the previous stdlib path versus the
+typed-model + orjson path now used by the API, Redis memory and the logger.
+
+  response  old: dict -> jsonable_encoder -> json.dumps   (FastAPI without a response_model)
+            new: ChatResponse -> model_dump_json           (FastAPI with response_model)
+  history   decoding a session's messages loaded from Redis
+  turn      encoding the two messages persisted per turn
+  log       encoding the chat.response log record
+
+Payloads are shaped like real traffic: an ~800-char answer with six 300-char
+source snippets, a 16-message history, and a log record with stage timings.
+
+Usage:
+    python -m bench.serialization
+    python -m bench.serialization --rounds 20000
+"""
+from __future__ import annotations
+
+import argparse, json, random, string, time
+from typing import Callable, Dict
+
+from fastapi.encoders import jsonable_encoder
+
+from app.jsonutil import dumpb, loads
+from app.schemas import ChatResponse
+
+
+def text(rng: random.Random, n: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < n:
+        words.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))))
+    return " ".join(words)[:n]
+
+
+def payloads(seed: int) -> Dict[str, object]:
+    rng = random.Random(seed)
+    response = {
+        "answer": text(rng, 800),
+        "session_id": "3f1c2a9e-8f5b-4c1d-9a7e-2b6d0c4e1f10",
+        "tokens_in": 1834,
+        "tokens_out": 212,
+        "sources": [
+            {"source": f"report-{i}.pdf", "page": rng.randint(1, 40), "score": rng.random(), "snippet": text(rng, 300)}
+            for i in range(6)
+        ],
+        "timings": {"history_ms": 1.4, "retrieve_ms": 231.9, "llm_ms": 1402.3, "total_ms": 1636.0},
+    }
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": text(rng, 120 if i % 2 == 0 else 700)}
+        for i in range(16)
+    ]
+    log = {
+        "ts": time.time(),
+        "event": "chat.response",
+        "session_id": response["session_id"],
+        "answer_preview": response["answer"][:200],
+        "tokens_in": 1834,
+        "tokens_out": 212,
+        "use_rag": True,
+        "rag_docs_used": 6,
+        "timings": response["timings"],
+    }
+    return {"response": response, "history": history, "log": log}
+
+
+def bench(fn: Callable[[], object], rounds: int) -> float:
+    for _ in range(min(rounds, 500)):
+        fn()
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    p = payloads(args.seed)
+    response, history, log = p["response"], p["history"], p["log"]
+    model = ChatResponse(**response)
+    stored_std = [json.dumps(m) for m in history]
+    stored_fast = [dumpb(m) for m in history]
+    turn = history[:2]
+
+    cases = {
+        "response": (
+            lambda: json.dumps(jsonable_encoder(response), ensure_ascii=False).encode("utf-8"),
+            lambda: model.model_dump_json().encode("utf-8"),
+        ),
+        "history": (
+            lambda: [json.loads(v) for v in stored_std],
+            lambda: [loads(v) for v in stored_fast],
+        ),
+        "turn": (
+            lambda: [json.dumps(m) for m in turn],
+            lambda: [dumpb(m) for m in turn],
+        ),
+        "log": (
+            lambda: (json.dumps(log, ensure_ascii=False) + "\n").encode("utf-8"),
+            lambda: dumpb(log) + b"\n",
+        ),
+    }
+
+    print(f"{'':>10} {'stdlib us':>10} {'fast us':>10} {'speedup':>8}")
+    total_old = total_new = 0.0
+    for name, (old, new) in cases.items():
+        t_old, t_new = bench(old, args.rounds), bench(new, args.rounds)
+        total_old += t_old
+        total_new += t_new
+        print(f"{name:>10} {t_old:>10.1f} {t_new:>10.1f} {t_old / t_new:>7.1f}x")
+    print(f"{'per req':>10} {total_old:>10.1f} {total_new:>10.1f} {total_old / total_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench/snapshot.py
+"""
+Snapshot export/import timings and sizes per corpus size, for float16 and float32.
+
+For each size a synthetic index is built (see retrieval_scale), exported, and
+imported into an empty store as a node would on cold start. Recall@k against
+exact search is measured on the imported index, to show what float16
+storage costs in retrieval quality.
+
+Usage:
+    python -m bench.snapshot --sizes 10000,100000 --dim 1536
+"""
+from __future__ import annotations
+
+import argparse, shutil, tempfile
+from pathlib import Path
+
+from bench.retrieval_scale import build, dir_size, exact_topk, make_queries, topic_centroids
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10000,50000")
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--dtypes", default="float16,float32")
+    ap.add_argument("--shards", type=int, default=1)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--topics", type=int, default=64)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workdir", default=None)
+    args = ap.parse_args()
+
+    from app.retriever import RAG
+    from app.snapshot import export_snapshot, import_snapshot
+    from app.store import open_client
+
+    work = Path(args.workdir or tempfile.mkdtemp(prefix="bench-snapshot-"))
+    centroids = topic_centroids(args.dim, args.topics, args.seed)
+    print(f"{'size':>8} {'dtype':>8} {'store MB':>9} {'snap MB':>8} {'export s':>9} {'verify s':>9} {'import s':>9} {'rows/s':>9} {'recall':>7}")
+    try:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            src = work / f"src-{size}"
+            rag = RAG(path=str(src), shards=args.shards, embed_model="synthetic")
+            build(rag, size, centroids, args.seed)
+            rag.close()
+            queries = make_queries(size, min(args.queries, size), centroids, args.seed)
+            truth = exact_topk(size, queries, centroids, args.seed, args.k)
+
+            for dtype in args.dtypes.split(","):
+                snap, dst = work / f"snap-{size}-{dtype}", work / f"dst-{size}-{dtype}"
+                m = export_snapshot(open_client(str(src)), snap, dtype, n_shards=args.shards)
+                r = import_snapshot(open_client(str(dst)), snap, "synthetic")
+
+                node = RAG(path=str(dst), shards=args.shards, embed_model="synthetic")
+                hits = sum(len({d["id"] for d in node.search(q.tolist(), k=args.k)} & set(gt)) for q, gt in zip(queries, truth))
+                node.close()
+
+                t = r["timings"]
+                export_s = m["timings"]["write_s"] + m["timings"]["checksum_s"]
+                print(
+                    f"{size:>8} {dtype:>8} {dir_size(src) / 1e6:>9.1f} {dir_size(snap) / 1e6:>8.1f} {export_s:>9.2f} "
+                    f"{t['verify_s']:>9.2f} {t['total_s']:>9.2f} {size / t['load_s']:>9.0f} {hits / (len(queries) * args.k):>7.3f}",
+                    flush=True,
+                )
+                shutil.rmtree(snap, ignore_errors=True)
+                shutil.rmtree(dst, ignore_errors=True)
+            shutil.rmtree(src, ignore_errors=True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
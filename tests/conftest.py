@@ -0,0 +1,5 @@
+# tests/conftest.py
+import os, tempfile
+
+# before any app module is imported: event logs go to a scratch directory, not ./logs
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="test-logs-"))
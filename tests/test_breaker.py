@@ -0,0 +1,143 @@
+# tests/test_breaker.py
+"""Circuit breaker state transitions: closed -> open -> half-open -> closed/open."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.breaker import CircuitBreaker, CircuitOpen, redis_failure, upstream_failure
+
+
+def status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://api.example/v1/chat/completions")
+    return httpx.HTTPStatusError(str(code), request=request, response=httpx.Response(code, request=request))
+
+
+def make(threshold=3, reset_s=30.0) -> CircuitBreaker:
+    return CircuitBreaker("test", threshold, reset_s, upstream_failure)
+
+
+async def call(b: CircuitBreaker, error: BaseException | None = None):
+    async with b.guard():
+        if error is not None:
+            raise error
+        return "ok"
+
+
+def fail(b: CircuitBreaker, error: BaseException | None = None) -> None:
+    with pytest.raises(type(error or httpx.ConnectError("down"))):
+        asyncio.run(call(b, error or httpx.ConnectError("down")))
+
+
+def expire(b: CircuitBreaker) -> None:
+    b.opened_at -= b.reset_timeout_s + 1
+
+
+def test_failure_classification():
+    assert upstream_failure(status_error(500)) and upstream_failure(status_error(429))
+    assert not upstream_failure(status_error(400)) and not upstream_failure(status_error(404))
+    assert upstream_failure(httpx.ReadTimeout("slow")) and upstream_failure(asyncio.TimeoutError())
+    assert not upstream_failure(ValueError("bad json"))
+    assert redis_failure(ConnectionRefusedError()) and not redis_failure(ValueError())
+
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    b = make(threshold=3)
+    fail(b)
+    fail(b)
+    assert b.state == "closed"
+    fail(b)
+    assert b.state == "open" and b.trips == 1
+
+    with pytest.raises(CircuitOpen) as exc:
+        asyncio.run(call(b))
+    assert exc.value.name == "test" and 1 <= exc.value.retry_after <= 30
+    assert b.rejected == 1
+    assert b.stats()["retry_after_s"] == exc.value.retry_after
+
+
+def test_success_resets_the_failure_count():
+    b = make(threshold=2)
+    fail(b)
+    assert asyncio.run(call(b)) == "ok"
+    fail(b)
+    assert b.state == "closed" and b.failures == 1
+
+
+def test_client_errors_count_as_success_and_other_errors_are_neutral():
+    b = make(threshold=2)
+    fail(b)
+    fail(b, status_error(400))
+    assert b.failures == 0
+    fail(b)
+    fail(b, ValueError("bad json"))
+    assert (b.state, b.failures) == ("closed", 1)
+
+
+def test_half_open_lets_one_probe_through():
+    b = make(threshold=1)
+    fail(b)
+    expire(b)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def probe():
+            async with b.guard():
+                await release.wait()
+                return "probe"
+
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        assert b.state == "half_open"
+        with pytest.raises(CircuitOpen) as exc:
+            await call(b)
+        assert exc.value.retry_after == 1
+        release.set()
+        return await task
+
+    assert asyncio.run(run()) == "probe"
+    assert b.state == "closed" and b.stats()["retry_after_s"] is None
+    assert asyncio.run(call(b)) == "ok"
+
+
+def test_failed_probe_reopens_for_a_full_period():
+    b = make(threshold=2)
+    fail(b)
+    fail(b)
+    expire(b)
+    fail(b)  # the probe: a single failure is enough in half-open
+    assert b.state == "open" and b.trips == 2
+    assert b.stats()["retry_after_s"] >= 29
+    with pytest.raises(CircuitOpen):
+        asyncio.run(call(b))
+
+
+def test_cancelled_probe_does_not_leave_the_breaker_stuck():
+    b = make(threshold=1)
+    fail(b)
+    expire(b)
+
+    async def run():
+        async def probe():
+            async with b.guard():
+                await asyncio.sleep(5)
+
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert b.state == "half_open" and not b._probing
+    assert asyncio.run(call(b)) == "ok"
+    assert b.state == "closed"
+
+
+def test_threshold_zero_disables_the_breaker():
+    b = make(threshold=0)
+    for _ in range(5):
+        fail(b)
+    assert b.state == "closed" and b.trips == 0
+    assert asyncio.run(call(b)) == "ok"
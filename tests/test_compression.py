@@ -0,0 +1,169 @@
+# tests/test_compression.py
+"""Accept-Encoding negotiation, the compression middleware and ETag revalidation of static pages."""
+import gzip, os, zlib
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import compression
+from app.compression import CompressionMiddleware, accepted_encoding
+from app.static import CachedPage, etag_matches
+
+BIG = {"items": [{"id": i, "text": "retrieval augmented generation " * 3} for i in range(100)]}
+
+
+def test_negotiation(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", object())  # availability is all negotiation looks at
+    assert accepted_encoding("gzip, deflate, br") == "br"
+    assert accepted_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert accepted_encoding("br;q=0, gzip") == "gzip"
+    assert accepted_encoding("*") == "br"
+    assert accepted_encoding("*;q=0.2, gzip;q=0.5") == "gzip"
+    assert accepted_encoding("identity") is None
+    assert accepted_encoding("gzip;q=0, br;q=0") is None
+    assert accepted_encoding("gzip;q=bogus") is None
+    assert accepted_encoding("GZIP") == "gzip"
+
+
+def test_negotiation_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert accepted_encoding("br, gzip;q=0.1") == "gzip"
+    assert accepted_encoding("br") is None
+
+
+def make_app(tmp_path=None) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/big")
+    async def big():
+        return JSONResponse(BIG, headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/png")
+    async def png():
+        return Response(b"\x89PNG" + b"\0" * 4096, media_type="image/png")
+
+    @app.get("/encoded")
+    async def encoded():
+        return Response(gzip.compress(b"x" * 4096), media_type="text/plain", headers={"Content-Encoding": "gzip"})
+
+    @app.get("/stream")
+    async def stream():
+        async def gen():
+            for i in range(50):
+                yield f"data: event {i} {'x' * 40}\n\n".encode()
+
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    @app.get("/not-modified")
+    async def not_modified():
+        return PlainTextResponse("", status_code=304)
+
+    if tmp_path is not None:
+        page = CachedPage(tmp_path / "index.html")
+
+        @app.get("/")
+        async def index(request: Request):
+            return page.response(request)
+
+    return TestClient(app)
+
+
+def raw(client: TestClient, path: str, **headers):
+    """Status, headers and the body bytes as sent (TestClient would otherwise decode them)."""
+    with client.stream("GET", path, headers=headers) as r:
+        return r.status_code, r.headers, b"".join(r.iter_raw())
+
+
+def test_large_json_is_gzipped_with_correct_headers():
+    status, headers, body = raw(make_app(), "/big", **{"Accept-Encoding": "gzip"})
+    assert status == 200 and headers["content-encoding"] == "gzip"
+    assert int(headers["content-length"]) == len(body)
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["etag"] == 'W/"abc"'
+    assert gzip.decompress(body) == JSONResponse(BIG).body
+
+
+def test_brotli_when_preferred():
+    brotli = pytest.importorskip("brotli")
+    status, headers, body = raw(make_app(), "/big", **{"Accept-Encoding": "gzip, br"})
+    assert headers["content-encoding"] == "br"
+    assert int(headers["content-length"]) == len(body)
+    assert brotli.decompress(body) == JSONResponse(BIG).body
+
+
+def test_no_accept_encoding_means_no_compression():
+    status, headers, body = raw(make_app(), "/big", **{"Accept-Encoding": "identity"})
+    assert "content-encoding" not in headers and "vary" not in headers
+    assert body == JSONResponse(BIG).body and headers["etag"] == '"abc"'
+
+
+def test_small_body_passes_through_but_varies():
+    status, headers, body = raw(make_app(), "/small", **{"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Accept-Encoding"
+    assert body == b'{"ok":true}' and int(headers["content-length"]) == len(body)
+
+
+@pytest.mark.parametrize("path", ["/png", "/encoded"])
+def test_binary_and_already_encoded_bodies_are_left_alone(path):
+    client = make_app()
+    plain = raw(client, path)
+    status, headers, body = raw(client, path, **{"Accept-Encoding": "gzip"})
+    assert body == plain[2]
+    assert headers.get("content-encoding") == plain[1].get("content-encoding")
+
+
+def test_bodiless_statuses_pass_through():
+    status, headers, body = raw(make_app(), "/not-modified", **{"Accept-Encoding": "gzip"})
+    assert status == 304 and "content-encoding" not in headers and body == b""
+
+
+def test_stream_is_compressed_chunk_by_chunk():
+    client = make_app()
+    expected = b"".join(f"data: event {i} {'x' * 40}\n\n".encode() for i in range(50))
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["content-encoding"] == "gzip" and "content-length" not in r.headers
+        chunks = list(r.iter_raw())
+    assert gzip.decompress(b"".join(chunks)) == expected
+    # every chunk is flushed: each prefix of the stream decodes to whole events
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert d.decompress(chunks[0]).endswith(b"\n\n")
+
+
+def test_etag_matching_is_weak():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+
+
+def test_cached_page_revalidates_and_reloads(tmp_path):
+    page = tmp_path / "index.html"
+    page.write_text("<h1>v1</h1>" * 200)
+    client = make_app(tmp_path)
+
+    r = client.get("/", headers={"Accept-Encoding": "gzip"})
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and r.headers["cache-control"] == "no-cache"
+    assert r.headers["content-encoding"] == "gzip" and etag.startswith('W/"')
+    assert r.text == "<h1>v1</h1>" * 200
+
+    # the weak tag the browser got back from the compressed response still matches
+    r = client.get("/", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert r.status_code == 304 and r.content == b""
+    assert client.get("/", headers={"If-None-Match": etag.removeprefix("W/")}).status_code == 304
+
+    page.write_text("<h1>v2</h1>" * 200)
+    st = page.stat()
+    os.utime(page, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    r = client.get("/", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.text == "<h1>v2</h1>" * 200
+    assert r.headers["etag"].removeprefix("W/") != etag.removeprefix("W/")
@@ -0,0 +1,228 @@
+# tests/test_deadline.py
+"""Request deadlines, deadline-bounded retries and hedged calls."""
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from tenacity import RetryError
+
+from app.deadline import DeadlineExceeded, Hedger, attempt_timeout, remaining, request_deadline, retry_within_deadline, set_deadline, within_deadline
+
+
+def in_context(coro_fn):
+    """Run coro_fn() in a fresh event loop, so a deadline set inside it stays there."""
+    return asyncio.run(coro_fn())
+
+
+def test_no_deadline_changes_nothing():
+    async def run():
+        set_deadline(None)
+        assert remaining() is None
+        assert attempt_timeout(30, "x") == 30
+        return await within_deadline(asyncio.sleep(0, "ok"), "x")
+
+    assert in_context(run) == "ok"
+
+
+def test_attempt_timeout_is_capped_by_the_time_left():
+    async def run():
+        set_deadline(1.0)
+        assert attempt_timeout(30, "x") <= 1.0
+        assert attempt_timeout(0.2, "x") == 0.2
+        set_deadline(0.01)
+        attempt_timeout(30, "embed")
+
+    with pytest.raises(DeadlineExceeded, match="embed"):
+        in_context(run)
+
+
+def test_within_deadline_cancels_slow_work():
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def run():
+        set_deadline(0.05)
+        try:
+            await within_deadline(slow(), "completion")
+        finally:
+            assert cancelled.is_set()
+
+    with pytest.raises(DeadlineExceeded) as exc:
+        in_context(run)
+    assert exc.value.stage == "completion"
+
+
+def test_retries_stop_at_the_deadline():
+    calls = []
+
+    @retry_within_deadline("llm", attempts=10, initial=0.2, max_wait=0.2)
+    async def flaky():
+        calls.append(1)
+        raise ConnectionError("down")
+
+    async def run():
+        set_deadline(0.3)
+        await flaky()
+
+    with pytest.raises(DeadlineExceeded, match="llm"):
+        in_context(run)
+    assert 1 <= len(calls) < 10
+
+
+def test_retries_without_a_deadline_end_in_retry_error():
+    calls = []
+
+    @retry_within_deadline("llm", attempts=3, initial=0.001, max_wait=0.001)
+    async def flaky():
+        calls.append(1)
+        raise ConnectionError("down")
+
+    with pytest.raises(RetryError):
+        asyncio.run(flaky())
+    assert len(calls) == 3
+
+
+def test_fatal_errors_are_not_retried():
+    calls = []
+
+    @retry_within_deadline("llm", attempts=3, initial=0.001, max_wait=0.001, fatal=(KeyError,))
+    async def broken():
+        calls.append(1)
+        raise KeyError("bad")
+
+    with pytest.raises(KeyError):
+        asyncio.run(broken())
+    assert len(calls) == 1
+
+
+def test_success_after_a_retry():
+    calls = []
+
+    @retry_within_deadline("llm", attempts=3, initial=0.001, max_wait=0.001)
+    async def once_flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("blip")
+        return "ok"
+
+    assert asyncio.run(once_flaky()) == "ok" and len(calls) == 2
+
+
+def tracked(delay, result=None, error=None, log=None):
+    """A call that sleeps `delay` and records whether it finished or was cancelled."""
+
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(("cancelled", result))
+            raise
+        log.append(("done", result))
+        if error:
+            raise error
+        return result
+
+    return call
+
+
+def test_fast_call_is_not_hedged():
+    log = []
+    h = Hedger(0.1)
+    assert asyncio.run(h.run(tracked(0.01, "first", log=log), tracked(0, "hedge", log=log))) == "first"
+    assert log == [("done", "first")]
+    assert (h.calls, h.hedged, h.hedge_wins) == (1, 0, 0)
+
+
+def test_hedge_wins_and_the_slow_call_is_cancelled():
+    log = []
+    h = Hedger(0.02)
+
+    async def run():
+        out = await h.run(tracked(1.0, "first", log=log), tracked(0.01, "hedge", log=log))
+        await asyncio.sleep(0)  # let the cancellation land
+        return out
+
+    assert asyncio.run(run()) == "hedge"
+    assert log == [("done", "hedge"), ("cancelled", "first")]
+    assert (h.hedged, h.hedge_wins) == (1, 1)
+
+
+def test_first_call_can_still_win_after_hedging():
+    log = []
+    h = Hedger(0.02)
+
+    async def run():
+        out = await h.run(tracked(0.05, "first", log=log), tracked(1.0, "hedge", log=log))
+        await asyncio.sleep(0)
+        return out
+
+    assert asyncio.run(run()) == "first"
+    assert log == [("done", "first"), ("cancelled", "hedge")]
+    assert (h.hedged, h.hedge_wins) == (1, 0)
+
+
+def test_failed_first_call_falls_back_to_the_hedge():
+    log = []
+    h = Hedger(0.02)
+    out = asyncio.run(h.run(tracked(0.05, "first", error=ConnectionError("reset"), log=log), tracked(0.1, "hedge", log=log)))
+    assert out == "hedge" and h.hedge_wins == 1
+
+
+def test_both_failing_raises_the_first_error():
+    log = []
+    h = Hedger(0.01)
+    with pytest.raises(ConnectionError, match="a"):
+        asyncio.run(h.run(tracked(0.03, error=ConnectionError("a"), log=log), tracked(0.05, error=ConnectionError("b"), log=log)))
+
+
+def test_no_hedge_when_not_allowed_or_out_of_time():
+    log = []
+    h = Hedger(0.01)
+    assert asyncio.run(h.run(tracked(0.05, "first", log=log), tracked(0, "hedge", log=log), can_hedge=lambda: False)) == "first"
+
+    async def run():
+        set_deadline(0.005)  # less than the hedge delay: the hedge could never fire in time
+        return await h.run(tracked(0.03, "first", log=log), tracked(0, "hedge", log=log))
+
+    assert in_context(run) == "first"
+    assert h.hedged == 0 and ("done", "hedge") not in log
+
+
+def test_hedge_delay_follows_recent_latency():
+    h = Hedger(1.0, min_samples=5)
+    h._latencies.extend([0.01] * 4)
+    assert h.delay() == 1.0
+    h._latencies.extend([0.01] * 18 + [0.5, 0.5])
+    assert h.delay() == pytest.approx(0.01)
+    h._latencies.extend([0.5] * 10)
+    assert h.delay() == pytest.approx(0.5)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/budget", dependencies=[Depends(request_deadline(10))])
+    async def budget():
+        return {"left": remaining()}
+
+    @app.get("/open", dependencies=[Depends(request_deadline(0))])
+    async def unbounded():
+        return {"left": remaining()}
+
+    return TestClient(app)
+
+
+def test_request_deadline_header_can_only_shorten_the_budget(client):
+    assert 9 < client.get("/budget").json()["left"] <= 10
+    assert client.get("/budget", headers={"X-Request-Timeout": "2"}).json()["left"] <= 2
+    assert client.get("/budget", headers={"X-Request-Timeout": "60"}).json()["left"] <= 10
+    assert client.get("/open").json()["left"] is None
+    assert 2 < client.get("/open", headers={"X-Request-Timeout": "3"}).json()["left"] <= 3
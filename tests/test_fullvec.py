@@ -0,0 +1,99 @@
+# tests/test_fullvec.py
+"""Reduced-dimension index: the full-vector side store, re-scoring, and snapshots that carry it."""
+import numpy as np
+import pytest
+
+from app.fullvec import FullVectorStore, rescore
+from app.ingest import add_to_shards
+from app.retriever import RAG
+from app.snapshot import export_snapshot, import_snapshot
+from app.store import flip_alias, open_client, resolve_index
+
+FULL, DIM = 64, 16
+
+
+def corpus(n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, FULL)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    docs = [
+        {"id": f"c{i}", "text": f"chunk {i} " + "lorem ipsum dolor sit amet " * 10, "metadata": {"source": f"doc{i // 10}.txt", "page": None}, "shard": i % 2}
+        for i in range(n)
+    ]
+    return docs, x
+
+
+@pytest.fixture
+def rag(tmp_path):
+    rag = RAG(path=str(tmp_path), shards=2, embed_model="test@16", index_dim=DIM, rescore_k=5, top_m=0)
+    docs, x = corpus()
+    add_to_shards(rag.shards, docs, x.tolist(), index_dim=DIM, fullvecs=rag.fullvecs)
+    rag.x = x
+    yield rag
+    rag.close()
+
+
+def test_full_vectors_live_outside_chroma(rag):
+    assert rag.fullvecs.path.name == "fullvec.sqlite3" and rag.fullvecs.path.exists()
+    got = rag.shards[0].get(ids=["c0"], include=["embeddings", "metadatas"])
+    assert len(got["embeddings"][0]) == DIM
+    assert got["metadatas"][0] == {"source": "doc0.txt"}
+    assert [rag.fullvecs.count(n) for n in rag.names] == [30, 30]
+    vec = rag.fullvecs.get(rag.names, ["c0", "c1", "missing"])
+    assert sorted(vec) == ["c0", "c1"]
+    np.testing.assert_allclose(vec["c1"], rag.x[1], atol=1e-3)
+
+
+def test_search_ranks_by_full_vectors(rag):
+    q = rag.x[7]
+    hits = rag.search(q.tolist(), k=3)
+    assert hits[0]["id"] == "c7" and hits[0]["score"] == pytest.approx(1.0, abs=1e-3)
+    exact = rag.x @ q
+    for h in hits:
+        assert h["score"] == pytest.approx(float(exact[int(h["id"][1:])]), abs=2e-3)
+
+
+@pytest.mark.parametrize("k", [3, 5, 12, 40])
+def test_k_above_rescore_k_still_returns_k_hits(rag, k):
+    hits = rag.search(rag.x[0].tolist(), k=k)
+    assert len(hits) == k and len({h["id"] for h in hits}) == k
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+
+def test_rescore_keeps_the_prefix_distance_without_a_full_vector():
+    hits = [("a", "t", {}, 0.3), ("b", "t", {}, 0.4)]
+    full = {"b": np.array([1.0, 0.0], dtype=np.float32)}
+    out = rescore(hits, [1.0, 0.0], full)
+    assert [(h[0], round(h[3], 6)) for h in out] == [("a", 0.3), ("b", 0.0)]
+    assert rescore(hits, None, full) == hits
+
+
+def test_store_overwrites_and_drops_by_collection(tmp_path):
+    store = FullVectorStore(tmp_path / "fv.sqlite3")
+    store.put("docs-v1", ["a", "b"], np.eye(2))
+    store.put("docs-v1", ["a"], [[0.0, 1.0]])
+    store.put("docs-v2", ["a"], [[1.0, 1.0]])
+    assert store.count("docs-v1") == 2
+    np.testing.assert_array_equal(store.get(["docs-v1"], ["a"])["a"], [0.0, 1.0])
+    store.drop(["docs-v1"])
+    assert store.count("docs-v1") == 0 and store.get(["docs-v1"], ["a", "b"]) == {}
+    assert list(store.get(["docs-v2"], ["a"])) == ["a"]
+    # more ids than SQLite binds at once
+    ids = [f"x{i}" for i in range(2000)]
+    store.put("docs-v3", ids, np.ones((2000, 2)))
+    assert len(store.get(["docs-v3", "docs-v2"], ids + ["a"])) == 2001
+
+
+def test_snapshot_carries_full_vectors(rag, tmp_path):
+    flip_alias(rag.client, rag.names, 2)
+    manifest = export_snapshot(rag.client, tmp_path / "snap", n_shards=2, fullvecs=rag.fullvecs)
+    assert manifest["dim"] == DIM and manifest["full_dim"] == FULL and "fullvec.npy" in manifest["files"]
+
+    dst_path = tmp_path / "dst"
+    dst = FullVectorStore(dst_path / "fullvec.sqlite3")
+    report = import_snapshot(open_client(str(dst_path)), tmp_path / "snap", "test@16", fullvecs=dst)
+    assert [dst.count(n) for n in report["names"]] == [30, 30]
+    np.testing.assert_allclose(dst.get(report["names"], ["c5"])["c5"], rag.x[5], atol=1e-3)
+    with pytest.raises(SystemExit, match="full vectors"):
+        import_snapshot(open_client(str(tmp_path / "other")), tmp_path / "snap", "test@16")
+    assert resolve_index(open_client(str(tmp_path / "other")), 2)[1] == 0
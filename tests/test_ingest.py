@@ -0,0 +1,21 @@
+# tests/test_ingest.py
+"""Chunking at the end of a text: no chunk made only of the previous chunk's overlap."""
+from app.ingest import chunk_text
+
+
+def test_one_char_past_a_chunk_gives_two_chunks():
+    text = "x" * 2001
+    chunks = chunk_text(text, chunk_chars=2000, overlap=300)
+    assert len(chunks) == 2
+    assert chunks[0] == "x" * 2000 and chunks[1] == "x" * 301  # the overlap, plus the one new character
+
+
+def test_exactly_one_chunk_does_not_repeat_its_tail():
+    text = "x" * 2000
+    assert chunk_text(text, chunk_chars=2000, overlap=300) == [text]
+
+
+def test_the_last_chunk_ends_the_text_once():
+    text = " ".join(f"Sentence number {i} ends here." for i in range(300))
+    chunks = chunk_text(text, chunk_chars=2000, overlap=300)
+    assert chunks[-1].endswith("ends here.") and sum(c.endswith("299 ends here.") for c in chunks) == 1
@@ -0,0 +1,113 @@
+# tests/test_jobs.py
+"""Ingestion queue: claiming, the stale-job sweep, and refusing uploads nobody would process."""
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import jobs
+from app.jobs import PROCESSING, QUEUE, JobQueue
+from app.ratelimit import enforce_rate_limit
+
+
+def make_queue() -> JobQueue:
+    return JobQueue(fakeredis.FakeAsyncRedis(decode_responses=True), ttl_s=3600)
+
+
+async def enqueue_and_claim(queue: JobQueue, job_id: str = "j1") -> str:
+    await queue.enqueue("alice", "a.txt", "/tmp/a.txt", job_id)
+    return await queue.claim()
+
+
+def test_claim_stamps_a_heartbeat():
+    async def run():
+        queue = make_queue()
+        assert await enqueue_and_claim(queue) == "j1"
+        return await queue.get("j1"), await queue.r.lrange(PROCESSING, 0, -1)
+
+    job, processing = asyncio.run(run())
+    assert time.time() - job["heartbeat"] < 5 and processing == ["j1"]
+
+
+def test_user_job_list_does_not_collide_with_a_signup_hash():
+    async def run():
+        queue = make_queue()
+        # app.users keeps logins at user:{username}
+        await queue.r.hset("user:alice:jobs", mapping={"password": "x"})
+        await queue.enqueue("alice", "a.txt", "/tmp/a.txt", "j1")
+        return [j["job_id"] for j in await queue.for_user("alice")]
+
+    assert asyncio.run(run()) == ["j1"]
+
+
+def test_sweep_leaves_a_just_claimed_job_alone():
+    async def run():
+        queue = make_queue()
+        await enqueue_and_claim(queue)
+        return await queue.requeue_stale(60), await queue.r.lrange(PROCESSING, 0, -1)
+
+    assert asyncio.run(run()) == (0, ["j1"])
+
+
+def test_sweep_without_a_heartbeat_goes_by_job_age():
+    async def run():
+        queue = make_queue()
+        await queue.enqueue("alice", "a.txt", "/tmp/a.txt", "young")
+        await queue.enqueue("alice", "b.txt", "/tmp/b.txt", "old")
+        await queue.r.hset("job:old", "created_at", time.time() - 600)
+        # claimed by BLMOVE, but the worker died before its first beat
+        await queue.r.lmove(QUEUE, PROCESSING, "RIGHT", "LEFT")
+        await queue.r.lmove(QUEUE, PROCESSING, "RIGHT", "LEFT")
+        moved = await queue.requeue_stale(60)
+        return moved, await queue.r.lrange(PROCESSING, 0, -1), await queue.r.lrange(QUEUE, 0, -1)
+
+    assert asyncio.run(run()) == (1, ["young"], ["old"])
+
+
+def test_sweep_requeues_stale_and_expired_jobs():
+    async def run():
+        queue = make_queue()
+        await enqueue_and_claim(queue, "stale")
+        await queue.r.hset("job:stale", "heartbeat", time.time() - 600)
+        await enqueue_and_claim(queue, "expired")
+        await queue.r.delete("job:expired")
+        moved = await queue.requeue_stale(60)
+        job = await queue.get("stale")
+        # a second sweep right after finds nothing: requeueing stamps a fresh beat
+        again = await queue.requeue_stale(60)
+        return moved, again, job, await queue.r.lrange(PROCESSING, 0, -1), sorted(await queue.r.lrange(QUEUE, 0, -1))
+
+    moved, again, job, processing, queued = asyncio.run(run())
+    assert (moved, again) == (2, 0)
+    assert job["status"] == "queued" and time.time() - job["heartbeat"] < 5
+    assert processing == [] and queued == ["expired", "stale"]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs.settings, "DATA_DIR", str(tmp_path))
+    queue = make_queue()
+    monkeypatch.setattr(jobs, "get_queue", lambda: queue)
+    app = FastAPI()
+    app.include_router(jobs.router)
+    app.dependency_overrides[enforce_rate_limit] = lambda: "alice"
+    return TestClient(app)
+
+
+def test_upload_is_refused_without_a_consumer(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs.settings, "INGEST_QUEUE_WORKERS", 0)
+    monkeypatch.setattr(jobs.settings, "CHROMA_HOST", "")
+    r = client.post("/documents", files={"file": ("notes.txt", b"hello world")})
+    assert r.status_code == 503
+    assert not list(tmp_path.rglob("*notes.txt"))
+
+
+@pytest.mark.parametrize("workers,host", [(1, ""), (0, "chroma.internal")])
+def test_upload_is_queued_when_something_consumes_it(client, monkeypatch, workers, host):
+    monkeypatch.setattr(jobs.settings, "INGEST_QUEUE_WORKERS", workers)
+    monkeypatch.setattr(jobs.settings, "CHROMA_HOST", host)
+    r = client.post("/documents", files={"file": ("notes.txt", b"hello world")})
+    assert r.status_code == 202 and r.json()["status"] == "queued"
@@ -0,0 +1,105 @@
+# tests/test_ratelimit.py
+"""Sliding-window limiter: the Lua check against fakeredis, and Retry-After under the window weighting."""
+import asyncio
+
+import fakeredis
+import pytest
+
+from app import ratelimit
+from app.ratelimit import RateLimiter
+
+WINDOW = 60
+START = 1_000_000 * WINDOW  # a window boundary
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(START)
+    monkeypatch.setattr(ratelimit.time, "time", clock.time)
+    return clock
+
+
+def make_limiter(requests: int = 10, tokens: int = 0) -> RateLimiter:
+    return RateLimiter(fakeredis.FakeAsyncRedis(decode_responses=True), window_s=WINDOW, default_requests=requests, default_tokens=tokens)
+
+
+async def hits(limiter: RateLimiter, n: int) -> list:
+    return [(await limiter.hit("alice")).allowed for _ in range(n)]
+
+
+def test_admits_up_to_the_limit_then_blocks(clock):
+    async def run():
+        limiter = make_limiter(requests=5)
+        admitted = await hits(limiter, 5)
+        blocked = await limiter.hit("alice")
+        return admitted, blocked, await limiter.usage("alice")
+
+    admitted, blocked, usage = asyncio.run(run())
+    assert admitted == [True] * 5
+    assert not blocked.allowed and blocked.blocked_on == "requests" and blocked.retry_after > 0
+    # a blocked request is not counted
+    assert usage.allowed and usage.requests == 5 and usage.retry_after == 0
+
+
+@pytest.mark.parametrize("prev_at, prev_n, cur_at, cur_n, retry_after", [
+    (10, 10, 0, 0, 6),      # previous window full: 10 * (1 - t/60) <= 9 after 6s
+    (10, 8, 5, 2, 3),       # both windows: 8 * (1 - (5 + t)/60) + 2 <= 9 after 2.5s
+    (None, 0, 52, 10, 14),  # current window full: 8s to its end, then 6s of decay
+    (None, 0, 30, 10, 36),
+])
+def test_a_retry_at_retry_after_is_admitted(clock, prev_at, prev_n, cur_at, cur_n, retry_after):
+    async def run():
+        limiter = make_limiter(requests=10)
+        if prev_n:
+            clock.now = START + prev_at
+            assert all(await hits(limiter, prev_n))
+        clock.now = START + WINDOW + cur_at
+        assert all(await hits(limiter, cur_n))
+        blocked = await limiter.hit("alice")
+        t = clock.now
+        clock.now = t + blocked.retry_after - 1
+        early = await limiter.hit("alice")
+        clock.now = t + blocked.retry_after
+        return blocked, early, await limiter.hit("alice")
+
+    blocked, early, retry = asyncio.run(run())
+    assert not blocked.allowed and blocked.retry_after == retry_after
+    # admitted at Retry-After, and not a second sooner
+    assert retry.allowed and not early.allowed
+
+
+def test_previous_window_counts_by_its_remaining_overlap(clock):
+    async def run():
+        limiter = make_limiter(requests=10)
+        clock.now = START + 30
+        await hits(limiter, 10)
+        clock.now = START + WINDOW + 52
+        await hits(limiter, 2)
+        return await limiter.hit("alice")
+
+    # 10 * (1 - 52/60) + 2 = 3.33 is under 10: admitted, nothing to wait for
+    assert asyncio.run(run()).allowed
+
+
+def test_token_limit_retry_after(clock):
+    async def run():
+        limiter = make_limiter(requests=0, tokens=1000)
+        clock.now = START + 20
+        await limiter.hit("alice")
+        await limiter.record_tokens("alice", 1000)
+        blocked = await limiter.hit("alice")
+        clock.now += blocked.retry_after
+        return blocked, await limiter.hit("alice")
+
+    blocked, retry = asyncio.run(run())
+    assert blocked.blocked_on == "tokens" and retry.allowed
+    # 1000 tokens this window: under the limit once they are weighted below 1000, just past the boundary
+    assert blocked.retry_after == WINDOW - 20 + 1
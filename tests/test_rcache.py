@@ -0,0 +1,135 @@
+# tests/test_rcache.py
+"""Retrieval cache: LRU bounds, versioned invalidation, and its use by RAG.retrieve_many."""
+import asyncio
+import hashlib
+
+import numpy as np
+
+from app import retriever
+from app.rcache import LRU, RetrievalCache, result_key
+from app.store import flip_alias, open_client, open_collection
+
+DIM = 16
+
+
+def doc(id_, score=0.5):
+    return {"id": id_, "text": f"text of {id_}", "metadata": {"source": "a.txt"}, "score": score}
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRU(2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1  # "b" is now the oldest
+    lru.put("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats() == {"size": 2, "max_items": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_lru_of_size_zero_stores_nothing():
+    lru = LRU(0)
+    lru.put("a", 1)
+    assert lru.get("a") is None and lru.stats()["size"] == 0
+
+
+def test_result_key_ignores_whitespace_only():
+    assert result_key("  what is  RAG?\n", 4, None, None) == result_key("what is RAG?", 4, None, None)
+    assert result_key("what is rag?", 4, None, None) != result_key("what is RAG?", 4, None, None)
+    assert result_key("q", 4, None, None) != result_key("q", 5, None, None)
+    assert result_key("q", 4, None, None) != result_key("q", 4, 0.3, None)
+    # filter key order does not matter
+    assert result_key("q", 4, None, {"a": 1, "b": 2}) == result_key("q", 4, None, {"b": 2, "a": 1})
+
+
+def test_hit_returns_the_stored_ranking():
+    cache = RetrievalCache(8, 8)
+    key = result_key("q", 2, None, None)
+    assert cache.get((0, 0), key) is None
+    cache.put((0, 0), key, [doc("x", 0.9), doc("y", 0.4)])
+    got = cache.get((0, 0), key)
+    assert [(d["id"], d["score"]) for d in got] == [("x", 0.9), ("y", 0.4)]
+    assert got[0]["text"] == "text of x" and got[0]["length"] == len("text of x")
+
+
+def test_new_writes_drop_results_but_keep_chunks():
+    cache = RetrievalCache(8, 8, (1, 0))
+    key = result_key("q", 1, None, None)
+    cache.put((1, 0), key, [doc("x")])
+    cache.sync((1, 0))
+    assert cache.invalidations == 0
+    assert cache.get((1, 5), key) is None
+    assert cache.invalidations == 1 and cache.version == (1, 5)
+    assert cache.stats()["results"]["size"] == 0 and cache.stats()["chunks"]["size"] == 1
+
+
+def test_generation_change_drops_everything():
+    cache = RetrievalCache(8, 8, (1, 3))
+    cache.put((1, 3), result_key("q", 1, None, None), [doc("x")])
+    cache.sync((2, 3))
+    assert cache.stats()["results"]["size"] == 0 and cache.stats()["chunks"]["size"] == 0
+    assert cache.stats()["version"] == {"generation": 2, "writes": 3}
+
+
+def test_put_from_an_older_version_is_ignored():
+    cache = RetrievalCache(8, 8, (1, 0))
+    key = result_key("q", 1, None, None)
+    cache.sync((1, 1))  # the index moved while the search ran
+    cache.put((1, 0), key, [doc("x")])
+    assert cache.get((1, 1), key) is None
+    assert cache.stats()["chunks"]["size"] == 0
+
+
+def test_evicted_chunk_body_is_a_miss():
+    cache = RetrievalCache(8, 2)
+    first = result_key("first", 2, None, None)
+    cache.put((0, 0), first, [doc("a"), doc("b")])
+    cache.put((0, 0), result_key("second", 2, None, None), [doc("c"), doc("d")])
+    assert cache.get((0, 0), first) is None
+
+
+class CountingEmbedder:
+    model_id = "test"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def embed(self, texts):
+        self.calls += 1
+        out = []
+        for t in texts:
+            seed = int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "big")
+            v = np.random.default_rng(seed).normal(size=DIM)
+            out.append((v / np.linalg.norm(v)).tolist())
+        return out
+
+
+def test_rag_serves_repeats_from_cache_until_the_index_changes(tmp_path, monkeypatch):
+    emb = CountingEmbedder()
+    monkeypatch.setattr(retriever, "get_embedder", lambda: emb)
+    client = open_client(str(tmp_path))
+    texts = [f"passage {i} " + "lorem ipsum dolor sit amet " * 10 for i in range(20)]
+    vecs = asyncio.run(emb.embed(texts))
+    open_collection(client, "docs-v1", "test").add(ids=[f"c{i}" for i in range(20)], embeddings=vecs, documents=texts, metadatas=[{"source": "a.txt"}] * 20)
+    flip_alias(client, ["docs-v1"], 1)
+    emb.calls = 0
+
+    rag = retriever.RAG(path=str(tmp_path), shards=1, embed_model="test", index_dim=0, top_m=0)
+    try:
+        first = asyncio.run(rag.retrieve("passage 3", k=3))
+        again = asyncio.run(rag.retrieve("  passage   3 ", k=3))
+        assert emb.calls == 1
+        assert [d["id"] for d in again] == [d["id"] for d in first] and len(first) == 3
+
+        rag.note_writes(1)
+        asyncio.run(rag.retrieve("passage 3", k=3))
+        assert emb.calls == 2
+
+        # a flipped alias is a new generation: chunks are dropped too
+        open_collection(client, "docs-v2", "test").add(ids=[f"d{i}" for i in range(20)], embeddings=vecs, documents=texts, metadatas=[{"source": "a.txt"}] * 20)
+        flip_alias(client, ["docs-v2"], 1)
+        assert rag.refresh()
+        ids = [d["id"] for d in asyncio.run(rag.retrieve("passage 3", k=3))]
+        assert emb.calls == 3 and all(i.startswith("d") for i in ids)
+    finally:
+        rag.close()
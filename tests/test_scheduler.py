@@ -0,0 +1,148 @@
+# tests/test_scheduler.py
+"""Admission control: free slots, the bounded queue, wait limits, deadlines and the token budget."""
+import asyncio
+
+import pytest
+
+from app.deadline import DeadlineExceeded, set_deadline
+from app.scheduler import AdmissionRejected, UpstreamScheduler, _TokenBucket
+
+
+def make(max_concurrency=1, tokens_per_minute=0, max_queue=1, max_wait_s=1.0) -> UpstreamScheduler:
+    return UpstreamScheduler("test", max_concurrency, tokens_per_minute, max_queue, max_wait_s)
+
+
+async def hold(sched: UpstreamScheduler, entered: asyncio.Event, release: asyncio.Event) -> None:
+    async with sched.slot():
+        entered.set()
+        await release.wait()
+
+
+def test_free_slot_is_admitted_without_queueing():
+    async def run():
+        sched = make()
+        async with sched.slot():
+            assert sched.stats()["in_flight"] == 1
+            assert sched.stats()["queue_depth"] == 0
+        assert sched.stats()["in_flight"] == 0
+        return sched
+
+    sched = asyncio.run(run())
+    assert (sched.admitted, sched.rejected) == (1, 0)
+
+
+def test_waiter_is_admitted_when_the_slot_frees():
+    async def run():
+        sched = make(max_wait_s=2.0)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(sched, entered, release))
+        await entered.wait()
+
+        async def waiter():
+            async with sched.slot():
+                return "ran"
+
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        assert sched.stats()["queue_depth"] == 1
+        release.set()
+        assert await task == "ran"
+        await holder
+        return sched
+
+    sched = asyncio.run(run())
+    assert (sched.admitted, sched.rejected) == (2, 0)
+    assert sched.stats()["queue_depth"] == 0
+
+
+def test_full_queue_rejects_immediately_with_retry_after():
+    async def run():
+        sched = make(max_queue=1, max_wait_s=2.0)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(sched, entered, release))
+        await entered.wait()
+        queued = asyncio.create_task(hold(sched, asyncio.Event(), asyncio.Event()))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as exc:
+            async with sched.slot():
+                pass
+        queued.cancel()
+        release.set()
+        await holder
+        await asyncio.gather(queued, return_exceptions=True)
+        return sched, exc.value
+
+    sched, err = asyncio.run(run())
+    assert err.reason == "queue full"
+    assert err.retry_after >= 1
+    assert sched.rejected == 1
+    assert sched.stats()["queue_depth"] == 0
+
+
+def test_wait_limit_rejects_and_releases_the_queue_place():
+    async def run():
+        sched = make(max_queue=4, max_wait_s=0.05)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(sched, entered, release))
+        await entered.wait()
+        with pytest.raises(AdmissionRejected) as exc:
+            async with sched.slot():
+                pass
+        depth = sched.stats()["queue_depth"]
+        release.set()
+        await holder
+        # the slot is usable again after the rejection
+        async with sched.slot():
+            pass
+        return sched, exc.value, depth
+
+    sched, err, depth = asyncio.run(run())
+    assert err.reason == "queue wait exceeded"
+    assert depth == 0
+    assert (sched.admitted, sched.rejected) == (2, 1)
+
+
+def test_deadline_shorter_than_the_wait_limit_raises_deadline_exceeded():
+    async def run():
+        sched = make(max_wait_s=5.0)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(sched, entered, release))
+        await entered.wait()
+
+        async def with_deadline():
+            set_deadline(0.05)
+            async with sched.slot():
+                pass
+
+        try:
+            await with_deadline()
+        finally:
+            release.set()
+            await holder
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+
+
+def test_token_budget_delays_until_refilled():
+    async def run():
+        bucket = _TokenBucket(6000)  # 100 tokens/s
+        await bucket.take(6000)
+        assert bucket.seconds_until(10) == pytest.approx(0.1, abs=0.02)
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        await bucket.take(10)
+        return loop.time() - t0
+
+    assert asyncio.run(run()) == pytest.approx(0.1, abs=0.05)
+
+
+def test_token_budget_reconciles_estimates_and_admits_oversize_requests():
+    bucket = _TokenBucket(600)
+    bucket.adjust(100)  # under-reserved by 100
+    assert bucket.tokens == pytest.approx(500, abs=1)
+    bucket.adjust(-1000)  # over-reserved: refunds are capped at capacity
+    assert bucket.tokens == pytest.approx(600, abs=1)
+    # a request larger than the whole budget is clamped to it rather than waiting forever
+    asyncio.run(asyncio.wait_for(bucket.take(10_000), timeout=1))
+    assert _TokenBucket(0).seconds_until(10**9) == 0.0
@@ -0,0 +1,112 @@
+# tests/test_sessions.py
+"""Per-user session index: metadata keys, message counts, cursor pagination and TTL expiry."""
+import asyncio
+import time
+
+import fakeredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import sessions
+from app.auth import get_current_user
+from app.memory import RedisMemory
+
+
+def make_memory(max_turns: int = 2, ttl_s: int = 0) -> RedisMemory:
+    memory = RedisMemory("redis://localhost:6379/0", max_turns=max_turns, ttl_s=ttl_s)
+    memory.r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return memory
+
+
+async def list_all(memory: RedisMemory, user_id: str, limit: int) -> list:
+    seen, cursor = [], None
+    while True:
+        page, cursor = await memory.list_sessions(user_id, limit=limit, before=cursor)
+        seen += [s["session_id"] for s in page]
+        if cursor is None:
+            return seen
+
+
+def test_meta_key_does_not_collide_with_a_session_named_like_it():
+    async def run():
+        memory = make_memory()
+        await memory.append_turn("foo", "first question", "answer", "alice")
+        await memory.append_turn("foo:meta", "other question", "answer", "alice")
+        return await memory.get("foo", "alice"), await memory.list_sessions("alice")
+
+    history, (sessions, _) = asyncio.run(run())
+    assert [m["content"] for m in history] == ["first question", "answer"]
+    assert {s["session_id"]: s["title"] for s in sessions} == {"foo": "first question", "foo:meta": "other question"}
+
+
+def test_index_does_not_collide_with_a_signup_hash():
+    async def run():
+        memory = make_memory()
+        # app.users keeps logins at user:{username}
+        await memory.r.hset("user:bob:sessions", mapping={"password": "x"})
+        await memory.append_turn("s1", "hi", "hello", "bob")
+        return await memory.list_sessions("bob"), await memory.r.hgetall("user:bob:sessions")
+
+    (sessions, _), login = asyncio.run(run())
+    assert [s["session_id"] for s in sessions] == ["s1"] and login == {"password": "x"}
+
+
+def test_message_count_is_the_kept_history():
+    async def run():
+        memory = make_memory(max_turns=2)
+        for i in range(5):
+            await memory.append_turn("s1", f"question {i}", "answer", "alice")
+        return await memory.get("s1", "alice"), await memory.list_sessions("alice")
+
+    history, (sessions, _) = asyncio.run(run())
+    assert len(history) == 4 and sessions[0]["messages"] == 4
+
+
+def test_pagination_over_tied_scores_neither_skips_nor_repeats():
+    async def run():
+        memory = make_memory()
+        ids = [f"s{i:02d}" for i in range(7)]
+        for sid in ids:
+            await memory.append_turn(sid, "hi", "hello", "alice")
+        # several sessions active at the same instant, across page boundaries
+        await memory.r.zadd(memory._index_key("alice"), {sid: 1000.0 if sid < "s05" else 2000.0 for sid in ids})
+        return ids, await list_all(memory, "alice", limit=2)
+
+    ids, seen = asyncio.run(run())
+    assert sorted(seen) == ids and len(seen) == len(set(seen))
+    assert seen[:2] == ["s06", "s05"]
+
+
+def test_listing_skips_expired_sessions_without_pruning_them():
+    async def run():
+        memory = make_memory(ttl_s=60)
+        await memory.append_turn("fresh", "hi", "hello", "alice")
+        await memory.append_turn("idle", "hi", "hello", "alice")
+        # expired, but not pruned yet: no write for this user since
+        await memory.r.zadd(memory._index_key("alice"), {"idle": time.time() - 120})
+        sessions, cursor = await memory.list_sessions("alice")
+        return sessions, cursor, await memory.r.zscore(memory._index_key("alice"), "idle")
+
+    sessions, cursor, idle_score = asyncio.run(run())
+    assert [s["session_id"] for s in sessions] == ["fresh"] and cursor is None
+    assert idle_score is not None
+
+
+def test_bulk_delete_is_a_post_with_a_body(monkeypatch):
+    memory = make_memory()
+
+    async def seed():
+        for sid in ("a", "b", "c"):
+            await memory.append_turn(sid, "hi", "hello", "alice")
+
+    asyncio.run(seed())
+    monkeypatch.setattr(sessions, "get_memory", lambda: memory)
+    app = FastAPI()
+    app.include_router(sessions.router)
+    app.dependency_overrides[get_current_user] = lambda: "alice"
+    client = TestClient(app)
+
+    assert client.post("/sessions/delete", json={"session_ids": ["a", "b", "missing"]}).json() == {"ok": True, "deleted": 2}
+    assert [s["session_id"] for s in client.get("/sessions").json()["sessions"]] == ["c"]
+    assert client.post("/sessions/delete", json={}).status_code == 400
+    assert client.post("/sessions/delete", json={"all": True}).json()["deleted"] == 1